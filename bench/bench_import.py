@@ -0,0 +1,59 @@
+# bench/bench_import.py
+"""
+Время импорта точек входа по python -X importtime: сколько стоит запуск CLI
+(src.main), реестра парсеров и веб-сервера, и какие модули тяжелее всего.
+Каждый замер — в свежем интерпретаторе.
+
+    python -m bench.bench_import [--repeat 5] [--top 15] [модуль ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+ENTRY_POINTS = ("src.main", "src.core.parser_manager", "src.web.server")
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """Модуль -> (собственное, суммарное) время импорта в мкс для `import module`"""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=ROOT, env=env, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative))
+    return times
+
+
+def import_seconds(module: str) -> float:
+    """Суммарное время импорта модуля (со всеми зависимостями), секунды"""
+    return import_times(module)[module][1] / 1e6
+
+
+def report(module: str, repeat: int, top: int) -> None:
+    samples: List[float] = []
+    times: Dict[str, Tuple[int, int]] = {}
+    for _ in range(repeat):
+        times = import_times(module)
+        samples.append(times[module][1] / 1000)
+    print(f"{module}: медиана {statistics.median(samples):.1f} мс (мин {min(samples):.1f})")
+    heaviest = sorted(((c, s, n) for n, (s, c) in times.items() if n != module), reverse=True)[:top]
+    for cumulative, self_us, name in heaviest:
+        print(f"    {cumulative / 1000:>8.1f} мс  (своё {self_us / 1000:>6.1f})  {name}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Время импорта точек входа MangaMonitor")
+    ap.add_argument("modules", nargs="*", default=list(ENTRY_POINTS))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15, help="сколько самых тяжёлых модулей показать")
+    args = ap.parse_args()
+    for name in args.modules:
+        report(name, args.repeat, args.top)
@@ -0,0 +1,90 @@
+# bench/bench_json.py
+"""
+Сериализация ответа /api/info для манги на 5000 глав:
+jsonable_encoder + JSONResponse (путь FastAPI по умолчанию) против FastJSONResponse.
+Меряет время кодирования и задержки (p50/p99) через ASGI без сети.
+
+    python -m bench.bench_json [глав] [запросов]
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from src.parsers.models import Chapter, MangaInfo
+from src.web.responses import FastJSONResponse, dumps, orjson
+
+
+def make_info(count: int) -> MangaInfo:
+    return MangaInfo(
+        title="Тестовая манга",
+        description="Описание " * 50,
+        genres=["сэйнэн", "драма", "приключения"],
+        chapters=[Chapter(f"Том {i // 10 + 1} Глава {i}", f"https://3.readmanga.ru/test/vol{i // 10 + 1}/{i}?mtr=true",
+                          "01.01.24", float(i)) for i in range(count)],
+    )
+
+
+def _timeit(fn, repeat: int = 20) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+async def _latencies(app: FastAPI, path: str, requests: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get(path)
+        times = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            resp = await client.get(path)
+            resp.raise_for_status()
+            times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {
+        "p50_ms": round(times[len(times) // 2], 2),
+        "p99_ms": round(times[min(len(times) - 1, int(len(times) * 0.99))], 2),
+    }
+
+
+def run(count: int = 5000, requests: int = 200) -> dict:
+    info = make_info(count)
+
+    app = FastAPI()
+
+    @app.get("/default")
+    async def default():
+        return info
+
+    @app.get("/fast")
+    async def fast():
+        return FastJSONResponse(info)
+
+    default_ms = _timeit(lambda: JSONResponse(jsonable_encoder(info)).body)
+    fast_ms = _timeit(lambda: dumps(info))
+    stdlib_ms = _timeit(lambda: json.dumps(info.to_dict(), ensure_ascii=False))
+
+    return {
+        "chapters": count,
+        "orjson": orjson is not None,
+        "encode_default_ms": round(default_ms, 2),
+        "encode_stdlib_to_dict_ms": round(stdlib_ms, 2),
+        "encode_fast_ms": round(fast_ms, 2),
+        "latency_default": asyncio.run(_latencies(app, "/default", requests)),
+        "latency_fast": asyncio.run(_latencies(app, "/fast", requests)),
+    }
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    print(json.dumps(run(*args), indent=2))
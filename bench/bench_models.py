@@ -0,0 +1,58 @@
+# bench/bench_models.py
+"""
+Память и время сериализации списка глав: словари (как раньше) против слотовых моделей.
+
+    python -m bench.bench_models [количество глав]
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+from src.parsers.models import Chapter
+
+
+def _chapter_args(i: int):
+    return f"Том 1 Глава {i}", f"https://3.readmanga.ru/some_manga/vol1/{i}?mtr=true", "01.01.24", float(i)
+
+
+def _measure(build) -> tuple:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    items = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return items, size
+
+
+def run(count: int = 10_000) -> dict:
+    def as_dicts():
+        return [dict(zip(("title", "url", "date", "number"), _chapter_args(i))) for i in range(count)]
+
+    def as_models():
+        return [Chapter(*_chapter_args(i)) for i in range(count)]
+
+    dicts, dict_bytes = _measure(as_dicts)
+    models, model_bytes = _measure(as_models)
+
+    start = time.perf_counter()
+    json.dumps(dicts)
+    dict_encode = time.perf_counter() - start
+    start = time.perf_counter()
+    json.dumps([m.to_dict() for m in models])
+    model_encode = time.perf_counter() - start
+
+    return {
+        "chapters": count,
+        "dict_bytes": dict_bytes,
+        "model_bytes": model_bytes,
+        "dict_bytes_per_item": round(dict_bytes / count, 1),
+        "model_bytes_per_item": round(model_bytes / count, 1),
+        "dict_json_ms": round(dict_encode * 1000, 2),
+        "model_json_ms": round(model_encode * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000), indent=2))
@@ -0,0 +1,127 @@
+# bench/bench_transport.py
+"""
+Транспорты парсера против локальной заглушки зеркала readmanga.
+
+Заглушка отдаёт страницу поиска и страницу главы в том сжатии, которое
+попросил клиент (br / gzip / без сжатия), с задержкой ответа и ограничением
+скорости канала, и считает переданные байты. Сравниваются:
+aiohttp без сжатия (как было), aiohttp и httpx со сжатием.
+
+HTTP/2 httpx согласует только по TLS (ALPN), поэтому на локальной заглушке
+httpx работает по HTTP/1.1 — здесь видны сжатие и переиспользование соединений.
+
+    python -m bench.bench_transport [запросов] [задержка мс] [канал КБ/с]
+"""
+import asyncio
+import gzip
+import statistics
+import sys
+import time
+
+import brotli
+from aiohttp import web
+
+from src.core.log import setup_logging
+from src.core.parser_manager import get_parser
+
+PORT = 8790
+BASE = f"http://127.0.0.1:{PORT}"
+
+
+def search_html(count: int = 50) -> str:
+    tiles = "".join(
+        f'<div class="tile"><div class="desc"><h3><a href="/manga_{i}">Манга номер {i}</a></h3></div>'
+        f'<div class="compact-rate" title="4.{i % 10}"></div><div class="tile-info">'
+        f'<a href="/list/genre/drama">драма</a><a href="/list/genre/seinen">сэйнэн</a>'
+        f'<a href="/list/year/20{i % 25:02d}">20{i % 25:02d}</a></div></div>'
+        for i in range(count)
+    )
+    return f"<html><head><title>Поиск</title>{'<script>var x=1;</script>' * 40}</head>" \
+           f"<body><div class='tiles'>{tiles}</div></body></html>"
+
+
+def chapter_html(pages: int = 40) -> str:
+    items = ",".join(f"['https://img.example/','',\"manga/test/vol1/1/{i:03d}.jpg\",1000,1400]"
+                     for i in range(pages))
+    return f"<html><body>{'<div class=menu>навигация</div>' * 200}" \
+           f"<script>rm_h.readerInit(0, [{items}], false);</script></body></html>"
+
+
+class StandIn:
+    def __init__(self, latency: float, bandwidth: int):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.bytes_sent = 0
+        self.bodies = {}
+        for path, html in (("/search/advancedResults", search_html()), ("/test/vol1/1", chapter_html())):
+            raw = html.encode("utf-8")
+            self.bodies[path] = {"br": brotli.compress(raw), "gzip": gzip.compress(raw), "identity": raw}
+
+    def _encoding(self, accept: str) -> str:
+        accept = accept.lower()
+        for enc in ("br", "gzip"):
+            if enc in accept:
+                return enc
+        return "identity"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        variants = self.bodies.get(request.path)
+        if variants is None:
+            return web.Response(status=404)
+        enc = self._encoding(request.headers.get("Accept-Encoding", ""))
+        body = variants[enc]
+        self.bytes_sent += len(body)
+        # задержка сервера + время передачи по узкому каналу
+        await asyncio.sleep(self.latency + len(body) / self.bandwidth)
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        if enc != "identity":
+            headers["Content-Encoding"] = enc
+        return web.Response(body=body, headers=headers)
+
+
+async def run_case(stand_in: StandIn, label: str, transport: str, headers: dict, requests: int) -> None:
+    parser = get_parser("readmanga", base_url=BASE, headers=headers, transport=transport, limited=False)
+    stand_in.bytes_sent = 0
+    search_times, chapter_times = [], []
+    async with parser:
+        for i in range(requests):
+            start = time.perf_counter()
+            results = await parser.search_manga(f"запрос {i}", max_pages=1)
+            search_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            images = await parser.get_chapter_images(f"{BASE}/test/vol1/1")
+            chapter_times.append(time.perf_counter() - start)
+        assert results and images, "заглушка вернула пустой ответ"
+    per_request = stand_in.bytes_sent / (requests * 2)
+    print(f"{label:<24} {per_request / 1024:>8.1f} КБ/запрос   "
+          f"поиск p50 {statistics.median(search_times) * 1000:6.1f} мс   "
+          f"глава p50 {statistics.median(chapter_times) * 1000:6.1f} мс")
+
+
+async def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    bandwidth = int(sys.argv[3]) * 1024 if len(sys.argv) > 3 else 1024 * 1024
+
+    stand_in = StandIn(latency, bandwidth)
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", stand_in.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    base_headers = {"User-Agent": "bench"}
+    print(f"{requests} запросов поиска и главы, задержка {latency * 1000:.0f} мс, "
+          f"канал {bandwidth // 1024} КБ/с")
+    try:
+        await run_case(stand_in, "aiohttp, без сжатия", "aiohttp",
+                       {**base_headers, "Accept-Encoding": "identity"}, requests)
+        await run_case(stand_in, "aiohttp, br/gzip", "aiohttp", base_headers, requests)
+        await run_case(stand_in, "httpx, br/gzip", "httpx", base_headers, requests)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+# bench/bench_workers.py
+"""
+Пропускная способность прокси изображений в зависимости от числа воркеров
+uvicorn (режим MANGAMONITOR_WORKERS, общий кэш — src/core/shared.py).
+
+Для каждого числа воркеров сервер запускается отдельным процессом, кэш
+прогревается одним проходом по картинкам зеркала (bench/mirror.py), затем
+несколько процессов-клиентов гоняют /api/proxy заданное время. Клиентов
+нужно не меньше, чем воркеров, иначе упрёмся в сам клиент.
+
+    python -m bench.bench_workers [--workers 1,2,4] [--clients 4] [--seconds 10] [--transcode]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import List
+
+import httpx
+
+from bench.mirror import MirrorConfig, start_mirror
+
+IMAGES = 50
+CONCURRENCY = 16
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _params(urls: List[str], transcode: bool) -> List[dict]:
+    extra = {"w": 600, "fmt": "webp"} if transcode else {}
+    return [{"url": u, **extra} for u in urls]
+
+
+async def _hammer(base: str, params: List[dict], seconds: float) -> int:
+    done = 0
+    stop = time.perf_counter() + seconds
+    async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+        async def worker(offset: int) -> None:
+            nonlocal done
+            i = offset
+            while time.perf_counter() < stop:
+                resp = await client.get("/api/proxy", params=params[i % len(params)])
+                resp.raise_for_status()
+                done += 1
+                i += CONCURRENCY
+        await asyncio.gather(*(worker(i) for i in range(CONCURRENCY)))
+    return done
+
+
+def _client(args) -> int:
+    return asyncio.run(_hammer(*args))
+
+
+def _wait_ready(base: str, timeout: float = 30) -> None:
+    stop = time.monotonic() + timeout
+    while time.monotonic() < stop:
+        try:
+            if httpx.get(f"{base}/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("Сервер не запустился")
+
+
+async def run(workers: List[int], clients: int, seconds: float, transcode: bool) -> None:
+    runner, mirror = await start_mirror(MirrorConfig())
+    urls = [f"{mirror.base_url}/img/workers/{i:03d}.jpg" for i in range(IMAGES)]
+    params = _params(urls, transcode)
+    baseline = None
+    try:
+        for count in workers:
+            port = _free_port()
+            base = f"http://127.0.0.1:{port}"
+            env = dict(os.environ, MANGAMONITOR_WORKERS=str(count), MANGAMONITOR_SHARED_CACHE="1",
+                       MANGAMONITOR_LOG_LEVEL="WARNING")
+            server = subprocess.Popen([sys.executable, "-m", "uvicorn", "src.web.server:app", "--port", str(port),
+                                       "--workers", str(count), "--log-level", "warning"], env=env)
+            try:
+                await asyncio.to_thread(_wait_ready, base)
+                # прогрев: каждая картинка один раз скачивается с зеркала в общий кэш
+                async with httpx.AsyncClient(base_url=base, timeout=60) as client:
+                    for p in params:
+                        (await client.get("/api/proxy", params=p)).raise_for_status()
+                loop = asyncio.get_running_loop()
+                with multiprocessing.Pool(clients) as pool:
+                    total = sum(await loop.run_in_executor(
+                        None, pool.map, _client, [(base, params, seconds)] * clients))
+            finally:
+                server.terminate()
+                server.wait()
+            rps = total / seconds
+            baseline = baseline or rps / count
+            print(f"воркеров {count:>2}: {rps:>9.1f} запр/с   на воркер {rps / count:>8.1f}   "
+                  f"масштабирование {rps / (baseline * count):>5.0%}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Масштабирование прокси изображений по воркерам")
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--clients", type=int, default=4, help="процессов-клиентов нагрузки")
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--transcode", action="store_true", help="запрашивать webp шириной 600")
+    args = ap.parse_args()
+    print(f"ядер: {os.cpu_count()}")
+    asyncio.run(run([int(w) for w in args.workers.split(",")], args.clients, args.seconds, args.transcode))
@@ -0,0 +1,47 @@
+# bench/compare.py
+"""
+Сравнение двух результатов bench.run: медиана по каждому случаю и изменение в %.
+Регрессией считается рост p50 больше порога (по умолчанию 10%); тогда код выхода 1.
+
+    python -m bench.compare bench/results/abc1234.json bench/results/def5678.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def load(path: str) -> dict:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def compare(old: dict, new: dict, threshold: float) -> int:
+    print(f"{'случай':<26} {old['commit']:>12} {new['commit']:>12}   изменение")
+    regressions = 0
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        before = old["results"].get(name)
+        after = new["results"].get(name)
+        if before is None or after is None:
+            print(f"{name:<26} {'—' if before is None else before['p50_ms']:>12} "
+                  f"{'—' if after is None else after['p50_ms']:>12}")
+            continue
+        change = (after["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0
+        mark = ""
+        if change > threshold:
+            mark = "  <-- регрессия"
+            regressions += 1
+        elif change < -threshold:
+            mark = "  ускорение"
+        print(f"{name:<26} {before['p50_ms']:>10.2f}мс {after['p50_ms']:>10.2f}мс   {change:+7.1f}%{mark}")
+    if old.get("config") != new.get("config"):
+        print("Внимание: параметры запусков различаются:", old.get("config"), "/", new.get("config"))
+    return regressions
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Сравнить результаты бенчмарков двух коммитов")
+    ap.add_argument("old")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=10, help="порог регрессии p50, %%")
+    args = ap.parse_args()
+    sys.exit(1 if compare(load(args.old), load(args.new), args.threshold) else 0)
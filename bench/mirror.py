@@ -0,0 +1,174 @@
+# bench/mirror.py
+"""
+Локальное зеркало сайтов для бенчмарков: отдаёт записанные страницы из
+bench/fixtures (семейство readmanga и desu.city) и сгенерированные картинки.
+Задержка, разброс и доля ошибок настраиваются, счётчики запросов и байт
+доступны на /_stats.
+
+    python -m bench.mirror [--port 8800] [--latency 50] [--jitter 10] [--errors 0.05]
+
+Маршруты (как у настоящих сайтов):
+    GET  /search/advancedResults      поиск readmanga (offset >= 100 — пустая выдача)
+    GET  /<slug>                      страница манги readmanga
+    GET  /<slug>/vol<N>/<M>           глава readmanga (readerInit)
+    POST /manga/search/               AJAX-поиск desu.city (JSON)
+    GET  /manga/<slug>/               страница манги desu.city
+    GET  /manga/<slug>/vol<N>/ch<M>/rus  глава desu.city (Reader.init)
+    GET  /img/<путь>                  изображение JPEG
+"""
+import argparse
+import asyncio
+import random
+import zlib
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+from PIL import Image
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+MIRROR_PLACEHOLDER = "__MIRROR__"
+
+
+@dataclass
+class MirrorConfig:
+    latency: float = 0.0      # задержка ответа, секунды
+    jitter: float = 0.0       # случайная добавка к задержке, секунды
+    error_rate: float = 0.0   # доля ответов 503
+    image_size: Tuple[int, int] = (800, 1200)
+    seed: int = 1
+
+
+def make_image(size: Tuple[int, int], seed: int) -> bytes:
+    """JPEG с шумом: сжимается примерно как настоящий скан"""
+    rnd = random.Random(seed)
+    im = Image.effect_noise(size, 60).convert("RGB")
+    im.paste((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)), (0, 0, size[0], size[1] // 8))
+    out = BytesIO()
+    im.save(out, "JPEG", quality=80)
+    return out.getvalue()
+
+
+class Mirror:
+    def __init__(self, config: MirrorConfig):
+        self.config = config
+        self.base_url = ""
+        self._rnd = random.Random(config.seed)
+        self._fixtures: Dict[str, str] = {}
+        self._images: Dict[str, bytes] = {}
+        self.stats = {"requests": 0, "errors": 0, "bytes": 0}
+
+    def fixture(self, name: str) -> str:
+        if name not in self._fixtures:
+            self._fixtures[name] = (FIXTURES_DIR / name).read_text(encoding="utf-8")
+        return self._fixtures[name].replace(MIRROR_PLACEHOLDER, self.base_url)
+
+    def image(self, path: str) -> bytes:
+        if path not in self._images:
+            self._images[path] = make_image(self.config.image_size, zlib.crc32(path.encode()))
+        return self._images[path]
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        self.stats["requests"] += 1
+        if request.path == "/_stats":
+            return await handler(request)
+        delay = self.config.latency + self._rnd.random() * self.config.jitter
+        if delay:
+            await asyncio.sleep(delay)
+        if self.config.error_rate and self._rnd.random() < self.config.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=503, text="Service Unavailable")
+        response = await handler(request)
+        if response.body is not None:
+            self.stats["bytes"] += len(response.body)
+        return response
+
+    def _html(self, name: str) -> web.Response:
+        return web.Response(text=self.fixture(name), content_type="text/html")
+
+    async def rm_search(self, request: web.Request) -> web.Response:
+        if int(request.query.get("offset", 0)) >= 100:
+            return self._html("readmanga/search_empty.html")
+        return self._html("readmanga/search.html")
+
+    async def rm_manga(self, request: web.Request) -> web.Response:
+        return self._html("readmanga/manga.html")
+
+    async def rm_chapter(self, request: web.Request) -> web.Response:
+        return self._html("readmanga/chapter.html")
+
+    async def desu_search(self, request: web.Request) -> web.Response:
+        await request.post()
+        return web.Response(text=self.fixture("desucity/search.json"), content_type="application/json")
+
+    async def desu_manga(self, request: web.Request) -> web.Response:
+        return self._html("desucity/manga.html")
+
+    async def desu_chapter(self, request: web.Request) -> web.Response:
+        return self._html("desucity/chapter.html")
+
+    async def img(self, request: web.Request) -> web.Response:
+        body = self.image(request.match_info["path"])
+        start = request.http_range.start
+        if start is None:
+            return web.Response(body=body, content_type="image/jpeg", headers={"Accept-Ranges": "bytes"})
+        # докачка: Range: bytes=N- (как у CDN картинок)
+        if start >= len(body):
+            return web.Response(status=416, headers={"Content-Range": f"bytes */{len(body)}"})
+        return web.Response(status=206, body=body[start:], content_type="image/jpeg",
+                            headers={"Content-Range": f"bytes {start}-{len(body) - 1}/{len(body)}"})
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/_stats", self.get_stats)
+        app.router.add_get("/img/{path:.+}", self.img)
+        app.router.add_get("/search/advancedResults", self.rm_search)
+        app.router.add_post("/manga/search/", self.desu_search)
+        app.router.add_get("/manga/{slug}/vol{vol}/ch{num}/rus", self.desu_chapter)
+        app.router.add_get("/manga/{slug}/", self.desu_manga)
+        app.router.add_get("/{slug}/vol{vol}/{num}", self.rm_chapter)
+        app.router.add_get("/{slug}", self.rm_manga)
+        return app
+
+
+async def start_mirror(config: Optional[MirrorConfig] = None, port: int = 0) -> Tuple[web.AppRunner, Mirror]:
+    """Запустить зеркало в текущем event loop; mirror.base_url — его адрес"""
+    mirror = Mirror(config or MirrorConfig())
+    runner = web.AppRunner(mirror.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    mirror.base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    return runner, mirror
+
+
+def _parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Локальное зеркало сайтов манги для бенчмарков")
+    ap.add_argument("--port", type=int, default=8800)
+    ap.add_argument("--latency", type=float, default=0, help="задержка, мс")
+    ap.add_argument("--jitter", type=float, default=0, help="случайная добавка к задержке, мс")
+    ap.add_argument("--errors", type=float, default=0, help="доля ответов 503 (0..1)")
+    return ap.parse_args()
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    runner, mirror = await start_mirror(MirrorConfig(args.latency / 1000, args.jitter / 1000, args.errors),
+                                        args.port)
+    print(f"Зеркало: {mirror.base_url} (Ctrl+C — выход)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(_serve(_parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,280 @@
+# bench/run.py
+"""
+Набор бенчмарков против локального зеркала (bench/mirror.py): поиск, информация
+о манге, извлечение изображений главы, скачивание главы, пропускная способность
+прокси изображений и время импорта точек входа (bench/bench_import.py). Результат пишется в JSON, чтобы сравнивать коммиты:
+
+    python -m bench.run [--repeat 10] [--latency 20] [--errors 0] [--only search,info] [--out файл.json]
+    python -m bench.compare bench/results/<старый>.json bench/results/<новый>.json
+
+По умолчанию результат сохраняется в bench/results/<короткий hash коммита>.json.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bench.bench_import import ENTRY_POINTS, import_seconds
+from bench.mirror import MirrorConfig, start_mirror
+from src.core.log import setup_logging
+from src.core.parser_manager import get_parser
+from src.parsers.base_parser import BaseMangaParser
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+PROXY_IMAGES = 30
+BULK_CHAPTERS = 20
+PROXY_CONCURRENCY = 8
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def measure(fn: Callable[[], Awaitable[int]], repeat: int) -> Dict[str, float]:
+    """
+    Выполнить fn repeat раз (плюс один прогон-разогрев без замера). fn возвращает
+    число обработанных единиц (результатов, страниц, байт — см. описание случая)
+    для расчёта пропускной способности.
+    """
+    try:
+        await fn()
+    except Exception:
+        pass
+    times, units, errors = [], 0, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            done = await fn()
+            units += done
+            if not done:
+                # фикстуры всегда непустые: пустой ответ — ошибка зеркала (503 и т.п.)
+                errors += 1
+        except Exception as e:
+            errors += 1
+            print(f"  ошибка: {type(e).__name__}: {e}")
+        times.append(time.perf_counter() - start)
+    total = sum(times)
+    return {
+        "runs": repeat,
+        "errors": errors,
+        "mean_ms": round(statistics.mean(times) * 1000, 3),
+        "p50_ms": round(statistics.median(times) * 1000, 3),
+        "p95_ms": round(_percentile(times, 0.95) * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3),
+        "units_per_s": round(units / total, 2) if total else 0,
+    }
+
+
+class Suite:
+    def __init__(self, base_url: str, repeat: int):
+        self.base = base_url
+        self.repeat = repeat
+        self.results: Dict[str, Dict[str, float]] = {}
+
+    async def case(self, name: str, fn: Callable[[], Awaitable[int]], repeat: Optional[int] = None) -> None:
+        self.results[name] = await measure(fn, repeat or self.repeat)
+        r = self.results[name]
+        print(f"{name:<26} p50 {r['p50_ms']:>9.2f} мс   p95 {r['p95_ms']:>9.2f} мс   "
+              f"{r['units_per_s']:>10.1f} ед/с   ошибок {r['errors']}")
+
+    # лимит частоты из конфига выключен: меряется сам парсер, а не вежливость к сайту
+    def readmanga(self) -> BaseMangaParser:
+        return get_parser("readmanga", base_url=self.base, limited=False)
+
+    def desucity(self) -> BaseMangaParser:
+        return get_parser("desucity", base_url=self.base, limited=False)
+
+    # --- поиск: единица — найденная манга ---
+    async def search(self) -> None:
+        async with self.readmanga() as rm:
+            await self.case("search.readmanga", lambda: self._count(rm.search_manga("Тень", max_pages=2)))
+        async with self.desucity() as desu:
+            await self.case("search.desucity", lambda: self._count(desu.search_manga("Тень")))
+
+    # --- информация о манге: единица — глава в списке ---
+    async def info(self) -> None:
+        url = f"{self.base}/test_manga"
+        async with self.readmanga() as rm:
+            await self.case("info.readmanga", lambda: self._chapters(rm.get_manga_info(url)))
+            info = await rm.get_manga_info(url)
+        async with self.desucity() as desu:
+            await self.case("info.desucity",
+                            lambda: self._chapters(desu.get_manga_info(f"{self.base}/manga/desu_manga.1/")))
+
+        # та же информация из БД: так отвечает /api/info, пока она не устарела
+        import src.web.server as srv
+        from src.core import database
+
+        tmp = Path(tempfile.mkdtemp(prefix="mm-bench-"))
+        db_path, database.DB_PATH = database.DB_PATH, tmp / "db.sqlite"
+        try:
+            database.init_db()
+            database.save_manga_info(url, info)
+            await self.case("info.db",
+                            lambda: self._chapters(asyncio.to_thread(lambda: srv._info_from_db(url, True)[0])))
+        finally:
+            database.DB_PATH = db_path
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    # --- извлечение изображений главы: единица — изображение ---
+    async def images(self) -> None:
+        async with self.readmanga() as rm:
+            await self.case("images.readmanga",
+                            lambda: self._count(rm.get_chapter_images(f"{self.base}/test_manga/vol1/1")))
+        async with self.desucity() as desu:
+            await self.case("images.desucity",
+                            lambda: self._count(desu.get_chapter_images(f"{self.base}/manga/desu_manga.1/vol1/ch1/rus")))
+
+        # все главы манги: по одной подряд против get_images_for_chapters
+        chapters = [f"{self.base}/test_manga/vol1/{i}" for i in range(1, BULK_CHAPTERS + 1)]
+        async with self.readmanga() as rm:
+            async def sequential() -> int:
+                return sum([len(await rm.get_chapter_images(url)) for url in chapters])
+
+            async def bulk() -> int:
+                return sum([len(ch.images) async for ch in rm.get_images_for_chapters(chapters, concurrency=8)])
+
+            await self.case("images.chapters_sequential", sequential, max(1, self.repeat // 3))
+            await self.case("images.chapters_bulk", bulk, max(1, self.repeat // 3))
+
+    # --- скачивание главы: единица — байт на диске ---
+    async def download(self) -> None:
+        repeat = max(1, self.repeat // 3)
+        chapter_url = f"{self.base}/test_manga/vol1/1"
+        tmp = Path(tempfile.mkdtemp(prefix="mm-bench-"))
+        try:
+            async with self.readmanga() as rm:
+                async def folder() -> int:
+                    out = tmp / "folder"
+                    shutil.rmtree(out, ignore_errors=True)
+                    files = await rm.download_chapter(chapter_url, str(out))
+                    return sum(Path(f).stat().st_size for f in files)
+
+                async def cbz() -> int:
+                    out = tmp / "cbz"
+                    await rm.download_chapter(chapter_url, str(out), cbz=True)
+                    return (tmp / "cbz.cbz").stat().st_size
+
+                await self.case("download.folder", folder, repeat)
+                await self.case("download.cbz", cbz, repeat)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    # --- прокси изображений: единица — отданная картинка ---
+    async def proxy(self) -> None:
+        import httpx
+        import src.web.server as srv
+        from src.core.cache import ImageCache
+
+        urls = [f"{self.base}/img/proxy/{i:03d}.jpg" for i in range(PROXY_IMAGES)]
+        semaphore = asyncio.Semaphore(PROXY_CONCURRENCY)
+
+        async def fetch_all(client, params: dict) -> int:
+            async def one(url: str) -> None:
+                async with semaphore:
+                    resp = await client.get("/api/proxy", params={"url": url, **params})
+                    resp.raise_for_status()
+            await asyncio.gather(*(one(u) for u in urls))
+            return len(urls)
+
+        async def cold(client, params: dict) -> int:
+            # пустой кэш: каждая картинка скачивается с зеркала (и перекодируется)
+            srv.image_cache = ImageCache(name="images")
+            return await fetch_all(client, params)
+
+        webp = {"w": 600, "fmt": "webp"}
+        try:
+            async with httpx.AsyncClient(app=srv.app, base_url="http://bench") as client:
+                await self.case("proxy.cold", lambda: cold(client, {}))
+                await self.case("proxy.warm", lambda: fetch_all(client, {}))
+                await self.case("proxy.transcode_cold", lambda: cold(client, webp), max(1, self.repeat // 3))
+                await self.case("proxy.transcode_warm", lambda: fetch_all(client, webp))
+        finally:
+            await srv._shutdown_image_pool()
+
+    # --- время импорта (python -X importtime, свежий интерпретатор): единица — импорт ---
+    async def imports(self) -> None:
+        for module in ENTRY_POINTS:
+            await self.case(f"imports.{module.rsplit('.', 1)[-1]}", lambda: self._import(module),
+                            max(1, self.repeat // 2))
+
+    @staticmethod
+    async def _import(module: str) -> int:
+        # measure() меряет время процесса целиком; своё время импорта — в bench.bench_import
+        await asyncio.to_thread(import_seconds, module)
+        return 1
+
+    @staticmethod
+    async def _count(aw) -> int:
+        return len(await aw)
+
+    @staticmethod
+    async def _chapters(aw) -> int:
+        return len((await aw).chapters)
+
+
+CASES = ("search", "info", "images", "download", "proxy", "imports")
+
+
+def _parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Бенчмарки MangaMonitor на локальном зеркале")
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--latency", type=float, default=0, help="задержка зеркала, мс")
+    ap.add_argument("--jitter", type=float, default=0, help="случайная добавка к задержке, мс")
+    ap.add_argument("--errors", type=float, default=0, help="доля ответов 503 (0..1)")
+    ap.add_argument("--only", default="", help=f"через запятую: {', '.join(CASES)}")
+    ap.add_argument("--out", help="файл результата (по умолчанию bench/results/<commit>.json)")
+    return ap.parse_args()
+
+
+async def main(args: argparse.Namespace) -> Dict:
+    config = MirrorConfig(args.latency / 1000, args.jitter / 1000, args.errors)
+    runner, mirror = await start_mirror(config)
+    suite = Suite(mirror.base_url, args.repeat)
+    selected = [c for c in args.only.split(",") if c] or list(CASES)
+    try:
+        for name in selected:
+            if name not in CASES:
+                raise SystemExit(f"Неизвестный бенчмарк: {name}")
+            await getattr(suite, name)()
+    finally:
+        await runner.cleanup()
+    return {
+        "commit": _git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"repeat": args.repeat, "latency_ms": args.latency, "jitter_ms": args.jitter,
+                   "error_rate": args.errors},
+        "mirror": mirror.stats,
+        "results": suite.results,
+    }
+
+
+if __name__ == "__main__":
+    # уровень из MANGAMONITOR_LOG_LEVEL: без настройки loguru пишет DEBUG каждого запроса в вывод бенчмарка
+    setup_logging()
+    arguments = _parse_args()
+    report = asyncio.run(main(arguments))
+    out = Path(arguments.out) if arguments.out else RESULTS_DIR / f"{report['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Результат: {out}", file=sys.stderr)
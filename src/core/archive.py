@@ -0,0 +1,221 @@
+# src/core/archive.py
+"""
+Экспорт глав в CBZ (zip без сжатия + ComicInfo.xml).
+Страницы пишутся в архив потоково, по мере получения, поэтому глава целиком
+в памяти не держится. Умеет писать и в файл, и в поток без seek (HTTP-ответ).
+
+Упаковка уже скачанных папок:
+    python -m src.core.archive [data/downloads] [--remove]
+"""
+import hashlib
+import os
+import shutil
+import sys
+import zipfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+from xml.etree import ElementTree as ET
+
+from src.core.log import get_logger, setup_logging
+
+if TYPE_CHECKING:
+    from src.parsers.models import Chapter, MangaInfo
+
+log = get_logger("cbz")
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif"}
+COMIC_INFO_NAME = "ComicInfo.xml"
+
+
+def page_name(index: int, ext: str) -> str:
+    """Имя страницы в архиве: 001.jpg — чтобы читалки сортировали правильно"""
+    return f"{index:03d}{ext or '.jpg'}"
+
+
+def member_ref(cbz_path: str, name: str) -> str:
+    """Ссылка на страницу внутри архива для page.local_path: <файл.cbz>#<имя>"""
+    return f"{cbz_path}#{name}"
+
+
+def comic_info_xml(info: Optional["MangaInfo"], chapter: Optional["Chapter"] = None,
+                   page_count: Optional[int] = None, url: Optional[str] = None) -> bytes:
+    """ComicInfo.xml из результата get_manga_info (и выбранной главы)"""
+    root = ET.Element("ComicInfo")
+
+    def add(tag: str, value) -> None:
+        if value:
+            ET.SubElement(root, tag).text = str(value)
+
+    add("Title", chapter.title if chapter else None)
+    if info is not None:
+        add("Series", info.title)
+        add("LocalizedSeries", info.eng_name or info.orig_name)
+        add("Summary", info.description)
+        add("Writer", info.author)
+        year = str(info.year or "")
+        add("Year", year if year.isdigit() else None)
+        add("Genre", ", ".join(info.genres or []))
+    add("Web", url)
+    add("PageCount", page_count)
+    add("LanguageISO", "ru")
+    add("Manga", "YesAndRightToLeft")
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+class ChunkSink:
+    """Файлоподобный приёмник без seek: копит записанное до drain()"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class CbzWriter:
+    """Потоковая запись CBZ. Изображения уже сжаты, поэтому ZIP_STORED."""
+
+    def __init__(self, target):
+        self._zip = zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def add_comic_info(self, xml: bytes) -> None:
+        self._zip.writestr(COMIC_INFO_NAME, xml)
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        self._zip.writestr(name, data)
+
+    def open_page(self, name: str):
+        """Открыть запись страницы на запись кусками: with cbz.open_page(name) as f: f.write(chunk)"""
+        zinfo = zipfile.ZipInfo(name)
+        zinfo.compress_type = zipfile.ZIP_STORED
+        return self._zip.open(zinfo, "w", force_zip64=True)
+
+    def copy_page(self, src: zipfile.ZipFile, name: str) -> None:
+        """Перенести страницу из другого архива (докачка главы) кусками, без распаковки в память"""
+        with src.open(name) as f, self.open_page(name) as dst:
+            shutil.copyfileobj(f, dst, 1024 * 1024)
+
+
+def open_cbz(cbz_path: str) -> Optional[zipfile.ZipFile]:
+    """Открыть существующий архив на чтение; None — архива нет или он битый"""
+    try:
+        return zipfile.ZipFile(cbz_path)
+    except (OSError, zipfile.BadZipFile):
+        return None
+
+
+def member_sha256(zf: zipfile.ZipFile, name: str) -> str:
+    sha = hashlib.sha256()
+    with zf.open(name) as f:
+        while chunk := f.read(1024 * 1024):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def read_member(ref: str) -> Optional[bytes]:
+    """Прочитать страницу по ссылке <файл.cbz>#<имя>"""
+    cbz_path, _, name = ref.partition("#")
+    try:
+        with zipfile.ZipFile(cbz_path) as zf:
+            return zf.read(name)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+
+def _sorted_pages(folder: Path) -> List[Path]:
+    files = [p for p in folder.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_EXTS]
+    return sorted(files, key=lambda p: (int(p.stem) if p.stem.isdigit() else sys.maxsize, p.name))
+
+
+def pack_chapter_dir(folder: Path, info: Optional["MangaInfo"] = None,
+                     remove_source: bool = False) -> Tuple[Path, List[Tuple[str, str]]]:
+    """
+    Упаковать папку главы в <папка>.cbz рядом с ней.
+    Возвращает путь к архиву и пары (старый путь файла, ссылка на страницу в архиве).
+    """
+    from src.parsers.models import Chapter, MangaInfo
+
+    pages = _sorted_pages(folder)
+    cbz_path = folder.parent / f"{folder.name}.cbz"
+    tmp_path = folder.parent / f"{folder.name}.cbz.part"
+    moved: List[Tuple[str, str]] = []
+
+    with CbzWriter(tmp_path) as cbz:
+        cbz.add_comic_info(comic_info_xml(info or MangaInfo(title=folder.parent.name),
+                                          Chapter(folder.name, ""), len(pages)))
+        for idx, page in enumerate(pages, 1):
+            name = page_name(idx, page.suffix.lower())
+            with open(page, "rb") as src, cbz.open_page(name) as dst:
+                while chunk := src.read(1024 * 1024):
+                    dst.write(chunk)
+            moved.append((str(page), member_ref(str(cbz_path), name)))
+    os.replace(tmp_path, cbz_path)
+
+    if remove_source:
+        from src.core.database import PROJECT_ROOT, unlink_blobs
+
+        # страница могла быть ссылкой на blob — уменьшаем его счётчик (путь в БД
+        # бывает и абсолютным, и относительным), иначе blob-хранилище не освободит место
+        unlink_blobs(sorted({path for page in pages for path in (str(page), os.path.relpath(page, PROJECT_ROOT))}))
+        for page in pages:
+            page.unlink()
+        try:
+            folder.rmdir()
+        except OSError:
+            pass
+    return cbz_path, moved
+
+
+def pack_downloads(root: Path, remove_source: bool = False) -> List[Path]:
+    """Упаковать все папки глав data/downloads/<манга>/<глава>/ и обновить пути в БД"""
+    from src.core.database import PROJECT_ROOT, relocate_pages
+
+    archives = []
+    for manga_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        for chapter_dir in sorted(p for p in manga_dir.iterdir() if p.is_dir()):
+            if not _sorted_pages(chapter_dir):
+                continue
+            cbz_path, moved = pack_chapter_dir(chapter_dir, remove_source=remove_source)
+            if remove_source:
+                # в БД пути бывают и абсолютными (CLI), и относительными (сервер)
+                pairs = []
+                for old, new in moved:
+                    pairs.append((old, new))
+                    pairs.append((os.path.relpath(old, PROJECT_ROOT), new))
+                relocate_pages(pairs)
+            archives.append(cbz_path)
+            log.info("{} -> {} ({} стр.)", chapter_dir, cbz_path, len(moved))
+    return archives
+
+
+def _parse_args(argv: Iterable[str]) -> Tuple[Path, bool]:
+    args = list(argv)
+    remove = "--remove" in args
+    paths = [a for a in args if not a.startswith("--")]
+    from src.core.database import DATA_DIR
+    return (Path(paths[0]) if paths else DATA_DIR / "downloads"), remove
+
+
+if __name__ == "__main__":
+    setup_logging()
+    root, remove = _parse_args(sys.argv[1:])
+    packed = pack_downloads(root, remove_source=remove)
+    print(f"Упаковано глав: {len(packed)}")
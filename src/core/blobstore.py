@@ -0,0 +1,186 @@
+# src/core/blobstore.py
+"""
+Дедупликация скачанных изображений.
+
+Зеркала семейства readmanga часто отдают побайтно одинаковые сканы, поэтому
+страница хэшируется (sha256) прямо во время скачивания и хранится один раз
+в data/blobs/<2 символа>/<hash><ext>. Файлы глав — жёсткие ссылки на blob;
+таблица blob считает ссылки, так что сборка мусора удаляет только ничьи файлы.
+
+    python -m src.core.blobstore report   # сколько места сэкономлено
+    python -m src.core.blobstore import   # перевести уже скачанные папки на blob-ы
+    python -m src.core.blobstore gc       # удалить blob-ы без ссылок
+"""
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.core import database
+
+BLOBS_DIR = database.DATA_DIR / "blobs"
+
+
+class BlobWriter:
+    """Временный файл, который считает sha256 на лету по мере записи кусков"""
+
+    def __init__(self, root: Path):
+        root.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=root, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self) -> None:
+        self.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+    @property
+    def digest(self) -> str:
+        return self._hash.hexdigest()
+
+
+class BlobStore:
+    def __init__(self, root: Path = BLOBS_DIR):
+        self.root = root
+
+    def writer(self) -> BlobWriter:
+        return BlobWriter(self.root)
+
+    def _blob_path(self, digest: str, ext: str) -> Path:
+        return self.root / digest[:2] / f"{digest}{ext}"
+
+    def commit(self, writer: BlobWriter, ext: str) -> Tuple[str, str]:
+        """Положить записанное в хранилище (если такого содержимого ещё нет). -> (hash, путь blob-а)"""
+        writer.close()
+        return writer.digest, self._commit_file(writer.tmp_path, writer.digest, writer.size, ext)
+
+    def _commit_file(self, tmp_path: str, digest: str, size: int, ext: str) -> str:
+        """Перенести файл с содержимым digest в хранилище (или удалить, если такой blob есть)"""
+        row = database.get_blob(digest)
+        if row is not None and os.path.exists(row[1]):
+            if os.path.getsize(row[1]) != size:
+                # blob испорчен (файл главы изменили на месте) — заменяем целым
+                os.replace(tmp_path, row[1])
+            else:
+                os.remove(tmp_path)
+            return row[1]
+        path = self._blob_path(digest, ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+        database.add_blob(digest, str(path), size)
+        return str(path)
+
+    def link(self, digest: str, blob_path: str, dest: str) -> None:
+        """Сделать dest жёсткой ссылкой на blob (без поддержки ссылок — копией)"""
+        try:
+            if os.path.exists(dest):
+                if os.path.samefile(dest, blob_path):
+                    database.link_blob(dest, digest)
+                    return
+                os.remove(dest)
+            os.link(blob_path, dest)
+        except OSError:
+            # ФС без жёстких ссылок: страница хранится копией и в учёт не попадает
+            shutil.copyfile(blob_path, dest)
+            database.unlink_blob(dest)
+            return
+        database.link_blob(dest, digest)
+
+    def store(self, writer: BlobWriter, dest: str) -> str:
+        """commit + link: записанная страница оказывается в dest. Вернёт hash."""
+        digest, blob_path = self.commit(writer, os.path.splitext(dest)[1])
+        self.link(digest, blob_path, dest)
+        return digest
+
+    def adopt(self, path: str, digest: str, dest: str) -> None:
+        """
+        Готовый файл path с известным sha256 (например, докачанный .part) —
+        в хранилище, а dest — ссылкой на него
+        """
+        blob_path = self._commit_file(path, digest, os.path.getsize(path), os.path.splitext(dest)[1])
+        self.link(digest, blob_path, dest)
+
+    def release(self, dest: str) -> None:
+        """Удалить файл главы и уменьшить счётчик ссылок его blob-а"""
+        database.unlink_blob(dest)
+        try:
+            os.remove(dest)
+        except OSError:
+            pass
+
+    def import_file(self, path: str) -> str:
+        """Перевести уже скачанный файл на blob (тот же путь становится ссылкой)"""
+        writer = self.writer()
+        try:
+            with open(path, "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    writer.write(chunk)
+        except OSError:
+            writer.discard()
+            raise
+        return self.store(writer, path)
+
+    def gc(self) -> Tuple[int, int]:
+        """Удалить blob-ы без ссылок. -> (файлов, байт)"""
+        rows = database.get_unreferenced_blobs()
+        freed = 0
+        for _, path, size in rows:
+            try:
+                os.remove(path)
+                freed += size or 0
+            except FileNotFoundError:
+                pass
+        database.delete_blobs([digest for digest, _, _ in rows])
+        return len(rows), freed
+
+    @staticmethod
+    def report() -> Dict[str, int]:
+        blobs, links, stored, logical = database.get_blob_stats()
+        return {
+            "blobs": blobs,
+            "links": links,
+            "stored_bytes": stored,
+            "logical_bytes": logical,
+            "saved_bytes": logical - stored,
+        }
+
+
+def import_downloads(root: Path, store: Optional[BlobStore] = None) -> int:
+    """Перевести все файлы в data/downloads на blob-ы. Вернёт число файлов."""
+    store = store or BlobStore()
+    count = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith((".part", ".cbz")):
+                continue
+            store.import_file(os.path.join(dirpath, name))
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    database.init_db()
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    blob_store = BlobStore()
+    if command == "import":
+        print(f"Обработано файлов: {import_downloads(database.DATA_DIR / 'downloads', blob_store)}")
+    elif command == "gc":
+        files, freed = blob_store.gc()
+        print(f"Удалено blob-ов: {files}, освобождено байт: {freed}")
+    print(blob_store.report())
@@ -0,0 +1,97 @@
+# src/core/cache.py
+"""
+Простые in-memory кэши веб-сервера:
+- TTLCache — метаданные (списки страниц глав, информация о манге);
+- ImageCache — байты изображений с ограничением по суммарному объёму (LRU).
+Кэш с именем считает попадания и промахи get() в метриках (/metrics).
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from src.core.metrics import CACHE_REQUESTS
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU-кэш с ограничением по количеству записей и времени жизни"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 600, name: str = ""):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def _lookup(self, key: Hashable) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._lookup(key)
+        if self.name:
+            CACHE_REQUESTS.inc(cache=self.name, result="miss" if value is _MISSING else "hit")
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        value = self._lookup(key)
+        return value is not _MISSING and value is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ImageCache:
+    """LRU-кэш изображений: ключ -> (байты, content-type), лимит в байтах"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, name: str = ""):
+        self.max_bytes = max_bytes
+        self.name = name
+        self.size = 0
+        self._data: "OrderedDict[Hashable, Tuple[bytes, str]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Tuple[bytes, str]]:
+        item = self._data.get(key)
+        if item is not None:
+            self._data.move_to_end(key)
+        if self.name:
+            CACHE_REQUESTS.inc(cache=self.name, result="miss" if item is None else "hit")
+        return item
+
+    async def aget(self, key: Hashable) -> Optional[Tuple[bytes, str]]:
+        """Тот же интерфейс, что у DiskImageCache: в памяти ждать нечего"""
+        return self.get(key)
+
+    async def aset(self, key: Hashable, data: bytes, content_type: str) -> None:
+        self.set(key, data, content_type)
+
+    def set(self, key: Hashable, data: bytes, content_type: str) -> None:
+        if len(data) > self.max_bytes:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.size -= len(old[0])
+        self._data[key] = (data, content_type)
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, (evicted, _) = self._data.popitem(last=False)
+            self.size -= len(evicted)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
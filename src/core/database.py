@@ -3,14 +3,18 @@
 Минимальная синхронная обёртка SQLite для хранения манги/глав/страниц.
 DB и папки data/ создаются в корне проекта (MangaMonitor/data).
 """
+import json
 import sqlite3
+import sys
+import time
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+
+from src.core.metrics import DB_SECONDS
 
 # Project root: ../.. from src/core (file is src/core/database.py)
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 DATA_DIR = PROJECT_ROOT / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 DB_PATH = DATA_DIR / "db.sqlite"
 
@@ -36,16 +40,132 @@ CREATE TABLE IF NOT EXISTS page (
     local_path TEXT,
     FOREIGN KEY(chapter_id) REFERENCES chapter(id)
 );
+-- страницы в упакованном хранилище: data/packs/<manga_id>.pack, срез [offset, offset+length)
+CREATE TABLE IF NOT EXISTS packed_page (
+    page_id INTEGER PRIMARY KEY,
+    manga_id INTEGER,
+    offset INTEGER,
+    length INTEGER,
+    mime TEXT,
+    FOREIGN KEY(page_id) REFERENCES page(id),
+    FOREIGN KEY(manga_id) REFERENCES manga(id)
+);
+CREATE INDEX IF NOT EXISTS idx_packed_page_manga ON packed_page(manga_id, offset);
+-- контентно-адресуемое хранилище изображений: один файл на sha256
+CREATE TABLE IF NOT EXISTS blob (
+    hash TEXT PRIMARY KEY,
+    path TEXT,
+    size INTEGER,
+    refcount INTEGER DEFAULT 0
+);
+-- файлы глав (жёсткие ссылки), указывающие на blob
+CREATE TABLE IF NOT EXISTS blob_link (
+    path TEXT PRIMARY KEY,
+    hash TEXT,
+    FOREIGN KEY(hash) REFERENCES blob(hash)
+);
+CREATE INDEX IF NOT EXISTS idx_blob_refcount ON blob(refcount);
+CREATE INDEX IF NOT EXISTS idx_page_chapter ON page(chapter_id, page_index);
+-- прогресс чтения: последняя открытая страница главы (src/core/progress.py)
+CREATE TABLE IF NOT EXISTS reading_progress (
+    chapter_url TEXT PRIMARY KEY,
+    manga_url TEXT,
+    page INTEGER,
+    total INTEGER,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_progress_updated ON reading_progress(updated_at);
+CREATE INDEX IF NOT EXISTS idx_progress_manga ON reading_progress(manga_url, updated_at);
+-- хосты, вручную переведённые в офлайн-режим (src/core/offline.py); "*" — все
+CREATE TABLE IF NOT EXISTS offline_host (
+    host TEXT PRIMARY KEY,
+    since REAL
+);
 """
 
+# Колонки, добавленные после первой версии схемы: в старых БД их создаёт init_db()
+_columns = {
+    "manga": {
+        "chapters_updated_at": "REAL",
+        # полная информация со страницы манги (get_manga_info); genres — JSON-список
+        "eng_name": "TEXT",
+        "orig_name": "TEXT",
+        "description": "TEXT",
+        "author": "TEXT",
+        "year": "TEXT",
+        "category": "TEXT",
+        "genres": "TEXT",
+        # когда информация получена с сайта; NULL — в БД только название и главы
+        "info_updated_at": "REAL",
+        # учёт скачанного (src/core/storage.py): байт и страниц на диске
+        "stored_bytes": "INTEGER DEFAULT 0",
+        "stored_pages": "INTEGER DEFAULT 0",
+    },
+    "page": {
+        # размер и sha256 скачанного файла — проверка при повторном скачивании
+        "size": "INTEGER",
+        "hash": "TEXT",
+        # последняя ошибка скачивания страницы (NULL — скачана или не скачивалась)
+        "error": "TEXT",
+    },
+    "chapter": {
+        "number": "REAL",
+        "position": "INTEGER",
+        "date": "TEXT",
+        "stored_bytes": "INTEGER DEFAULT 0",
+        "stored_pages": "INTEGER DEFAULT 0",
+        # когда глава скачана и когда последний раз открыта — порядок вытеснения (LRU)
+        "saved_at": "REAL",
+        "read_at": "REAL",
+        # когда последний раз записан список страниц — свежесть для офлайн-режима
+        "pages_updated_at": "REAL",
+    },
+}
+
+# Индексы по добавленным колонкам — после миграции колонок
+_indexes = """
+CREATE INDEX IF NOT EXISTS idx_chapter_manga_position ON chapter(manga_id, position);
+CREATE INDEX IF NOT EXISTS idx_chapter_manga_number ON chapter(manga_id, number);
+CREATE INDEX IF NOT EXISTS idx_page_failed ON page(chapter_id) WHERE error IS NOT NULL;
+-- скачанная страница по исходному URL (прокси без сети)
+CREATE INDEX IF NOT EXISTS idx_page_local_url ON page(url) WHERE local_path IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_chapter_lru ON chapter(COALESCE(read_at, saved_at, 0)) WHERE stored_bytes > 0;
+CREATE INDEX IF NOT EXISTS idx_chapter_manga_lru ON chapter(manga_id, COALESCE(read_at, saved_at, 0))
+    WHERE stored_bytes > 0;
+"""
+
+class _TimedConnection(sqlite3.Connection):
+    """Соединение, которое при закрытии пишет в метрики длительность вызвавшей функции"""
+
+    def close(self) -> None:
+        super().close()
+        DB_SECONDS.observe(time.perf_counter() - self.started, query=self.query)
+
+
 def _get_conn():
-    conn = sqlite3.connect(str(DB_PATH))
+    # каждая функция модуля открывает и закрывает своё соединение — её имя и есть метка запроса
+    conn = sqlite3.connect(str(DB_PATH), factory=_TimedConnection)
+    conn.started = time.perf_counter()
+    conn.query = sys._getframe(1).f_code.co_name
     return conn
 
+def _ensure_columns(cur):
+    for table, columns in _columns.items():
+        cur.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cur.fetchall()}
+        for name, decl in columns.items():
+            if name not in existing:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
 def init_db():
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
     conn = _get_conn()
     cur = conn.cursor()
+    # WAL: читатели не ждут писателя — важно, когда с БД работают несколько воркеров сервера
+    cur.execute("PRAGMA journal_mode=WAL")
     cur.executescript(_schema)
+    _ensure_columns(cur)
+    cur.executescript(_indexes)
     conn.commit()
     conn.close()
 
@@ -81,10 +201,121 @@ def save_page(chapter_id: int, page_index: int, url: str, local_path: Optional[s
     conn.commit()
     conn.close()
 
+def save_page_urls(chapters: List[Tuple[str, List[str]]]) -> int:
+    """
+    URL страниц нескольких глав одной транзакцией: (url главы, [url страницы, ...]).
+    Главы уже должны быть в БД (save_manga_info); у существующих страниц
+    обновляется только url — local_path скачанных сохраняется. Вернёт число страниц.
+    """
+    rows = [(ch_url, idx, img) for ch_url, images in chapters for idx, img in enumerate(images, 1)]
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.executemany(
+        "UPDATE page SET url = ?3 WHERE page_index = ?2 AND chapter_id = (SELECT id FROM chapter WHERE url = ?1)",
+        rows
+    )
+    cur.executemany(
+        "INSERT INTO page(chapter_id, page_index, url) SELECT c.id, ?2, ?3 FROM chapter c WHERE c.url = ?1 "
+        "AND NOT EXISTS (SELECT 1 FROM page p WHERE p.chapter_id = c.id AND p.page_index = ?2)",
+        rows
+    )
+    cur.executemany("UPDATE chapter SET pages_updated_at = ? WHERE url = ?",
+                    [(time.time(), ch_url) for ch_url, _ in chapters])
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+def get_downloaded_pages(chapter_id: int) -> Dict[int, Tuple[int, Optional[str], str]]:
+    """
+    Скачанные страницы главы: номер -> (размер, sha256, local_path).
+    Страница из pack-файла (local_path "pack:...") — только если её запись в packed_page на месте.
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT p.page_index, p.size, p.hash, p.local_path FROM page p "
+        "LEFT JOIN packed_page pp ON pp.page_id = p.id "
+        "WHERE p.chapter_id = ? AND p.local_path IS NOT NULL AND p.size IS NOT NULL "
+        "AND (p.local_path NOT LIKE 'pack:%' OR pp.page_id IS NOT NULL)",
+        (chapter_id,)
+    )
+    rows = {idx: (size, digest, local_path) for idx, size, digest, local_path in cur.fetchall()}
+    conn.close()
+    return rows
+
+def save_downloaded_pages(chapter_id: int, rows: List[Tuple[int, str, Optional[str], Optional[int],
+                                                            Optional[str], Optional[str]]]):
+    """
+    Результат скачивания страниц главы одной транзакцией:
+    rows — (номер, url, local_path, размер, sha256, ошибка); у не скачавшихся local_path = None.
+    Там же обновляются счётчики занятого места главы и манги.
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.executemany(
+        "UPDATE page SET url = ?3, local_path = ?4, size = ?5, hash = ?6, error = ?7 "
+        "WHERE chapter_id = ?1 AND page_index = ?2",
+        [(chapter_id, *row) for row in rows]
+    )
+    cur.executemany(
+        "INSERT INTO page(chapter_id, page_index, url, local_path, size, hash, error) "
+        "SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7 "
+        "WHERE NOT EXISTS (SELECT 1 FROM page WHERE chapter_id = ?1 AND page_index = ?2)",
+        [(chapter_id, *row) for row in rows]
+    )
+    cur.execute("UPDATE chapter SET pages_updated_at = ? WHERE id = ?", (time.time(), chapter_id))
+    _recount_chapter(cur, chapter_id)
+    conn.commit()
+    conn.close()
+
+def _recount_chapter(cur, chapter_id: int):
+    """Пересчитать место главы по её страницам и перенести разницу в счётчик манги"""
+    cur.execute("SELECT manga_id, COALESCE(stored_bytes, 0), COALESCE(stored_pages, 0) FROM chapter WHERE id = ?",
+                (chapter_id,))
+    manga_id, old_bytes, old_pages = cur.fetchone()
+    cur.execute(
+        "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM page "
+        "WHERE chapter_id = ? AND local_path IS NOT NULL AND size IS NOT NULL",
+        (chapter_id,)
+    )
+    new_bytes, new_pages = cur.fetchone()
+    cur.execute("UPDATE chapter SET stored_bytes = ?, stored_pages = ? WHERE id = ?", (new_bytes, new_pages, chapter_id))
+    cur.execute(
+        "UPDATE manga SET stored_bytes = COALESCE(stored_bytes, 0) + ?, stored_pages = COALESCE(stored_pages, 0) + ? "
+        "WHERE id = ?",
+        (new_bytes - old_bytes, new_pages - old_pages, manga_id)
+    )
+
+def get_failed_chapters(manga_url: Optional[str] = None) -> List[Tuple]:
+    """(url манги, url главы, не скачалось страниц) — главы для повторного прохода"""
+    sql = (
+        "SELECT m.url, c.url, COUNT(*) FROM page p "
+        "JOIN chapter c ON c.id = p.chapter_id JOIN manga m ON m.id = c.manga_id "
+        "WHERE p.error IS NOT NULL"
+    )
+    params: tuple = ()
+    if manga_url is not None:
+        sql += " AND m.url = ?"
+        params = (manga_url,)
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(sql + " GROUP BY c.id ORDER BY m.id, c.position", params)
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def relocate_pages(moves: List[Tuple[str, str]]):
+    """Обновить local_path страниц: пары (старый путь, новый путь)"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.executemany("UPDATE page SET local_path = ? WHERE local_path = ?", [(new, old) for old, new in moves])
+    conn.commit()
+    conn.close()
+
 def mark_chapter_saved(chapter_id: int):
     conn = _get_conn()
     cur = conn.cursor()
-    cur.execute("UPDATE chapter SET saved = 1 WHERE id = ?", (chapter_id,))
+    cur.execute("UPDATE chapter SET saved = 1, saved_at = ? WHERE id = ?", (time.time(), chapter_id))
     conn.commit()
     conn.close()
 
@@ -95,3 +326,568 @@ def get_manga_list() -> List[Tuple]:
     rows = cur.fetchall()
     conn.close()
     return rows
+
+def get_page(page_id: int) -> Optional[Tuple]:
+    """(id, chapter_id, page_index, url, local_path, manga_id)"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT p.id, p.chapter_id, p.page_index, p.url, p.local_path, c.manga_id "
+        "FROM page p JOIN chapter c ON c.id = p.chapter_id WHERE p.id = ?",
+        (page_id,)
+    )
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def get_local_page_id(url: str) -> Optional[int]:
+    """id скачанной страницы с исходным URL url"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM page WHERE url = ? AND local_path IS NOT NULL LIMIT 1", (url,))
+    row = cur.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def get_chapter_pages(chapter_id: int) -> List[Tuple]:
+    """(id, page_index, url, local_path) страниц главы по порядку"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT id, page_index, url, local_path FROM page WHERE chapter_id = ? ORDER BY page_index, id",
+        (chapter_id,)
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def get_unpacked_pages(manga_id: Optional[int] = None, chapter_id: Optional[int] = None) -> List[Tuple]:
+    """(page_id, manga_id, local_path) скачанных страниц, ещё не перенесённых в pack-файл (всех, манги или главы)"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    sql = (
+        "SELECT p.id, c.manga_id, p.local_path FROM page p "
+        "JOIN chapter c ON c.id = p.chapter_id "
+        "LEFT JOIN packed_page pp ON pp.page_id = p.id "
+        "WHERE p.local_path IS NOT NULL AND p.local_path != '' AND pp.page_id IS NULL"
+    )
+    params: tuple = ()
+    if manga_id is not None:
+        sql += " AND c.manga_id = ?"
+        params += (manga_id,)
+    if chapter_id is not None:
+        sql += " AND p.chapter_id = ?"
+        params += (chapter_id,)
+    cur.execute(sql + " ORDER BY c.manga_id, p.chapter_id, p.page_index", params)
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def get_archive_page_paths(cbz_path: str) -> List[str]:
+    """local_path всех страниц, лежащих в архиве cbz_path (<архив>#<страница>)"""
+    prefix = f"{cbz_path}#"
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT local_path FROM page WHERE substr(local_path, 1, ?) = ?", (len(prefix), prefix))
+    rows = [r[0] for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+def add_packed_pages(rows: List[Tuple[int, int, int, int, str]]):
+    """rows: (page_id, manga_id, offset, length, mime)"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT OR REPLACE INTO packed_page(page_id, manga_id, offset, length, mime) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+    conn.close()
+
+def get_packed_page(page_id: int) -> Optional[Tuple]:
+    """(manga_id, offset, length, mime)"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT manga_id, offset, length, mime FROM packed_page WHERE page_id = ?", (page_id,))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def get_packed_pages(manga_id: int) -> List[Tuple]:
+    """(page_id, offset, length, mime) в порядке расположения в pack-файле"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT page_id, offset, length, mime FROM packed_page WHERE manga_id = ? ORDER BY offset", (manga_id,))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def get_packed_manga_ids() -> List[int]:
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT manga_id FROM packed_page")
+    rows = [r[0] for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+def update_packed_offsets(rows: List[Tuple[int, int]]):
+    """rows: (page_id, новый offset) — после сжатия pack-файла"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.executemany("UPDATE packed_page SET offset = ? WHERE page_id = ?", [(off, pid) for pid, off in rows])
+    conn.commit()
+    conn.close()
+
+def set_page_local_path(page_ids: List[int], local_path: Optional[str]):
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.executemany("UPDATE page SET local_path = ? WHERE id = ?", [(local_path, pid) for pid in page_ids])
+    conn.commit()
+    conn.close()
+
+def get_blob(digest: str) -> Optional[Tuple]:
+    """(hash, path, size, refcount)"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT hash, path, size, refcount FROM blob WHERE hash = ?", (digest,))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def add_blob(digest: str, path: str, size: int):
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("INSERT OR IGNORE INTO blob(hash, path, size, refcount) VALUES (?, ?, ?, 0)", (digest, path, size))
+    conn.commit()
+    conn.close()
+
+def link_blob(path: str, digest: str) -> bool:
+    """Привязать файл к blob (refcount +1). False, если файл уже ссылался на этот blob."""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT hash FROM blob_link WHERE path = ?", (path,))
+    row = cur.fetchone()
+    if row and row[0] == digest:
+        conn.close()
+        return False
+    if row:
+        cur.execute("UPDATE blob SET refcount = refcount - 1 WHERE hash = ?", (row[0],))
+    cur.execute("INSERT OR REPLACE INTO blob_link(path, hash) VALUES (?, ?)", (path, digest))
+    cur.execute("UPDATE blob SET refcount = refcount + 1 WHERE hash = ?", (digest,))
+    conn.commit()
+    conn.close()
+    return True
+
+def unlink_blob(path: str) -> Optional[str]:
+    """Отвязать файл от blob (refcount -1); вернёт hash или None"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT hash FROM blob_link WHERE path = ?", (path,))
+    row = cur.fetchone()
+    if row:
+        cur.execute("DELETE FROM blob_link WHERE path = ?", (path,))
+        cur.execute("UPDATE blob SET refcount = refcount - 1 WHERE hash = ?", (row[0],))
+        conn.commit()
+    conn.close()
+    return row[0] if row else None
+
+def unlink_blobs(paths: List[str]):
+    """unlink_blob для многих файлов одной транзакцией"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.executemany(
+        "UPDATE blob SET refcount = refcount - 1 WHERE hash = (SELECT hash FROM blob_link WHERE path = ?)",
+        [(p,) for p in paths]
+    )
+    cur.executemany("DELETE FROM blob_link WHERE path = ?", [(p,) for p in paths])
+    conn.commit()
+    conn.close()
+
+def get_unreferenced_blobs() -> List[Tuple]:
+    """(hash, path, size) blob-ов без ссылок"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT hash, path, size FROM blob WHERE refcount <= 0")
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def delete_blobs(hashes: List[str]):
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.executemany("DELETE FROM blob WHERE hash = ? AND refcount <= 0", [(h,) for h in hashes])
+    conn.commit()
+    conn.close()
+
+def get_blob_stats() -> Tuple[int, int, int, int]:
+    """(число blob-ов, число ссылок, байт на диске, байт без дедупликации)"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*), COALESCE(SUM(refcount), 0), COALESCE(SUM(size), 0), "
+                "COALESCE(SUM(size * refcount), 0) FROM blob WHERE refcount > 0")
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def save_manga_info(manga_url: str, info) -> int:
+    """
+    Вся информация о манге (MangaInfo из get_manga_info) одной транзакцией: описание,
+    автор, жанры и т.д. и список глав (порядок — как в get_manga_info, по возрастанию);
+    отмечается время обновления. Вернёт id манги.
+    """
+    now = time.time()
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("INSERT OR IGNORE INTO manga(title, url) VALUES (?, ?)", (info.title, manga_url))
+    cur.execute("SELECT id FROM manga WHERE url = ?", (manga_url,))
+    manga_id = cur.fetchone()[0]
+    # главы, пропавшие из списка на сайте, не должны занимать позиции
+    cur.execute("UPDATE chapter SET position = NULL WHERE manga_id = ?", (manga_id,))
+    # позиции идут подряд с 0 (на это рассчитан курсор /api/chapters): повтор URL
+    # в списке сайта перезаписал бы позицию первой записи и оставил пропуск
+    rows, seen = [], set()
+    for ch in info.chapters:
+        if ch.url not in seen:
+            seen.add(ch.url)
+            rows.append((manga_id, ch.title, ch.url, ch.date, ch.number, len(rows)))
+    cur.executemany(
+        "INSERT INTO chapter(manga_id, title, url, date, number, position) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(url) DO UPDATE SET manga_id = excluded.manga_id, title = excluded.title, "
+        "date = excluded.date, number = excluded.number, position = excluded.position",
+        rows
+    )
+    cur.execute(
+        "UPDATE manga SET title = COALESCE(?, title), eng_name = ?, orig_name = ?, description = ?, author = ?, "
+        "year = ?, category = ?, genres = ?, chapters_updated_at = ?, info_updated_at = ? WHERE id = ?",
+        (info.title, info.eng_name, info.orig_name, info.description, info.author, info.year, info.category,
+         json.dumps(info.genres or [], ensure_ascii=False), now, now, manga_id)
+    )
+    conn.commit()
+    conn.close()
+    return manga_id
+
+def get_manga_by_url(url: str) -> Optional[Tuple]:
+    """(id, title, url, chapters_updated_at)"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT id, title, url, chapters_updated_at FROM manga WHERE url = ?", (url,))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def get_manga_meta(url: str) -> Optional[Tuple]:
+    """
+    (id, title, eng_name, orig_name, description, author, year, category, genres, info_updated_at,
+    chapters_updated_at); genres — список
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT id, title, eng_name, orig_name, description, author, year, category, genres, info_updated_at, "
+        "chapters_updated_at FROM manga WHERE url = ?",
+        (url,)
+    )
+    row = cur.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    return (*row[:8], json.loads(row[8]) if row[8] else [], *row[9:])
+
+def get_chapters_range(manga_id: int, after: Optional[int] = None, limit: int = 100,
+                       number_from: Optional[float] = None, number_to: Optional[float] = None) -> List[Tuple]:
+    """
+    Страница списка глав по порядку: (position, number, title, url, date, saved).
+    after — position последней полученной главы (курсор); limit=-1 — все главы.
+    """
+    sql = "SELECT position, number, title, url, date, saved FROM chapter WHERE manga_id = ? AND position IS NOT NULL"
+    params: list = [manga_id]
+    if after is not None:
+        sql += " AND position > ?"
+        params.append(after)
+    if number_from is not None:
+        sql += " AND number >= ?"
+        params.append(number_from)
+    if number_to is not None:
+        sql += " AND number <= ?"
+        params.append(number_to)
+    sql += " ORDER BY position LIMIT ?"
+    params.append(limit)
+
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def get_chapter_by_url(url: str) -> Optional[Tuple]:
+    """
+    (id, title, position, manga_id, url манги, название манги, pages_updated_at) главы;
+    url сравнивается как есть и без query (?mtr=true и т.п.)
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT c.id, c.title, c.position, c.manga_id, m.url, m.title, c.pages_updated_at "
+        "FROM chapter c JOIN manga m ON m.id = c.manga_id WHERE c.url IN (?, ?) ORDER BY c.url = ? DESC LIMIT 1",
+        (url, url.split("?", 1)[0], url)
+    )
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def get_neighbour_chapters(manga_id: int, position: Optional[int]) -> Tuple[Optional[str], Optional[str]]:
+    """URL предыдущей и следующей главы по position"""
+    if position is None:
+        return None, None
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT position, url FROM chapter WHERE manga_id = ? AND position IN (?, ?)",
+                (manga_id, position - 1, position + 1))
+    urls = dict(cur.fetchall())
+    conn.close()
+    return urls.get(position - 1), urls.get(position + 1)
+
+def count_chapters(manga_id: int) -> int:
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM chapter WHERE manga_id = ? AND position IS NOT NULL", (manga_id,))
+    count = cur.fetchone()[0]
+    conn.close()
+    return count
+
+def touch_chapter(url: str, at: float):
+    """Отметить, что главу открывали (read_at) — для порядка вытеснения"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("UPDATE chapter SET read_at = ? WHERE url = ? AND stored_bytes > 0", (at, url))
+    conn.commit()
+    conn.close()
+
+def get_storage_totals() -> Tuple[int, int, int]:
+    """(байт, страниц, манги) скачанного"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(SUM(stored_bytes), 0), COALESCE(SUM(stored_pages), 0), COUNT(*) "
+                "FROM manga WHERE stored_bytes > 0")
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def get_manga_storage(manga_id: int) -> int:
+    """Байт скачанного у манги"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(stored_bytes, 0) FROM manga WHERE id = ?", (manga_id,))
+    row = cur.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+def get_storage_by_manga(limit: int = 50) -> List[Tuple]:
+    """(id, title, url, байт, страниц, скачано глав) — самые большие первыми"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT m.id, m.title, m.url, m.stored_bytes, m.stored_pages, "
+        "(SELECT COUNT(*) FROM chapter c WHERE c.manga_id = m.id AND c.stored_bytes > 0) "
+        "FROM manga m WHERE m.stored_bytes > 0 ORDER BY m.stored_bytes DESC LIMIT ?",
+        (limit,)
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def get_lru_chapters(manga_id: Optional[int] = None, limit: int = 50) -> List[Tuple]:
+    """(id, manga_id, байт) скачанных глав, давно не открывавшиеся первыми"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    if manga_id is None:
+        cur.execute(
+            "SELECT id, manga_id, stored_bytes FROM chapter WHERE stored_bytes > 0 "
+            "ORDER BY COALESCE(read_at, saved_at, 0) LIMIT ?",
+            (limit,)
+        )
+    else:
+        cur.execute(
+            "SELECT id, manga_id, stored_bytes FROM chapter WHERE manga_id = ? AND stored_bytes > 0 "
+            "ORDER BY COALESCE(read_at, saved_at, 0) LIMIT ?",
+            (manga_id, limit)
+        )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def get_chapter_local_paths(chapter_id: int) -> List[str]:
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT local_path FROM page WHERE chapter_id = ? AND local_path IS NOT NULL", (chapter_id,))
+    rows = [r[0] for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+def reset_chapter_storage(chapter_id: int) -> Tuple[int, bool]:
+    """
+    Глава вытеснена: у страниц сброшены local_path (и записи pack-файла),
+    глава больше не saved, счётчики манги уменьшены.
+    Вернёт (освобождённые байты, были ли у главы записи pack-файла).
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(stored_bytes, 0) FROM chapter WHERE id = ?", (chapter_id,))
+    row = cur.fetchone()
+    cur.execute("DELETE FROM packed_page WHERE page_id IN (SELECT id FROM page WHERE chapter_id = ?)", (chapter_id,))
+    packed = cur.rowcount > 0
+    cur.execute("UPDATE page SET local_path = NULL, size = NULL, hash = NULL WHERE chapter_id = ?", (chapter_id,))
+    _recount_chapter(cur, chapter_id)
+    cur.execute("UPDATE chapter SET saved = 0, saved_at = NULL WHERE id = ?", (chapter_id,))
+    conn.commit()
+    conn.close()
+    return (row[0] if row else 0), packed
+
+def rebuild_storage_totals(sizes: List[Tuple[int, int]]):
+    """
+    Пересчитать счётчики места с нуля (для БД, скачанных до учёта):
+    sizes — (id страницы, размер файла) для страниц, у которых размер не записан.
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.executemany("UPDATE page SET size = ? WHERE id = ?", [(size, pid) for pid, size in sizes])
+    cur.execute(
+        "UPDATE chapter SET (stored_bytes, stored_pages) = ("
+        "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM page "
+        "WHERE page.chapter_id = chapter.id AND local_path IS NOT NULL AND size IS NOT NULL)"
+    )
+    cur.execute(
+        "UPDATE manga SET (stored_bytes, stored_pages) = ("
+        "SELECT COALESCE(SUM(stored_bytes), 0), COALESCE(SUM(stored_pages), 0) FROM chapter "
+        "WHERE chapter.manga_id = manga.id)"
+    )
+    cur.execute("UPDATE chapter SET saved_at = ? WHERE stored_bytes > 0 AND saved_at IS NULL", (time.time(),))
+    conn.commit()
+    conn.close()
+
+def get_unsized_pages() -> List[Tuple[int, str]]:
+    """(id, local_path) скачанных страниц без записанного размера"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT id, local_path FROM page WHERE local_path IS NOT NULL AND size IS NULL")
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def save_progress(rows: List[Tuple[str, Optional[str], int, Optional[int], float]]):
+    """
+    Позиции чтения одной транзакцией: (url главы, url манги, страница, всего, время).
+    Заодно обновляет chapter.read_at скачанных глав (порядок вытеснения).
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO reading_progress(chapter_url, manga_url, page, total, updated_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(chapter_url) DO UPDATE SET manga_url = COALESCE(excluded.manga_url, manga_url), "
+        "page = excluded.page, total = COALESCE(excluded.total, total), updated_at = excluded.updated_at "
+        "WHERE excluded.updated_at >= reading_progress.updated_at",
+        rows
+    )
+    cur.executemany("UPDATE chapter SET read_at = ? WHERE url = ? AND stored_bytes > 0",
+                    [(at, url) for url, _, _, _, at in rows])
+    conn.commit()
+    conn.close()
+
+def get_progress(chapter_url: str) -> Optional[Tuple]:
+    """(страница, всего, время)"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT page, total, updated_at FROM reading_progress WHERE chapter_url = ?", (chapter_url,))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+_ProgressRow = Tuple[str, Optional[str], int, Optional[int], float]
+
+def _progress_source(pending: List[_ProgressRow]) -> Tuple[str, list]:
+    """
+    WITH progress(...): reading_progress, поверх которого наложены ещё не записанные
+    позиции pending (как их запишет save_progress). Вернёт (sql, параметры).
+    """
+    if not pending:
+        return ("WITH progress AS (SELECT chapter_url, manga_url, page, total, updated_at FROM reading_progress) ",
+                [])
+    values = ", ".join(["(?, ?, ?, ?, ?)"] * len(pending))
+    sql = (
+        f"WITH pending(chapter_url, manga_url, page, total, updated_at) AS (VALUES {values}), "
+        "progress AS ("
+        "SELECT chapter_url, manga_url, page, total, updated_at FROM reading_progress rp "
+        "WHERE NOT EXISTS (SELECT 1 FROM pending p WHERE p.chapter_url = rp.chapter_url "
+        "AND p.updated_at >= rp.updated_at) "
+        "UNION ALL "
+        "SELECT p.chapter_url, COALESCE(p.manga_url, rp.manga_url), p.page, COALESCE(p.total, rp.total), "
+        "p.updated_at FROM pending p LEFT JOIN reading_progress rp ON rp.chapter_url = p.chapter_url "
+        "WHERE rp.updated_at IS NULL OR p.updated_at >= rp.updated_at) "
+    )
+    return sql, [value for row in pending for value in row]
+
+_HISTORY_COLUMNS = (
+    "SELECT h.chapter_url, h.manga_url, h.page, h.total, h.updated_at, c.title, m.title "
+    "FROM {source} h "
+    "LEFT JOIN chapter c ON c.url = h.chapter_url "
+    "LEFT JOIN manga m ON m.url = h.manga_url "
+)
+
+def get_history(limit: int = 50, before: Optional[Tuple[float, str]] = None,
+                pending: List[_ProgressRow] = ()) -> List[Tuple]:
+    """
+    «Продолжить чтение»: последняя прочитанная глава каждой манги (глава без известной
+    манги — сама по себе), свежие первыми: (url главы, url манги, страница, всего, время,
+    название главы, название манги). before — (время, url главы) последней строки
+    предыдущей страницы; pending — ещё не записанные позиции (ProgressRecorder.pending).
+    """
+    source, params = _progress_source(list(pending))
+    sql = source + (
+        ", latest AS (SELECT *, ROW_NUMBER() OVER ("
+        "PARTITION BY COALESCE(manga_url, chapter_url) ORDER BY updated_at DESC, chapter_url DESC) AS rn "
+        "FROM progress) "
+    ) + _HISTORY_COLUMNS.format(source="latest") + "WHERE h.rn = 1"
+    if before is not None:
+        sql += " AND (h.updated_at < ? OR (h.updated_at = ? AND h.chapter_url < ?))"
+        params += [before[0], before[0], before[1]]
+    sql += " ORDER BY h.updated_at DESC, h.chapter_url DESC LIMIT ?"
+    params.append(limit)
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def get_manga_history(manga_url: str, pending: List[_ProgressRow] = ()) -> List[Tuple]:
+    """Прогресс по всем открытым главам манги (столбцы как у get_history), свежие первыми"""
+    source, params = _progress_source([row for row in pending if row[1] in (manga_url, None)])
+    sql = source + _HISTORY_COLUMNS.format(source="progress") + (
+        "WHERE h.manga_url = ? ORDER BY h.updated_at DESC, h.chapter_url DESC"
+    )
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(sql, params + [manga_url])
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def get_offline_hosts() -> Dict[str, float]:
+    """Хосты, вручную переведённые в офлайн-режим: хост -> с какого времени"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT host, since FROM offline_host")
+    rows = dict(cur.fetchall())
+    conn.close()
+    return rows
+
+def set_offline_host(host: str, enabled: bool):
+    conn = _get_conn()
+    cur = conn.cursor()
+    if enabled:
+        cur.execute("INSERT OR IGNORE INTO offline_host(host, since) VALUES (?, ?)", (host, time.time()))
+    else:
+        cur.execute("DELETE FROM offline_host WHERE host = ?", (host,))
+    conn.commit()
+    conn.close()
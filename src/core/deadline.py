@@ -0,0 +1,63 @@
+# src/core/deadline.py
+"""
+Сквозной срок (deadline) запроса к API.
+
+Срок хранится в contextvar: его выставляет middleware сервера, и он виден
+всем вызовам к сайтам внутри обработки запроса. Транспорт урезает по нему
+таймауты фаз, а агрегаторы (федеративный поиск) по истечении срока
+возвращают то, что успело прийти.
+"""
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Срок запроса к API истёк раньше, чем пришёл ответ сайта"""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Ограничить всё, что выполняется внутри, сроком seconds (вложенный срок не продлевает внешний)"""
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Сколько секунд осталось до срока (None — срока нет)"""
+    at = _deadline.get()
+    return None if at is None else max(0.0, at - time.monotonic())
+
+
+def detached_context() -> contextvars.Context:
+    """Копия контекста без срока — для фоновых и общих задач, которые переживают запрос"""
+    ctx = contextvars.copy_context()
+    ctx.run(_deadline.set, None)
+    return ctx
+
+
+async def within_deadline(aw: Awaitable[T]) -> T:
+    """Дождаться aw, но не дольше текущего срока"""
+    left = remaining()
+    if left is None:
+        return await aw
+    try:
+        return await asyncio.wait_for(aw, left)
+    except asyncio.TimeoutError:
+        if remaining():
+            raise  # сработал собственный таймаут операции, а не срок запроса
+        raise DeadlineExceeded("истёк срок запроса") from None
@@ -0,0 +1,114 @@
+# src/core/imaging.py
+"""
+Работа с изображениями страниц через Pillow: размеры, уменьшение и
+перекодирование (webp/avif/jpeg). Перекодирование выполняется в пуле
+процессов, чтобы не блокировать event loop сервера. Pillow импортируется
+при первом обращении к изображению, а не при запуске сервера.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Optional, Tuple
+
+# fmt -> (формат Pillow, MIME-тип)
+FORMATS = {
+    "avif": ("AVIF", "image/avif"),
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+# Порядок предпочтения при выборе формата по заголовку Accept
+PREFERRED_FORMATS = ("avif", "webp", "jpeg")
+
+QUALITY = 80
+MIN_WIDTH = 100
+MAX_WIDTH = 4000
+# Ширина округляется вверх до шага, чтобы не плодить варианты в кэше
+WIDTH_STEP = 100
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """Размер изображения (ширина, высота); Pillow читает только заголовок"""
+    from PIL import Image
+    try:
+        with Image.open(BytesIO(data)) as im:
+            return im.size
+    except Exception:
+        return None
+
+
+def is_supported(fmt: str) -> bool:
+    """Умеет ли установленный Pillow сохранять в этот формат (AVIF — не везде)"""
+    if fmt not in FORMATS:
+        return False
+    from PIL import Image
+    Image.init()
+    return FORMATS[fmt][0] in Image.SAVE
+
+
+def normalize_width(width: Optional[int]) -> Optional[int]:
+    if not width:
+        return None
+    width = min(max(width, MIN_WIDTH), MAX_WIDTH)
+    return -(-width // WIDTH_STEP) * WIDTH_STEP
+
+
+def negotiate_format(accept: str) -> str:
+    """Лучший поддерживаемый формат из заголовка Accept (jpeg понимают все)"""
+    accept = (accept or "").lower()
+    for fmt in PREFERRED_FORMATS:
+        if FORMATS[fmt][1] in accept and is_supported(fmt):
+            return fmt
+    return "jpeg"
+
+
+def transcode(data: bytes, width: Optional[int], fmt: str) -> bytes:
+    """
+    Уменьшить изображение до ширины width (без увеличения) и сохранить в fmt.
+    Выполняется в дочернем процессе, поэтому функция модульная и без состояния.
+    """
+    from PIL import Image
+    pil_format = FORMATS[fmt][0]
+    with Image.open(BytesIO(data)) as im:
+        im.load()
+        if width and im.width > width:
+            height = max(1, round(im.height * width / im.width))
+            im = im.resize((width, height), Image.LANCZOS)
+        if pil_format == "JPEG" and im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        elif im.mode not in ("RGB", "RGBA", "L", "LA"):
+            im = im.convert("RGBA" if "transparency" in im.info else "RGB")
+        out = BytesIO()
+        save_args = {"quality": QUALITY}
+        if pil_format == "JPEG":
+            save_args.update(optimize=True, progressive=True)
+        elif pil_format == "WEBP":
+            save_args["method"] = 4
+        im.save(out, pil_format, **save_args)
+        return out.getvalue()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # при нескольких воркерах сервера (MANGAMONITOR_WORKERS) ядра делятся между их пулами
+        servers = max(1, int(os.environ.get("MANGAMONITOR_WORKERS", "1") or 1))
+        workers = min(4, max(1, ((os.cpu_count() or 2) - 1) // servers))
+        _pool = ProcessPoolExecutor(max_workers=workers)
+    return _pool
+
+
+async def transcode_async(data: bytes, width: Optional[int], fmt: str) -> Tuple[bytes, str]:
+    """transcode() в пуле процессов; возвращает (байты, MIME-тип)"""
+    loop = asyncio.get_running_loop()
+    content = await loop.run_in_executor(_get_pool(), transcode, data, width, fmt)
+    return content, FORMATS[fmt][1]
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,36 @@
+# src/core/log.py
+"""
+Логирование через loguru.
+
+Записи уходят в очередь (enqueue=True) и пишутся фоновым потоком, так что
+обработчики запросов не ждут вывода. Отключённые уровни отсекаются loguru
+до форматирования: logger.debug("GET {} -> {}", url, status) на уровне INFO
+почти ничего не стоит — поэтому сообщения передают аргументы, а не f-строки.
+
+    MANGAMONITOR_LOG_LEVEL=DEBUG   # по умолчанию INFO
+    MANGAMONITOR_LOG_JSON=1        # структурированные записи (JSON на строку)
+
+Обработчики настраивает setup_logging() — её вызывают точки входа (запуск
+сервера, CLI), а не импорт модуля: импорт не трогает чужие настройки loguru.
+"""
+import os
+import sys
+
+from loguru import logger
+
+LOG_LEVEL = os.environ.get("MANGAMONITOR_LOG_LEVEL", "INFO").upper()
+LOG_JSON = os.environ.get("MANGAMONITOR_LOG_JSON", "") not in ("", "0")
+LOG_FORMAT = ("<green>{time:HH:mm:ss.SSS}</green> <level>{level: <7}</level> "
+              "<cyan>{extra[component]}</cyan> {message}")
+
+
+def setup_logging(level: str = LOG_LEVEL, serialize: bool = LOG_JSON) -> None:
+    logger.remove()
+    logger.configure(extra={"component": "app"})
+    logger.add(sys.stderr, level=level, format=LOG_FORMAT, serialize=serialize,
+               enqueue=True, backtrace=False, diagnose=False)
+
+
+def get_logger(component: str):
+    """Логгер компонента: имя парсера или модуля попадает в поле component"""
+    return logger.bind(component=component)
@@ -0,0 +1,170 @@
+# src/core/metrics.py
+"""
+Метрики в формате Prometheus (отдаются сервером на /metrics).
+
+Небольшой собственный реестр вместо prometheus_client: счётчики и гистограммы
+с метками, плюс функции-сборщики для значений, которые и так считаются в
+других модулях (single-flight, размер кэша изображений). Обновление метрики —
+словарь под блокировкой, без ввода-вывода: её можно дёргать на каждый запрос.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Границы гистограмм длительностей, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {v:g}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счётчики по корзинам..., сумма, количество]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = self.header()
+        bounds = [f'le="{bound:g}"' for bound in self.buckets] + ['le="+Inf"']
+        for key, row in items:
+            # корзины кумулятивные: observe() увеличивает все корзины с bound >= value
+            for le, count in zip(bounds, row[:len(self.buckets)] + [row[-1]]):
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count:g}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {row[-2]:g}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {row[-1]:g}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def collector(self, fn: Callable[[], List[str]]) -> Callable[[], List[str]]:
+        """Функция, возвращающая готовые строки метрик на момент запроса /metrics"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for fn in self._collectors:
+            lines.extend(fn())
+        return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name: str, help_text: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Строки gauge для сборщика: samples — пары (метки, значение)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value:g}")
+    return lines
+
+
+REGISTRY = Registry()
+
+# --- запросы к сайтам (src/core/transport.py) ---
+UPSTREAM_REQUESTS = Counter("mangamonitor_upstream_requests_total",
+                            "Запросы к сайтам по парсеру, типу операции и статусу",
+                            ("parser", "operation", "status"))
+UPSTREAM_SECONDS = Histogram("mangamonitor_upstream_request_seconds",
+                             "Длительность запроса к сайту (до конца чтения тела)",
+                             ("parser", "operation"))
+UPSTREAM_BYTES = Counter("mangamonitor_upstream_bytes_total",
+                         "Получено байт тела ответа (после распаковки)", ("parser", "operation"))
+
+# --- разбор HTML парсерами ---
+PARSE_SECONDS = Histogram("mangamonitor_parse_seconds", "Разбор HTML/JSON ответа сайта",
+                          ("parser", "operation"))
+
+# --- кэши (src/core/cache.py) ---
+CACHE_REQUESTS = Counter("mangamonitor_cache_requests_total", "Обращения к кэшам: hit/miss",
+                         ("cache", "result"))
+
+# --- база данных (src/core/database.py): от открытия до закрытия соединения ---
+DB_SECONDS = Histogram("mangamonitor_db_query_seconds", "Длительность функций database.py",
+                       ("query",), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1))
+
+# --- API ---
+HTTP_REQUESTS = Counter("mangamonitor_http_requests_total", "Запросы к API по обработчику и статусу",
+                        ("handler", "method", "status"))
+HTTP_SECONDS = Histogram("mangamonitor_http_request_seconds", "Длительность обработки запроса к API",
+                         ("handler",))
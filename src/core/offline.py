@@ -0,0 +1,215 @@
+# src/core/offline.py
+"""
+Офлайн-режим: сайт недоступен — сервер отвечает из БД и скачанных файлов.
+
+Хост считается офлайн, если
+
+- открыт его circuit breaker: FAILURE_THRESHOLD неудачных запросов подряд
+  (нет соединения, таймаут, ответ 5xx). Транспорт перестаёт ходить к хосту
+  на OPEN_SECONDS, затем пропускает один пробный запрос (half-open): удачный
+  закрывает цепь, неудачный открывает снова;
+- или он переведён в офлайн вручную: переменной окружения
+  MANGAMONITOR_OFFLINE=host1,host2 ("*" — все хосты) или через
+  POST /api/offline. Ручные отметки хранятся в БД (таблица offline_host),
+  поэтому их видят все воркеры и они переживают перезапуск. В сервере их
+  перечитывает фоновая задача run(), а не запросы.
+
+Запрос к офлайн-хосту транспорт не выполняет, а сразу бросает HostOffline.
+Обработчики API ловят его (или заранее проверяют offline_reason) и отдают
+данные из БД с отметкой, насколько они устарели.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from src.core import database
+from src.core.log import get_logger
+
+log = get_logger("offline")
+
+FAILURE_THRESHOLD = int(os.environ.get("MANGAMONITOR_CIRCUIT_FAILURES", "5"))
+OPEN_SECONDS = float(os.environ.get("MANGAMONITOR_CIRCUIT_OPEN", "30"))
+# ручные отметки перечитываются из БД не чаще раза в столько секунд
+MANUAL_REFRESH = 2.0
+ALL_HOSTS = "*"
+
+ENV_HOSTS = frozenset(h.strip().lower() for h in os.environ.get("MANGAMONITOR_OFFLINE", "").split(",") if h.strip())
+
+
+class HostOffline(ConnectionError):
+    """Хост в офлайн-режиме: запрос к нему не выполнялся"""
+
+    def __init__(self, host: str, reason: str):
+        super().__init__(f"{host}: офлайн-режим ({reason})")
+        self.host = host
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """Состояние хоста: closed — запросы идут, open — не идут, half_open — ждём пробный"""
+
+    def __init__(self, host: str, threshold: int = FAILURE_THRESHOLD, open_seconds: float = OPEN_SECONDS):
+        self.host = host
+        self.threshold = max(1, threshold)
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        # когда выпущен пробный запрос; зависший пробный не блокирует хост дольше open_seconds
+        self._probe_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.time() - self.opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        now = time.time()
+        if self._probe_at is not None and now - self._probe_at < self.open_seconds:
+            return False
+        self._probe_at = now
+        return True
+
+    def success(self) -> None:
+        if self.opened_at is not None:
+            log.info("хост {} снова доступен", self.host)
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    def failure(self, error: object) -> None:
+        self.failures += 1
+        self.last_error = str(error) or type(error).__name__
+        probing = self._probe_at is not None
+        if probing or self.failures >= self.threshold:
+            if self.opened_at is None:
+                log.warning("хост {} недоступен ({} ошибок подряд: {}), офлайн-режим на {:g} с",
+                            self.host, self.failures, self.last_error, self.open_seconds)
+            self.opened_at = time.time()
+            self._probe_at = None
+
+    def record(self, status: int) -> None:
+        """Ответ получен: 5xx — сбой сайта, остальное — хост доступен"""
+        if status >= 500:
+            self.failure(f"статус {status}")
+        else:
+            self.success()
+
+    def to_dict(self) -> dict:
+        return {
+            "host": self.host,
+            "state": self.state,
+            "failures": self.failures,
+            "opened_at": self.opened_at,
+            "last_error": self.last_error,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_manual: Dict[str, float] = {}
+_manual_loaded = 0.0
+# работает run(): отметки обновляются в фоне, запросы берут их из памяти
+_background = False
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+def breaker_for(host: str) -> CircuitBreaker:
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(host)
+    return breaker
+
+
+def refresh_manual() -> None:
+    """Перечитать ручные отметки из БД (блокирующая — в сервере её вызывает run() через to_thread)"""
+    global _manual, _manual_loaded
+    _manual_loaded = time.monotonic()
+    try:
+        _manual = database.get_offline_hosts()
+    except sqlite3.Error:
+        # БД ещё не создана (CLI до init_db) — ручных отметок нет
+        _manual = {}
+
+
+async def run() -> None:
+    """Фоновое обновление ручных отметок раз в MANUAL_REFRESH секунд"""
+    global _background
+    _background = True
+    try:
+        while True:
+            try:
+                await asyncio.to_thread(refresh_manual)
+            except Exception as e:
+                log.warning("ручные отметки офлайн-режима не прочитаны: {}", e)
+            await asyncio.sleep(MANUAL_REFRESH)
+    finally:
+        _background = False
+
+
+def _manual_hosts() -> Dict[str, float]:
+    """Ручные отметки: хост -> с какого времени офлайн. Без run() (CLI) — перечитываются здесь."""
+    if not _background and time.monotonic() - _manual_loaded >= MANUAL_REFRESH:
+        refresh_manual()
+    return _manual
+
+
+def _manual_offline(host: str) -> bool:
+    if ALL_HOSTS in ENV_HOSTS or host in ENV_HOSTS:
+        return True
+    manual = _manual_hosts()
+    return ALL_HOSTS in manual or host in manual
+
+
+def offline_reason(url: str) -> Optional[str]:
+    """'manual' или 'circuit', если хост url в офлайн-режиме; None — можно идти в сеть"""
+    host = host_of(url)
+    if _manual_offline(host):
+        return "manual"
+    breaker = _breakers.get(host)
+    if breaker is not None and breaker.state == "open":
+        return "circuit"
+    return None
+
+
+def check(url: str) -> CircuitBreaker:
+    """Перед запросом: HostOffline, если к хосту сейчас ходить нельзя; иначе его breaker"""
+    host = host_of(url)
+    if _manual_offline(host):
+        raise HostOffline(host, "manual")
+    breaker = breaker_for(host)
+    if not breaker.allow():
+        raise HostOffline(host, "circuit")
+    return breaker
+
+
+def set_offline(host: str, enabled: bool) -> None:
+    """Вручную перевести хост (или "*" — все) в офлайн-режим или вернуть в обычный"""
+    host = host.strip().lower()
+    database.set_offline_host(host, enabled)
+    # в этом процессе отметка действует сразу, не дожидаясь run()
+    refresh_manual()
+    if not enabled and host in _breakers:
+        # вернули вручную — сразу пробуем сеть, а не ждём конца open_seconds
+        _breakers[host].success()
+
+
+def status() -> dict:
+    return {
+        "env": sorted(ENV_HOSTS),
+        "manual": [{"host": host, "since": since} for host, since in sorted(_manual_hosts().items())],
+        "hosts": [b.to_dict() for b in sorted(_breakers.values(), key=lambda b: b.host)],
+    }
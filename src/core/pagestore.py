@@ -0,0 +1,279 @@
+# src/core/pagestore.py
+"""
+Упакованное хранилище скачанных страниц (необязательное).
+
+Вместо тысяч отдельных файлов на мангу — один дописываемый файл
+data/packs/<manga_id>.pack и индекс смещений в таблице packed_page.
+Страницы отдаются срезами mmap (memoryview, без копирования) по индексу
+смещений, закэшированному в памяти: без open/stat/read и запроса к БД на
+каждую страницу. Другой процесс мог сжать pack-файл — раз в
+PACK_CHECK_INTERVAL секунд сверяется inode файла, и при замене индекс и mmap
+перечитываются.
+
+    python -m src.core.pagestore migrate [--remove]   # перенести скачанное из папок/CBZ
+    python -m src.core.pagestore compact              # выкинуть неиспользуемые участки
+"""
+import mimetypes
+import mmap
+import os
+import sys
+import threading
+import time
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.core import database
+from src.core.archive import read_member
+from src.core.log import get_logger, setup_logging
+
+log = get_logger("pack")
+
+PACKS_DIR = database.DATA_DIR / "packs"
+# page.local_path страниц, источник которых удалён после переноса в pack
+PACKED_MARKER = "pack:"
+# как часто (секунды) проверять, не заменён ли pack-файл другим процессом
+PACK_CHECK_INTERVAL = 1.0
+
+
+def guess_mime(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "image/jpeg"
+
+
+def read_local_page(local_path: str) -> Optional[bytes]:
+    """Содержимое страницы по page.local_path: обычный файл или <архив.cbz>#<имя>"""
+    if ".cbz#" in local_path:
+        return read_member(local_path)
+    try:
+        with open(local_path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class PageStore:
+    """Pack-файлы манги: дозапись страниц и чтение срезами mmap"""
+
+    def __init__(self, root: Path = PACKS_DIR):
+        self.root = root
+        # страницы читаются из пула потоков, а compact/close закрывают mmap:
+        # карты и индекс меняются только под блокировкой
+        self._lock = threading.Lock()
+        # manga_id -> (файл, mmap, inode); mmap пересоздаётся, когда файл вырос или заменён
+        self._maps: Dict[int, Tuple[object, mmap.mmap, int]] = {}
+        # manga_id -> {page_id: (offset, length, mime)} и обратный указатель page_id -> manga_id
+        self._index: Dict[int, Dict[int, Tuple[int, int, str]]] = {}
+        self._page_manga: Dict[int, int] = {}
+        # manga_id -> когда последний раз сверяли inode pack-файла
+        self._checked: Dict[int, float] = {}
+
+    def path(self, manga_id: int) -> Path:
+        return self.root / f"{manga_id}.pack"
+
+    def append(self, manga_id: int, pages: Iterable[Tuple[int, bytes, str]]) -> int:
+        """Дописать страницы (page_id, данные, mime) в конец pack-файла и проиндексировать"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        rows = []
+        with open(self.path(manga_id), "ab") as f:
+            offset = f.tell()
+            for page_id, data, mime in pages:
+                f.write(data)
+                rows.append((page_id, manga_id, offset, len(data), mime))
+                offset += len(data)
+        if rows:
+            database.add_packed_pages(rows)
+            with self._lock:
+                if manga_id in self._index:
+                    index = self._index[manga_id]
+                    for page_id, _, offset, length, mime in rows:
+                        index[page_id] = (offset, length, mime)
+                        self._page_manga[page_id] = manga_id
+        return len(rows)
+
+    def _load_index(self, manga_id: int) -> Dict[int, Tuple[int, int, str]]:
+        """Под блокировкой: индекс смещений pack-файла из БД"""
+        for page_id in self._index.pop(manga_id, {}):
+            self._page_manga.pop(page_id, None)
+        index = {page_id: (offset, length, mime)
+                 for page_id, offset, length, mime in database.get_packed_pages(manga_id)}
+        self._index[manga_id] = index
+        for page_id in index:
+            self._page_manga[page_id] = manga_id
+        return index
+
+    def _invalidate(self, manga_id: int) -> None:
+        """Под блокировкой: забыть индекс и mmap манги (pack-файл переписан)"""
+        for page_id in self._index.pop(manga_id, {}):
+            self._page_manga.pop(page_id, None)
+        self._checked.pop(manga_id, None)
+        self._close_map(manga_id)
+
+    def _check_replaced(self, manga_id: int) -> None:
+        """Под блокировкой: pack-файл заменён (сжат другим процессом) — сбросить индекс и mmap"""
+        entry = self._maps.get(manga_id)
+        now = time.monotonic()
+        if entry is None or now - self._checked.get(manga_id, 0.0) < PACK_CHECK_INTERVAL:
+            return
+        self._checked[manga_id] = now
+        try:
+            inode = os.stat(self.path(manga_id)).st_ino
+        except OSError:
+            inode = None
+        if inode != entry[2]:
+            self._invalidate(manga_id)
+
+    def _map(self, manga_id: int, need: int) -> Optional[mmap.mmap]:
+        """Под блокировкой: mmap pack-файла длиной не меньше need"""
+        entry = self._maps.get(manga_id)
+        if entry is not None and len(entry[1]) >= need:
+            return entry[1]
+        self._close_map(manga_id)
+        path = self.path(manga_id)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return None
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            f.close()
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[manga_id] = (f, mm, st.st_ino)
+        self._checked[manga_id] = time.monotonic()
+        return mm
+
+    def _close_map(self, manga_id: int) -> None:
+        """Под блокировкой: закрыть mmap; отданные срезы остаются валидными"""
+        entry = self._maps.pop(manga_id, None)
+        if entry is None:
+            return
+        f, mm, _ = entry
+        try:
+            mm.close()
+        except BufferError:
+            # на mmap ещё ссылаются memoryview отдаваемых ответов: отображение
+            # освободится вместе с последним из них
+            pass
+        f.close()
+
+    def read(self, page_id: int) -> Optional[Tuple[memoryview, str]]:
+        """(данные, mime) упакованной страницы или None; данные — срез mmap без копирования"""
+        with self._lock:
+            manga_id = self._page_manga.get(page_id)
+            if manga_id is not None:
+                self._check_replaced(manga_id)
+                manga_id = self._page_manga.get(page_id)
+            if manga_id is None:
+                # страницы нет в загруженных индексах: дописана позже или другим процессом
+                row = database.get_packed_page(page_id)
+                if row is None:
+                    return None
+                manga_id = row[0]
+                self._load_index(manga_id)
+            entry = self._index.get(manga_id, {}).get(page_id)
+            if entry is None:
+                return None
+            offset, length, mime = entry
+            mm = self._map(manga_id, offset + length)
+            if mm is None or len(mm) < offset + length:
+                return None
+            return memoryview(mm)[offset:offset + length], mime
+
+    def compact(self, manga_id: int) -> int:
+        """Переписать pack-файл без неиндексированных участков; вернёт освобождённые байты"""
+        path = self.path(manga_id)
+        if not path.exists():
+            return 0
+        rows = database.get_packed_pages(manga_id)
+        with self._lock:
+            self._invalidate(manga_id)
+        old_size = path.stat().st_size
+
+        tmp = path.with_name(path.name + ".tmp")
+        moved = []
+        with open(path, "rb") as src, open(tmp, "wb") as dst:
+            offset = 0
+            for page_id, old_offset, length, _ in rows:
+                src.seek(old_offset)
+                dst.write(src.read(length))
+                moved.append((page_id, offset))
+                offset += length
+        with self._lock:
+            # замена файла и смещений — одним шагом для читателей этого процесса
+            os.replace(tmp, path)
+            database.update_packed_offsets(moved)
+            self._invalidate(manga_id)
+        return old_size - path.stat().st_size
+
+    def close(self) -> None:
+        with self._lock:
+            for manga_id in list(self._maps):
+                self._close_map(manga_id)
+
+
+def migrate(manga_id: Optional[int] = None, remove_source: bool = False,
+            store: Optional[PageStore] = None, chapter_id: Optional[int] = None) -> int:
+    """
+    Перенести скачанные страницы из папок/CBZ в pack-файлы (всё, одну мангу
+    или одну главу chapter_id). Вернёт число страниц.
+    """
+    store = store or PageStore()
+    total = 0
+    rows = database.get_unpacked_pages(manga_id, chapter_id)
+    for mid, group in groupby(rows, key=lambda r: r[1]):
+        moved: List[Tuple[int, str]] = []
+
+        def pages():
+            # по одной странице: в памяти не больше одного файла
+            for page_id, _, local_path in group:
+                if local_path.startswith(PACKED_MARKER):
+                    continue
+                data = read_local_page(local_path)
+                if data is None:
+                    log.warning("нет файла {}", local_path)
+                    continue
+                moved.append((page_id, local_path))
+                yield page_id, data, guess_mime(local_path.rsplit("#", 1)[-1])
+
+        total += store.append(mid, pages())
+        if remove_source and moved:
+            remove_sources([path for _, path in moved])
+            database.set_page_local_path([pid for pid, _ in moved], f"{PACKED_MARKER}{mid}")
+        log.info("manga {}: {} стр. -> {}", mid, len(moved), store.path(mid))
+    return total
+
+
+def remove_sources(local_paths: List[str]) -> None:
+    """
+    Удалить файлы страниц; ссылки на blob-ы уменьшают их счётчики.
+    CBZ удаляется, только если удаляются все страницы, которые на него ссылаются
+    в БД: иначе пропали бы не перенесённые страницы архива.
+    """
+    removing = set(local_paths)
+    archives = {p.rsplit("#", 1)[0] for p in local_paths if ".cbz#" in p}
+    archives = {a for a in archives if removing.issuperset(database.get_archive_page_paths(a))}
+    files = [p for p in local_paths if ".cbz#" not in p]
+    # файл мог быть ссылкой на blob — уменьшаем его счётчик
+    database.unlink_blobs(files)
+    for path in files + sorted(archives):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def compact_all(store: Optional[PageStore] = None) -> int:
+    store = store or PageStore()
+    return sum(store.compact(mid) for mid in database.get_packed_manga_ids())
+
+
+if __name__ == "__main__":
+    setup_logging()
+    database.init_db()
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "migrate":
+        print(f"Перенесено страниц: {migrate(remove_source='--remove' in sys.argv)}")
+    elif command == "compact":
+        print(f"Освобождено байт: {compact_all()}")
+    else:
+        print(__doc__)
@@ -1,100 +1,130 @@
 # src/core/parser_manager.py
 import asyncio
-from typing import Dict, List, Optional
+import importlib
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
-from src.parsers.seimanga import SeiMangaParser
-from src.parsers.selfmanga import SelfMangaParser
-from src.parsers.readmanga import ReadMangaParser
-from src.parsers.mintmanga import MintMangaParser
-from src.parsers.zazaza import ZazazaParser
-from src.parsers.desucity import DesuCityParser
-
-_PARSERS: Dict[str, type] = {
-    "seimanga": SeiMangaParser,
-    "selfmanga": SelfMangaParser,
-    "readmanga": ReadMangaParser,
-    "mintmanga": MintMangaParser,
-    "zazaza": ZazazaParser,
-    "desucity": DesuCityParser,
-}
-
-# Карта доменов для автоматического определения парсера
-_DOMAIN_MAP = {
-    "seimanga.me": "seimanga",
-    "selfmanga.ru": "selfmanga",
-    "readmanga.io": "readmanga",
-    "mintmanga.live": "mintmanga",
-    "zazaza.ru": "zazaza",
-}
-
-
-def get_parser(name: str):
-    """Получить конкретный парсер по имени"""
-    cls = _PARSERS.get(name)
-    return cls() if cls else None
+from src.parsers.config import parser_config, site_spec
+from src.parsers.models import SearchResult
+from src.core.deadline import remaining
+from src.core.log import get_logger
+from src.core.tracing import span
+
+log = get_logger("search")
+
+# Парсеры описаны в config/default_config.json (src/parsers/config.py): сайт ->
+# движок -> класс "модуль:Класс". Модуль импортируется при первом обращении к
+# парсеру: список имён и запуск CLI/сервера не тянут aiohttp, bs4 и rapidfuzz.
+_classes: Dict[str, type] = {}
+
+
+def _load_class(path: str) -> type:
+    cls = _classes.get(path)
+    if cls is None:
+        module, _, attr = path.partition(":")
+        cls = _classes[path] = getattr(importlib.import_module(module), attr)
+    return cls
+
+
+def parser_class(name: str) -> Optional[type]:
+    """Класс парсера по имени (модуль импортируется при первом обращении)"""
+    spec = site_spec(name)
+    return _load_class(spec.parser_class) if spec else None
+
+
+def get_parser(name: str, **kwargs):
+    """Получить конкретный парсер по имени; kwargs — base_url, headers, transport и т.п."""
+    spec = site_spec(name)
+    return _load_class(spec.parser_class).from_spec(spec, **kwargs) if spec else None
 
 
 def get_parsers(names: List[str] = None):
     """Получить список парсеров"""
-    if names is None:
-        names = list(_PARSERS.keys())
-    return [cls() for name, cls in _PARSERS.items() if name in names]
+    return [get_parser(name) for name in list_parsers() if names is None or name in names]
 
 
 def get_all_parsers():
     """Получить все парсеры"""
-    return [cls() for cls in _PARSERS.values()]
+    return get_parsers()
 
 
 def list_parsers():
-    return list(_PARSERS.keys())
+    return list(parser_config.specs())
 
 
 def get_parser_by_url(url: str):
-    """Автоматически определить подходящий парсер по URL"""
+    """Автоматически определить подходящий парсер по URL (base_url и зеркала из конфига)"""
     try:
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower()
+        domain = urlparse(url).netloc.lower()
+        if not domain:
+            return None
+        specs = parser_config.specs()
 
-        # Ищем подходящий домен в карте
-        for domain_pattern, parser_name in _DOMAIN_MAP.items():
-            if domain_pattern in domain:
-                return get_parser(parser_name)
+        # Хост сайта или зеркала (в том числе поддомен)
+        for name, spec in specs.items():
+            if any(domain == host or domain.endswith("." + host) for host in spec.hosts):
+                return get_parser(name)
 
-        # Если точного совпадения нет, попробуем найти по имени хоста
-        for parser_name, parser_cls in _PARSERS.items():
-            parser_instance = parser_cls()
-            parser_domain = urlparse(parser_instance.base_url).netloc.lower()
-            if parser_domain in domain or domain in parser_domain:
-                return parser_instance
+        # Частичное совпадение имени хоста (3.readmanga.ru и readmanga.ru)
+        for name, spec in specs.items():
+            if any(host in domain or domain in host for host in spec.hosts):
+                return get_parser(name)
 
         return None
     except Exception:
         return None
 
 
-async def search_all_parsers(query: str, parsers: List = None, **kwargs) -> List[Dict]:
-    """Поиск по всем парсерам с объединением результатов"""
-    if parsers is None:
-        parsers = get_all_parsers()
+async def _search_one(parser, query: str, **kwargs) -> List[SearchResult]:
+    with span("parser.search", parser=parser.name) as sp:
+        async with parser:
+            results = await parser.search_manga(query, **kwargs)
+        if sp is not None:
+            sp.attrs["results"] = len(results)
+        return results
 
-    all_results = []
 
-    # Запускаем поиск параллельно во всех парсерах
-    tasks = []
-    for parser in parsers:
-        tasks.append(parser.search_manga(query, **kwargs))
+async def federated_search(query: str, parsers: List = None, **kwargs) -> Tuple[List[SearchResult], List[str]]:
+    """
+    Поиск параллельно во всех парсерах. Если у запроса есть срок (src/core/deadline.py),
+    по его истечении возвращается то, что успело прийти.
+    Вернёт (объединённые результаты, имена парсеров без результата — не успели или ошибка).
+    """
+    if parsers is None:
+        parsers = get_all_parsers()
+    with span("federated_search", query=query, parsers=len(parsers)):
+        return await _federated_search(query, parsers, **kwargs)
+
+
+async def _federated_search(query: str, parsers: List, **kwargs) -> Tuple[List[SearchResult], List[str]]:
+    tasks = {asyncio.create_task(_search_one(p, query, **kwargs)): p for p in parsers}
+    if not tasks:
+        return [], []
+
+    done, pending = await asyncio.wait(tasks, timeout=remaining())
+    for task in pending:
+        task.cancel()
+    if pending:
+        # ждём отмены, чтобы парсеры успели закрыть сессии
+        await asyncio.wait(pending)
+
+    all_results, incomplete = [], []
+    for task, parser in tasks.items():
+        if task in pending:
+            log.warning("парсер {} не успел ответить до срока", parser.name)
+            incomplete.append(parser.name)
+        elif task.exception() is not None:
+            log.warning("ошибка в парсере {}: {}", parser.name, task.exception())
+            incomplete.append(parser.name)
+        else:
+            all_results.extend(task.result())
 
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    # Сортируем объединенные результаты
+    all_results.sort(key=lambda x: (x.similarity, x.rating or 0), reverse=True)
+    return all_results, incomplete
 
-    # Обрабатываем результаты
-    for parser, result in zip(parsers, results):
-        if isinstance(result, Exception):
-            print(f"Ошибка в парсере {parser.name}: {result}")
-            continue
-        all_results.extend(result)
 
-    # Сортируем объединенные результаты
-    all_results.sort(key=lambda x: (x.get("similarity", 0), x.get("rating", 0)), reverse=True)
-    return all_results
\ No newline at end of file
+async def search_all_parsers(query: str, parsers: List = None, **kwargs) -> List[SearchResult]:
+    """Поиск по всем парсерам с объединением результатов"""
+    results, _ = await federated_search(query, parsers, **kwargs)
+    return results
\ No newline at end of file
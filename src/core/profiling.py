@@ -0,0 +1,183 @@
+# src/core/profiling.py
+"""
+Профилирование отдельных запросов к API по требованию.
+
+Профилирование выключено по умолчанию. Когда оно включено, запрос
+профилируется, если у него есть заголовок X-Profile: 1 или параметр
+?profile=1, либо он попал в случайную выборку (MANGAMONITOR_PROFILE_SAMPLE,
+доля 0..1, по умолчанию 0). Флаг и просмотр профилей (/api/profiles)
+доступны только клиентам с localhost или, если задан
+MANGAMONITOR_PROFILE_TOKEN, с этим токеном в заголовке X-Profile-Token
+(или ?profile_token=): профиль раскрывает код и данные запросов. Если установлен pyinstrument, используется он
+в режиме async_mode="enabled": время ожидания await (сеть, SQLite в потоке)
+попадает в профиль запроса, а работа параллельных запросов — нет. Без него
+используется cProfile: он видит только процессорное время и все корутины
+потока, поэтому одновременно пишется не больше одного профиля.
+
+Профили лежат в data/profiles: <id>.html (pyinstrument) или <id>.prof
+(cProfile, для pstats/snakeviz) и <id>.json с описанием запроса; список
+отдаёт сервер на /api/profiles.
+
+    MANGAMONITOR_PROFILING=1           # включить (без него middleware не ставится)
+    MANGAMONITOR_PROFILE_TOKEN=secret  # пускать и не с localhost (например, за прокси)
+    MANGAMONITOR_PROFILE_SAMPLE=0.01   # профилировать 1% запросов без флага
+"""
+import cProfile
+import hmac
+import json
+import os
+import random
+import time
+import uuid
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from src.core import database
+from src.core.log import get_logger
+
+try:
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+PROFILES_DIR = database.DATA_DIR / "profiles"
+PROFILES_KEPT = 200
+PROFILING_ENABLED = os.environ.get("MANGAMONITOR_PROFILING", "0") not in ("", "0")
+PROFILE_TOKEN = os.environ.get("MANGAMONITOR_PROFILE_TOKEN", "")
+LOCAL_CLIENTS = ("127.0.0.1", "::1", "localhost")
+PROFILE_SAMPLE = float(os.environ.get("MANGAMONITOR_PROFILE_SAMPLE", "0") or 0)
+
+log = get_logger("profile")
+
+_active = False
+
+
+def profile_allowed(scope) -> bool:
+    """Клиент может запрашивать и смотреть профили: localhost или верный MANGAMONITOR_PROFILE_TOKEN"""
+    if PROFILE_TOKEN:
+        token = next((v for n, v in scope["headers"] if n == b"x-profile-token"), None)
+        if token is None:
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            token = query.get("profile_token", [""])[0].encode("latin-1")
+        if hmac.compare_digest(token, PROFILE_TOKEN.encode("latin-1")):
+            return True
+    client = scope.get("client")
+    return client is not None and client[0] in LOCAL_CLIENTS
+
+
+def profile_requested(scope) -> bool:
+    """Флаг X-Profile / ?profile=1 от допущенного клиента или попадание в выборку"""
+    flag = None
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            flag = value not in (b"", b"0")
+            break
+    else:
+        query = scope.get("query_string", b"")
+        if b"profile=" in query:
+            flag = parse_qs(query.decode("latin-1")).get("profile", ["0"])[0] not in ("", "0")
+    if flag is not None:
+        return flag and profile_allowed(scope)
+    return PROFILE_SAMPLE > 0 and random.random() < PROFILE_SAMPLE
+
+
+class RequestProfile:
+    """Профиль одного запроса: begin() перед обработкой, stop() и save() после"""
+
+    def __init__(self, method: str, path: str):
+        now = time.time()
+        # время до миллисекунд в начале id: сортировка по имени — по времени создания
+        self.profile_id = (time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+                           + f"-{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:6]}")
+        self.method = method
+        self.path = path
+        self.kind = "pyinstrument" if Profiler is not None else "cprofile"
+        self.started = 0.0
+        self.duration = 0.0
+        self._profiler = Profiler(async_mode="enabled") if Profiler is not None else cProfile.Profile()
+
+    @classmethod
+    def begin(cls, method: str, path: str) -> Optional["RequestProfile"]:
+        """Начать профиль; None, если уже пишется другой (профилировщик один на поток)"""
+        global _active
+        if _active:
+            return None
+        _active = True
+        profile = cls(method, path)
+        profile.started = time.perf_counter()
+        try:
+            if profile.kind == "pyinstrument":
+                profile._profiler.start()
+            else:
+                profile._profiler.enable()
+        except Exception:
+            _active = False
+            raise
+        return profile
+
+    def stop(self) -> None:
+        global _active
+        try:
+            if self.kind == "pyinstrument":
+                self._profiler.stop()
+            else:
+                self._profiler.disable()
+        finally:
+            self.duration = time.perf_counter() - self.started
+            _active = False
+
+    def save(self, status: int) -> None:
+        """Записать профиль на диск (блокирующая — вызывать через asyncio.to_thread)"""
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        if self.kind == "pyinstrument":
+            filename = f"{self.profile_id}.html"
+            (PROFILES_DIR / filename).write_text(self._profiler.output_html(), encoding="utf-8")
+        else:
+            filename = f"{self.profile_id}.prof"
+            self._profiler.dump_stats(str(PROFILES_DIR / filename))
+        meta = {
+            "id": self.profile_id,
+            "file": filename,
+            "profiler": self.kind,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "duration_ms": round(self.duration * 1000, 3),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        (PROFILES_DIR / f"{self.profile_id}.json").write_text(json.dumps(meta, ensure_ascii=False),
+                                                              encoding="utf-8")
+        log.info("профиль {} {} ({:.0f} мс): {}", self.method, self.path, self.duration * 1000, filename)
+        _trim()
+
+
+def _trim() -> None:
+    """Оставить PROFILES_KEPT последних профилей"""
+    metas = sorted(PROFILES_DIR.glob("*.json"))
+    for meta in metas[:-PROFILES_KEPT]:
+        for path in PROFILES_DIR.glob(meta.stem + ".*"):
+            path.unlink(missing_ok=True)
+
+
+def list_profiles() -> List[dict]:
+    """Описания сохранённых профилей, новые первыми"""
+    if not PROFILES_DIR.exists():
+        return []
+    items = []
+    for meta in sorted(PROFILES_DIR.glob("*.json"), reverse=True):
+        try:
+            items.append(json.loads(meta.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return items
+
+
+def profile_file(profile_id: str):
+    """Путь к файлу профиля по id или None (id — только имя, без каталогов)"""
+    if not profile_id or "/" in profile_id or "\\" in profile_id or profile_id.startswith("."):
+        return None
+    for ext in (".html", ".prof"):
+        path = PROFILES_DIR / (profile_id + ext)
+        if path.is_file():
+            return path
+    return None
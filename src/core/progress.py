@@ -0,0 +1,88 @@
+# src/core/progress.py
+"""
+Прогресс чтения: на какой странице главы остановились.
+
+Читалка сообщает о каждом перелистывании, поэтому запись в БД на каждый
+запрос была бы самой частой операцией сервера. record() только обновляет
+словарь в памяти (повторные перелистывания одной главы схлопываются в одну
+запись), а flush() раз в FLUSH_INTERVAL секунд пишет накопленное одной
+транзакцией в таблицу reading_progress. Чтение прогресса сначала смотрит в
+буфер, так что ещё не записанные позиции тоже видны. При остановке сервера
+буфер дописывается; при падении теряется не больше FLUSH_INTERVAL секунд.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.core import database
+from src.core.log import get_logger
+
+log = get_logger("progress")
+
+FLUSH_INTERVAL = 5.0
+
+# url главы -> (url манги, страница, всего страниц, время)
+_Entry = Tuple[Optional[str], int, Optional[int], float]
+
+
+class ProgressRecorder:
+    def __init__(self, interval: float = FLUSH_INTERVAL):
+        self.interval = interval
+        # flush() вызывается из потоков (фоновая запись, остановка сервера), record() — из event loop
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _Entry] = {}
+        # пачки, которые сейчас пишутся в БД, — их тоже видно в get() и pending()
+        self._writing: List[Dict[str, _Entry]] = []
+
+    def record(self, chapter_url: str, manga_url: Optional[str], page: int, total: Optional[int] = None) -> None:
+        with self._lock:
+            self._pending[chapter_url] = (manga_url, page, total, time.time())
+
+    def get(self, chapter_url: str) -> Optional[Tuple[int, Optional[int], float]]:
+        """(страница, всего, время) последней позиции в главе или None"""
+        with self._lock:
+            entry = self._pending.get(chapter_url)
+            if entry is None:
+                entry = next((b[chapter_url] for b in reversed(self._writing) if chapter_url in b), None)
+        if entry is not None:
+            return entry[1:]
+        return database.get_progress(chapter_url)
+
+    def pending(self) -> List[Tuple[str, Optional[str], int, Optional[int], float]]:
+        """Ещё не записанные в БД позиции: (url главы, url манги, страница, всего, время)"""
+        with self._lock:
+            merged: Dict[str, _Entry] = {}
+            # более поздние пачки перекрывают ранние, буфер — все пачки
+            for batch in (*self._writing, self._pending):
+                merged.update(batch)
+        return [(url, *entry) for url, entry in merged.items()]
+
+    def flush(self) -> int:
+        """Записать накопленное одной транзакцией; вернёт число глав"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            self._writing.append(batch)
+        try:
+            database.save_progress([(url, *entry) for url, entry in batch.items()])
+            return len(batch)
+        except Exception:
+            # не потерять позиции: вернуть в буфер, если их не перезаписали новые
+            with self._lock:
+                for url, entry in batch.items():
+                    self._pending.setdefault(url, entry)
+            raise
+        finally:
+            with self._lock:
+                self._writing = [b for b in self._writing if b is not batch]
+
+    async def run(self) -> None:
+        """Фоновая запись раз в interval секунд"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                log.warning("прогресс чтения не записан: {}", e)
@@ -0,0 +1,55 @@
+# src/core/ratelimit.py
+"""
+Ограничение частоты запросов к сайту (rate_limit парсера в config/default_config.json).
+
+Алгоритм GCRA (вариант token bucket): в среднем rate запросов в секунду,
+до burst подряд без ожидания. Состояние — одно число (теоретическое время
+следующего запроса), поэтому блокировка не нужна: acquire() резервирует слот
+и спит до него. Ограничитель общий на парсер, а не на экземпляр: сервер
+создаёт экземпляр парсера на каждый запрос.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+from src.core.deadline import DeadlineExceeded, remaining
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._interval = 1.0 / rate
+        self._tolerance = (self.burst - 1) * self._interval
+        self._tat = 0.0
+
+    def delay(self) -> float:
+        """Сколько ждать следующему запросу, если прийти сейчас"""
+        now = time.monotonic()
+        return max(0.0, max(self._tat, now) - now - self._tolerance)
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        tat = max(self._tat, now)
+        wait = max(0.0, tat - now - self._tolerance)
+        left = remaining()
+        if left is not None and wait > left:
+            # слот не занимаем: запрос всё равно не успеет к сроку
+            raise DeadlineExceeded(f"очередь к сайту длиннее срока запроса ({wait:.1f} с)")
+        self._tat = tat + self._interval
+        if wait:
+            await asyncio.sleep(wait)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def limiter_for(name: str, rate: Optional[float], burst: int = 1) -> Optional[RateLimiter]:
+    """Общий ограничитель парсера name; пересоздаётся, если в конфиге поменялись параметры"""
+    if not rate:
+        _limiters.pop(name, None)
+        return None
+    limiter = _limiters.get(name)
+    if limiter is None or limiter.rate != rate or limiter.burst != max(1, burst):
+        limiter = _limiters[name] = RateLimiter(rate, burst)
+    return limiter
@@ -0,0 +1,408 @@
+# src/core/shared.py
+"""
+Режим нескольких процессов сервера (uvicorn --workers N).
+
+Кэши в памяти у каждого воркера свои, поэтому при MANGAMONITOR_WORKERS > 1
+(или MANGAMONITOR_SHARED_CACHE=1) сервер берёт общие для всех процессов:
+- SharedTTLCache — метаданные (изображения глав, информация о манге, поиск)
+  в таблице cache файла data/shared.sqlite (WAL, значения — pickle);
+- DiskImageCache — байты изображений файлами в data/cache/images, индекс
+  и LRU-вытеснение по суммарному объёму — в той же БД.
+Кэши вызываются прямо из обработчиков на event loop, поэтому ждут занятую
+другим процессом БД не дольше CACHE_BUSY_TIMEOUT: занятая БД — промах
+кэша (запись пропускается), а не остановка всех запросов воркера. Файлы
+изображений читаются и пишутся в пуле потоков (aget/aset), а объём и число
+записей кэша хранятся в таблице image_total (её ведут триггеры) — без SUM по
+всей таблице на каждый trim и /metrics.
+make_ttl_cache() и make_image_cache() выбирают реализацию по режиму, интерфейс
+тот же, что у TTLCache и ImageCache из src/core/cache.py.
+
+Задачи, которые должен выполнять только один процесс (скачивание главы,
+чистка хранилищ, вытеснение из кэша), берут аренду job_lease(name): запись
+в таблице lease с владельцем и сроком, который продлевается, пока задача идёт.
+Аренду упавшего процесса заберёт другой, когда истечёт срок. Запросы аренды
+идут в пуле потоков: ожидание блокировки БД не останавливает event loop.
+
+    MANGAMONITOR_WORKERS=4 python -m src.web.server
+"""
+import asyncio
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Hashable, Optional, Tuple, Union
+
+from src.core import database
+from src.core.cache import ImageCache, TTLCache
+from src.core.log import get_logger
+from src.core.metrics import CACHE_REQUESTS
+
+WORKERS = max(1, int(os.environ.get("MANGAMONITOR_WORKERS", "1") or 1))
+SHARED = WORKERS > 1 or os.environ.get("MANGAMONITOR_SHARED_CACHE", "") not in ("", "0")
+
+SHARED_DB_PATH = database.DATA_DIR / "shared.sqlite"
+IMAGES_DIR = database.DATA_DIR / "cache" / "images"
+
+# Время последнего обращения обновляется не чаще раза в ATIME_STEP секунд:
+# иначе каждое чтение из кэша было бы записью в БД
+ATIME_STEP = 60
+# Аренда задачи: срок и период продления
+LEASE_TTL = 60
+# Сколько ждать блокировку shared.sqlite: кэшу — миг (иначе промах), аренде — дольше
+CACHE_BUSY_TIMEOUT = 0.05
+LEASE_BUSY_TIMEOUT = 10
+
+log = get_logger("shared")
+
+_schema = """
+CREATE TABLE IF NOT EXISTS cache (
+    ns TEXT,
+    key TEXT,
+    value BLOB,
+    expires REAL,
+    atime REAL,
+    PRIMARY KEY (ns, key)
+);
+CREATE INDEX IF NOT EXISTS idx_cache_atime ON cache(ns, atime);
+-- изображения: файл data/cache/images/<hash[:2]>/<hash>
+CREATE TABLE IF NOT EXISTS image (
+    key TEXT PRIMARY KEY,
+    file TEXT,
+    content_type TEXT,
+    size INTEGER,
+    atime REAL
+);
+CREATE INDEX IF NOT EXISTS idx_image_atime ON image(atime);
+-- объём и число изображений: одна строка, её обновляют триггеры
+CREATE TABLE IF NOT EXISTS image_total (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    size INTEGER NOT NULL,
+    entries INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO image_total (id, size, entries)
+    SELECT 0, COALESCE(SUM(size), 0), COUNT(*) FROM image;
+CREATE TRIGGER IF NOT EXISTS image_total_insert AFTER INSERT ON image BEGIN
+    UPDATE image_total SET size = size + NEW.size, entries = entries + 1 WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS image_total_update AFTER UPDATE OF size ON image BEGIN
+    UPDATE image_total SET size = size + NEW.size - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS image_total_delete AFTER DELETE ON image BEGIN
+    UPDATE image_total SET size = size - OLD.size, entries = entries - 1 WHERE id = 0;
+END;
+CREATE TABLE IF NOT EXISTS lease (
+    name TEXT PRIMARY KEY,
+    owner TEXT,
+    expires REAL
+);
+"""
+
+_local = threading.local()
+
+
+def _conn(timeout: float = CACHE_BUSY_TIMEOUT) -> sqlite3.Connection:
+    """
+    Соединение с data/shared.sqlite, одно на поток и время ожидания блокировки
+    (кэш дёргается на каждый запрос)
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(timeout)
+    if conn is None:
+        SHARED_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(SHARED_DB_PATH), timeout=timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_schema)
+        conns[timeout] = conn
+    return conn
+
+
+def _busy(exc: sqlite3.OperationalError) -> bool:
+    """БД занята другим процессом дольше CACHE_BUSY_TIMEOUT"""
+    return "locked" in str(exc) or "busy" in str(exc)
+
+
+def _key(key: Hashable) -> str:
+    return key if isinstance(key, str) else repr(key)
+
+
+class LeaseBusy(Exception):
+    """Задачу уже выполняет другой процесс (или другой запрос этого)"""
+
+
+def acquire_lease(name: str, owner: str, ttl: float = LEASE_TTL, timeout: float = LEASE_BUSY_TIMEOUT) -> bool:
+    """Взять аренду, если она свободна, истекла или уже наша"""
+    now = time.time()
+    cur = _conn(timeout).execute(
+        "INSERT INTO lease (name, owner, expires) VALUES (?, ?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+        "WHERE lease.expires < ? OR lease.owner = excluded.owner",
+        (name, owner, now + ttl, now))
+    return cur.rowcount == 1
+
+
+def release_lease(name: str, owner: str) -> None:
+    _conn(LEASE_BUSY_TIMEOUT).execute("DELETE FROM lease WHERE name = ? AND owner = ?", (name, owner))
+
+
+@asynccontextmanager
+async def job_lease(name: str, ttl: float = LEASE_TTL):
+    """
+    Выполнить блок, только если задачу name не выполняет никто другой; иначе LeaseBusy.
+    Пока блок идёт, аренда продлевается каждые ttl/3 секунд.
+    """
+    owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    try:
+        acquired = await asyncio.to_thread(acquire_lease, name, owner, ttl)
+    except sqlite3.OperationalError as e:
+        if not _busy(e):
+            raise
+        # БД занята дольше LEASE_BUSY_TIMEOUT — считаем, что задачу выполняет другой процесс
+        acquired = False
+    if not acquired:
+        raise LeaseBusy(name)
+
+    async def renew():
+        while True:
+            await asyncio.sleep(ttl / 3)
+            try:
+                renewed = await asyncio.to_thread(acquire_lease, name, owner, ttl)
+            except sqlite3.OperationalError as e:
+                if not _busy(e):
+                    raise
+                # продлим в следующий раз: до конца срока ещё 2/3 ttl
+                log.warning("аренда {} не продлена: БД занята", name)
+                continue
+            if not renewed:
+                log.warning("аренда {} перехвачена другим процессом", name)
+                return
+
+    renewer = asyncio.get_running_loop().create_task(renew())
+    try:
+        yield
+    finally:
+        renewer.cancel()
+        try:
+            await asyncio.to_thread(release_lease, name, owner)
+        except sqlite3.OperationalError as e:
+            if not _busy(e):
+                raise
+            # аренда освободится сама, когда истечёт срок
+            log.warning("аренда {} не снята: БД занята", name)
+
+
+class SharedTTLCache:
+    """TTL-кэш в SQLite, общий для процессов; значения сериализуются pickle"""
+
+    def __init__(self, name: str, maxsize: int = 256, ttl: float = 600):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._sets = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        k = _key(key)
+        try:
+            row = _conn().execute("SELECT value, expires, atime FROM cache WHERE ns = ? AND key = ?",
+                                  (self.name, k)).fetchone()
+        except sqlite3.OperationalError as e:
+            if not _busy(e):
+                raise
+            return False, None
+        now = time.time()
+        if row is None or row[1] < now:
+            return False, None
+        if row[2] < now - ATIME_STEP:
+            try:
+                _conn().execute("UPDATE cache SET atime = ? WHERE ns = ? AND key = ?", (now, self.name, k))
+            except sqlite3.OperationalError as e:
+                # atime обновит следующее чтение
+                if not _busy(e):
+                    raise
+        return True, pickle.loads(row[0])
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        found, value = self._lookup(key)
+        CACHE_REQUESTS.inc(cache=self.name, result="hit" if found else "miss")
+        return value if found else default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        now = time.time()
+        try:
+            _conn().execute("INSERT OR REPLACE INTO cache (ns, key, value, expires, atime) VALUES (?, ?, ?, ?, ?)",
+                            (self.name, _key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                             now + self.ttl, now))
+        except sqlite3.OperationalError as e:
+            # БД занята — значение просто не попадёт в кэш
+            if not _busy(e):
+                raise
+            return
+        self._sets += 1
+        if self._sets % 64 == 0:
+            self.trim()
+
+    def trim(self) -> None:
+        """Удалить истёкшие записи и самые давние сверх maxsize"""
+        conn = _conn()
+        try:
+            conn.execute("DELETE FROM cache WHERE ns = ? AND expires < ?", (self.name, time.time()))
+            conn.execute("DELETE FROM cache WHERE ns = ? AND key IN (SELECT key FROM cache WHERE ns = ? "
+                         "ORDER BY atime DESC LIMIT -1 OFFSET ?)", (self.name, self.name, self.maxsize))
+        except sqlite3.OperationalError as e:
+            # БД занята — почистим при следующем trim
+            if not _busy(e):
+                raise
+
+    def __contains__(self, key: Hashable) -> bool:
+        found, value = self._lookup(key)
+        return found and value is not None
+
+    def __len__(self) -> int:
+        return _conn().execute("SELECT COUNT(*) FROM cache WHERE ns = ?", (self.name,)).fetchone()[0]
+
+
+class DiskImageCache:
+    """Кэш изображений файлами на диске, общий для процессов; LRU по суммарному объёму"""
+
+    def __init__(self, name: str, max_bytes: int = 1024 * 1024 * 1024, root: Path = IMAGES_DIR):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.root = root
+        self._written = 0
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.root / digest[:2] / digest
+
+    def get(self, key: Hashable) -> Optional[Tuple[bytes, str]]:
+        k = _key(key)
+        conn = _conn()
+        item = None
+        try:
+            row = conn.execute("SELECT file, content_type, atime FROM image WHERE key = ?", (k,)).fetchone()
+            if row is not None:
+                try:
+                    item = (Path(row[0]).read_bytes(), row[1])
+                except OSError:
+                    # файл вытеснен другим процессом между запросами
+                    conn.execute("DELETE FROM image WHERE key = ? AND file = ?", (k, row[0]))
+                else:
+                    now = time.time()
+                    if row[2] < now - ATIME_STEP:
+                        conn.execute("UPDATE image SET atime = ? WHERE key = ?", (now, k))
+        except sqlite3.OperationalError as e:
+            # БД занята: без индекса — промах; прочитанный файл (если успели) отдаём
+            if not _busy(e):
+                raise
+        CACHE_REQUESTS.inc(cache=self.name, result="miss" if item is None else "hit")
+        return item
+
+    async def aget(self, key: Hashable) -> Optional[Tuple[bytes, str]]:
+        """get() в пуле потоков: чтение файла изображения не занимает event loop"""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: Hashable, data: bytes, content_type: str) -> None:
+        """set() в пуле потоков: запись файла и вытеснение не занимают event loop"""
+        await asyncio.to_thread(self.set, key, data, content_type)
+
+    def set(self, key: Hashable, data: bytes, content_type: str) -> None:
+        if len(data) > self.max_bytes:
+            return
+        k = _key(key)
+        path = self._path(k)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # запись во временный файл и переименование: читатели не увидят половину файла
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        try:
+            _conn().execute(
+                # UPSERT, а не REPLACE: замена записи должна пройти через триггер image_total_update
+                "INSERT INTO image (key, file, content_type, size, atime) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET file = excluded.file, content_type = excluded.content_type, "
+                "size = excluded.size, atime = excluded.atime",
+                (k, str(path), content_type, len(data), time.time()))
+        except sqlite3.OperationalError as e:
+            if not _busy(e):
+                raise
+            # БД занята — не кэшируем; файл без записи в индексе никто не вытеснит
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return
+        self._written += len(data)
+        if self._written > self.max_bytes // 16:
+            self._written = 0
+            self.trim()
+
+    def trim(self) -> None:
+        """Вытеснить давно не читавшиеся изображения сверх max_bytes (одним процессом за раз)"""
+        owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        try:
+            # вызывается из set() на пути записи в кэш: занятая БД — вытесним в следующий раз
+            if not acquire_lease(f"trim:{self.name}", owner, timeout=CACHE_BUSY_TIMEOUT):
+                return
+        except sqlite3.OperationalError as e:
+            if not _busy(e):
+                raise
+            return
+        try:
+            conn = _conn()
+            excess = self.size - self.max_bytes
+            if excess <= 0:
+                return
+            victims = []
+            for key, file, size in conn.execute("SELECT key, file, size FROM image ORDER BY atime"):
+                victims.append((key, file))
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany("DELETE FROM image WHERE key = ?", [(key,) for key, _ in victims])
+            for _, file in victims:
+                try:
+                    os.unlink(file)
+                except OSError:
+                    pass
+        except sqlite3.OperationalError as e:
+            # файлы удаляются только после записей индекса: занятая БД ничего не сломала
+            if not _busy(e):
+                raise
+        finally:
+            release_lease(f"trim:{self.name}", owner)
+
+    @property
+    def size(self) -> int:
+        return _conn().execute("SELECT size FROM image_total WHERE id = 0").fetchone()[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        try:
+            return _conn().execute("SELECT 1 FROM image WHERE key = ?", (_key(key),)).fetchone() is not None
+        except sqlite3.OperationalError as e:
+            if not _busy(e):
+                raise
+            return False
+
+    def __len__(self) -> int:
+        return _conn().execute("SELECT entries FROM image_total WHERE id = 0").fetchone()[0]
+
+
+def make_ttl_cache(name: str, maxsize: int, ttl: float) -> Union[TTLCache, SharedTTLCache]:
+    """TTL-кэш процесса или общий (в режиме нескольких воркеров)"""
+    if SHARED:
+        return SharedTTLCache(name, maxsize=maxsize, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl, name=name)
+
+
+def make_image_cache(name: str) -> Union[ImageCache, DiskImageCache]:
+    """Кэш изображений процесса или общий на диске (в режиме нескольких воркеров)"""
+    if SHARED:
+        return DiskImageCache(name)
+    return ImageCache(name=name)
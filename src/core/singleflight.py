@@ -0,0 +1,57 @@
+# src/core/singleflight.py
+"""
+Объединение одинаковых одновременных запросов (single-flight).
+
+Если несколько клиентов одновременно открывают одну и ту же мангу или главу,
+на сайт уходит один запрос: остальные ждут тот же future. Запрос выполняется
+отдельной задачей, а ожидающие получают результат через asyncio.shield —
+отключение одного клиента не отменяет загрузку для остальных. Общая задача
+не наследует срок запроса (src/core/deadline.py): каждый ожидающий
+перестаёт ждать по своему сроку, а загрузка ограничена таймаутами фаз.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from src.core.deadline import detached_context, within_deadline
+
+T = TypeVar("T")
+
+_registry: Dict[str, "SingleFlight"] = {}
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # сколько запросов реально выполнено и сколько присоединилось к уже идущим
+        self.calls = 0
+        self.coalesced = 0
+        _registry[name] = self
+
+    def inflight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # ошибку заберут ожидающие; если все ушли — не шумим "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.get_running_loop().create_task(fn(), context=detached_context())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await within_deadline(asyncio.shield(task))
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "inflight": len(self._inflight)}
+
+
+def singleflight_stats() -> Dict[str, Dict[str, int]]:
+    return {name: flight.stats() for name, flight in _registry.items()}
@@ -0,0 +1,183 @@
+# src/core/storage.py
+"""
+Учёт места под скачанные главы и квоты.
+
+Сколько занимает каждая глава и манга, хранится в БД (chapter/manga.stored_bytes
+и stored_pages) и обновляется в момент записи скачанных страниц
+(database.save_downloaded_pages) — сводка не обходит файловую систему.
+Считается логический размер страниц: одинаковые страницы в blob-хранилище
+занимают диск один раз, но в квоту входят у каждой главы.
+
+Квоты (байты, можно с суффиксом K/M/G/T; 0 или не задано — без ограничения):
+
+    MANGAMONITOR_STORAGE_QUOTA        — всё скачанное вместе
+    MANGAMONITOR_STORAGE_MANGA_QUOTA  — одна манга
+
+После скачивания главы enforce() вытесняет главы, которые дольше всех не
+открывали (chapter.read_at, для неоткрытых — время скачивания): файлы удаляются,
+у страниц сбрасывается local_path, глава перестаёт быть saved.
+
+    python -m src.core.storage            # сводка
+    python -m src.core.storage rebuild    # пересчитать счётчики (БД, скачанные до учёта)
+    python -m src.core.storage enforce    # применить квоты сейчас
+"""
+import os
+import sys
+import time
+import zipfile
+from typing import Dict, Iterable, List, Optional
+
+from src.core import database
+from src.core.blobstore import BlobStore
+from src.core.log import get_logger, setup_logging
+from src.core.pagestore import PACKED_MARKER, PageStore, remove_sources
+
+log = get_logger("storage")
+
+# главы для вытеснения выбираются пачками такого размера
+EVICT_BATCH = 50
+# открытие главы записывается в БД не чаще раза в столько секунд
+TOUCH_INTERVAL = 60.0
+
+_SUFFIXES = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(value: Optional[str]) -> int:
+    """'20G' -> байты; пусто или 0 — без ограничения"""
+    value = (value or "").strip().upper().removesuffix("B")
+    if not value:
+        return 0
+    factor = _SUFFIXES.get(value[-1], 1)
+    number = value[:-1] if value[-1] in _SUFFIXES else value
+    return int(float(number) * factor)
+
+
+STORAGE_QUOTA = parse_size(os.environ.get("MANGAMONITOR_STORAGE_QUOTA"))
+MANGA_QUOTA = parse_size(os.environ.get("MANGAMONITOR_STORAGE_MANGA_QUOTA"))
+
+
+class StorageManager:
+    def __init__(self, quota: int = STORAGE_QUOTA, manga_quota: int = MANGA_QUOTA,
+                 blobs: Optional[BlobStore] = None, packs: Optional[PageStore] = None):
+        self.quota = quota
+        self.manga_quota = manga_quota
+        self.blobs = blobs or BlobStore()
+        self.packs = packs or PageStore()
+        # url главы -> когда последний раз записали read_at
+        self._touched: Dict[str, float] = {}
+
+    def summary(self, limit: int = 50) -> dict:
+        total, pages, manga_count = database.get_storage_totals()
+        return {
+            "bytes": total,
+            "pages": pages,
+            "manga_count": manga_count,
+            "quota": self.quota or None,
+            "manga_quota": self.manga_quota or None,
+            "free": max(0, self.quota - total) if self.quota else None,
+            "manga": [
+                {"id": mid, "title": title, "url": url, "bytes": size, "pages": count, "chapters": chapters}
+                for mid, title, url, size, count, chapters in database.get_storage_by_manga(limit)
+            ],
+        }
+
+    def touch(self, chapter_url: str) -> None:
+        """Главу открыли: поднять её в очереди вытеснения"""
+        now = time.time()
+        if now - self._touched.get(chapter_url, 0) < TOUCH_INTERVAL:
+            return
+        if len(self._touched) >= 10000:
+            self._touched.clear()
+        self._touched[chapter_url] = now
+        database.touch_chapter(chapter_url, now)
+
+    def enforce(self, manga_id: Optional[int] = None, keep: Iterable[int] = ()) -> List[int]:
+        """
+        Применить квоты: сначала квоту манги manga_id, затем общую.
+        keep — главы, которые вытеснять нельзя (только что скачанная). Вернёт id вытесненных.
+        """
+        keep = set(keep)
+        evicted: List[int] = []
+        if self.manga_quota and manga_id is not None:
+            excess = database.get_manga_storage(manga_id) - self.manga_quota
+            evicted += self._evict(excess, manga_id, keep)
+        if self.quota:
+            excess = database.get_storage_totals()[0] - self.quota
+            evicted += self._evict(excess, None, keep)
+        return evicted
+
+    def _evict(self, excess: int, manga_id: Optional[int], keep: set) -> List[int]:
+        evicted: List[int] = []
+        packed_manga = set()
+        while excess > 0:
+            candidates = [row for row in database.get_lru_chapters(manga_id, EVICT_BATCH + len(keep))
+                          if row[0] not in keep]
+            if not candidates:
+                log.warning("квота превышена на {} байт, вытеснять нечего", excess)
+                break
+            for chapter_id, mid, _ in candidates:
+                if excess <= 0:
+                    break
+                self._remove_files(chapter_id)
+                freed, packed = database.reset_chapter_storage(chapter_id)
+                if packed:
+                    # pack-файл мог быть собран без удаления исходников — сжимаем по записям, а не по путям
+                    packed_manga.add(mid)
+                excess -= freed
+                evicted.append(chapter_id)
+        if evicted:
+            # содержимое, на которое больше не ссылается ни одна глава, удаляется с диска
+            self.blobs.gc()
+            for mid in packed_manga:
+                self.packs.compact(mid)
+            log.info("вытеснено глав: {}", len(evicted))
+        return evicted
+
+    @staticmethod
+    def _remove_files(chapter_id: int) -> None:
+        """Удалить файлы главы (страницы в pack-файле манги освобождает compact)"""
+        paths = database.get_chapter_local_paths(chapter_id)
+        files = [p for p in paths if not p.startswith(PACKED_MARKER)]
+        remove_sources(files)
+        for directory in {os.path.dirname(p.rsplit("#", 1)[0]) for p in files}:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+
+def _page_size(page_id: int, local_path: str) -> Optional[int]:
+    """Размер уже скачанной страницы по её local_path (для rebuild)"""
+    try:
+        if local_path.startswith(PACKED_MARKER):
+            row = database.get_packed_page(page_id)
+            return row[2] if row else None
+        if ".cbz#" in local_path:
+            archive, name = local_path.rsplit("#", 1)
+            with zipfile.ZipFile(archive) as zf:
+                return zf.getinfo(name).file_size
+        return os.path.getsize(local_path)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+
+def rebuild() -> None:
+    """Пересчитать счётчики места с нуля; размеры страниц без записанного size берутся с диска"""
+    sizes = []
+    for page_id, local_path in database.get_unsized_pages():
+        size = _page_size(page_id, local_path)
+        if size is not None:
+            sizes.append((page_id, size))
+    database.rebuild_storage_totals(sizes)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    database.init_db()
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    manager = StorageManager()
+    if command == "rebuild":
+        rebuild()
+    elif command == "enforce":
+        print(f"Вытеснено глав: {len(manager.enforce())}")
+    print(manager.summary(limit=20))
@@ -0,0 +1,111 @@
+# src/core/tracing.py
+"""
+Трассировка отдельных запросов к API (по запросу клиента: X-Trace: 1 или ?trace=1).
+
+Трасса и текущий span живут в contextvar, поэтому дочерние задачи asyncio
+(параллельный поиск по парсерам) попадают в ту же трассу со своим родителем.
+Без включённой трассы span() ничего не записывает. Готовые трассы хранятся
+в памяти (последние TRACES_KEPT) и отдаются сервером на /api/traces.
+"""
+import contextvars
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+TRACES_KEPT = 50
+
+
+@dataclass(slots=True)
+class Span:
+    span_id: int
+    parent_id: Optional[int]
+    name: str
+    start: float
+    end: Optional[float] = None
+    attrs: Dict[str, object] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(((self.end or self.start) - self.start) * 1000, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+@dataclass(slots=True)
+class Trace:
+    trace_id: str
+    name: str
+    started: float
+    spans: List[Span] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        root = self.spans[0] if self.spans else None
+        return {
+            "id": self.trace_id,
+            "name": self.name,
+            "duration_ms": root.to_dict(self.started)["duration_ms"] if root else 0,
+            "spans": [s.to_dict(self.started) for s in self.spans],
+        }
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_span: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("span", default=None)
+_finished: "OrderedDict[str, Trace]" = OrderedDict()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Отрезок работы внутри трассы; вернёт Span (или None без трассы) для дополнения attrs"""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    item = Span(len(trace.spans), _span.get(), name, time.perf_counter(), attrs=attrs)
+    trace.spans.append(item)
+    token = _span.set(item.span_id)
+    try:
+        yield item
+    except BaseException as e:
+        item.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        item.end = time.perf_counter()
+        _span.reset(token)
+
+
+@contextmanager
+def start_trace(name: str, **attrs):
+    """Начать трассу с корневым span; по выходу трасса сохраняется для /api/traces"""
+    trace = Trace(uuid.uuid4().hex[:16], name, time.perf_counter())
+    token = _trace.set(trace)
+    try:
+        with span(name, **attrs):
+            yield trace
+    finally:
+        _trace.reset(token)
+        _finished[trace.trace_id] = trace
+        while len(_finished) > TRACES_KEPT:
+            _finished.popitem(last=False)
+
+
+def get_trace(trace_id: str) -> Optional[Trace]:
+    return _finished.get(trace_id)
+
+
+def recent_traces() -> List[dict]:
+    """Краткий список сохранённых трасс, новые первыми"""
+    items = []
+    for trace in reversed(_finished.values()):
+        data = trace.to_dict()
+        items.append({"id": data["id"], "name": data["name"], "duration_ms": data["duration_ms"],
+                      "spans": len(data["spans"])})
+    return items
@@ -0,0 +1,347 @@
+# src/core/transport.py
+"""
+HTTP-транспорт парсеров.
+
+По умолчанию запросы идут через aiohttp; httpx даёт HTTP/2 (одно соединение
+на зеркало с мультиплексированием запросов). Выбор — аргументом парсера или
+переменной окружения MANGAMONITOR_TRANSPORT=httpx. Оба транспорта объявляют
+сжатие (gzip, deflate и br, если установлен brotli) и сами распаковывают ответ.
+
+Таймауты раздельные по фазам (соединение, первый байт ответа, пауза между
+кусками тела) и свои у каждого типа операции: зависшее зеркало не держит
+поиск столько же, сколько разрешено большой картинке. Если у запроса к API
+есть срок (src/core/deadline.py), таймауты фаз урезаются до оставшегося.
+
+Перед запросом проверяется circuit breaker хоста (src/core/offline.py): к
+офлайн-хосту запрос не идёт, а исход остальных (ошибка соединения, таймаут,
+5xx, обрыв при чтении тела или ответ) записывается в breaker.
+
+Каждый запрос учитывается в метриках (количество, статус, длительность, байты
+по парсеру и операции) и, если запрос к API трассируется, пишет span "http".
+"""
+import abc
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+from src.core.deadline import DeadlineExceeded, remaining
+from src.core.log import get_logger
+from src.core.metrics import UPSTREAM_BYTES, UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+from src.core.offline import HostOffline, check as check_host
+from src.core.ratelimit import RateLimiter
+from src.core.tracing import span
+
+log = get_logger("transport")
+
+try:
+    import brotli  # noqa: F401  (нужен aiohttp/httpx для распаковки br)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+DEFAULT_TRANSPORT = os.environ.get("MANGAMONITOR_TRANSPORT", "aiohttp")
+
+
+@dataclass(slots=True)
+class PhaseTimeouts:
+    """Таймауты фаз запроса, секунды"""
+    connect: float
+    first_byte: float
+    read: float
+
+    def clamp(self, left: Optional[float]) -> "PhaseTimeouts":
+        if left is None:
+            return self
+        return PhaseTimeouts(min(self.connect, left), min(self.first_byte, left), min(self.read, left))
+
+
+# Тип операции -> таймауты: поиск и страница читалки должны отвечать быстро,
+# изображения крупные и читаются дольше
+OPERATION_TIMEOUTS: Dict[str, PhaseTimeouts] = {
+    "search": PhaseTimeouts(connect=4, first_byte=8, read=8),
+    "info": PhaseTimeouts(connect=5, first_byte=12, read=12),
+    "page": PhaseTimeouts(connect=5, first_byte=10, read=10),
+    "image": PhaseTimeouts(connect=5, first_byte=15, read=20),
+}
+
+
+def phase_timeouts(operation: str) -> PhaseTimeouts:
+    """Таймауты операции, урезанные по сроку текущего запроса к API"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("истёк срок запроса")
+    return OPERATION_TIMEOUTS.get(operation, OPERATION_TIMEOUTS["page"]).clamp(left)
+
+
+class TransportResponse(abc.ABC):
+    """Ответ транспорта: status, url, headers и чтение тела (целиком или кусками)"""
+
+    status: int
+    url: str
+    headers: Dict[str, str]
+    # прочитано байт тела (после распаковки) — для метрик
+    bytes_read: int = 0
+    # ошибка чтения тела (обрыв, таймаут): для breaker это сбой хоста, как и ошибка соединения
+    body_error: Optional[Exception] = None
+
+    @abc.abstractmethod
+    async def read(self) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    async def text(self) -> str:
+        ...
+
+    async def json(self):
+        return json.loads(await self.text())
+
+    @abc.abstractmethod
+    def iter_chunks(self, size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        ...
+
+
+class Transport(abc.ABC):
+    """Сессия с общими заголовками; request() — асинхронный контекст с ответом"""
+
+    name = ""
+    # метка для метрик и логов: имя парсера или "proxy"
+    label = ""
+    # ограничение частоты запросов к страницам сайта (src/core/ratelimit.py)
+    limiter: Optional[RateLimiter] = None
+
+    @abc.abstractmethod
+    def _open(self, method: str, url: str, params: Optional[dict], data: Optional[dict],
+              headers: Optional[dict], timeouts: PhaseTimeouts):
+        """Асинхронный контекст запроса бэкенда с таймаутами соединения и чтения"""
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, params: Optional[dict] = None,
+                      data: Optional[dict] = None, headers: Optional[dict] = None,
+                      operation: str = "page"):
+        try:
+            breaker = check_host(url)
+        except HostOffline:
+            UPSTREAM_REQUESTS.inc(parser=self.label, operation=operation, status="offline")
+            raise
+        if self.limiter is not None and operation != "image":
+            # картинки обычно идут с CDN, лимит сайта на них не распространяется
+            await self.limiter.acquire()
+        timeouts = phase_timeouts(operation)
+        started = time.perf_counter()
+        status, resp = "error", None
+        with span("http", method=method, url=url, operation=operation, parser=self.label) as sp:
+            try:
+                ctx = self._open(method, url, params, data, headers, timeouts)
+                try:
+                    # соединение + ожидание заголовков ответа; таймаут — в той же задаче,
+                    # что и __aexit__ (у httpx/anyio область отмены привязана к задаче)
+                    async with asyncio.timeout(timeouts.connect + timeouts.first_byte):
+                        resp = await ctx.__aenter__()
+                except DeadlineExceeded:
+                    raise
+                except asyncio.TimeoutError:
+                    status = "timeout"
+                    if remaining() == 0:
+                        raise DeadlineExceeded(f"истёк срок запроса ({operation} {url})") from None
+                    error = asyncio.TimeoutError(f"нет ответа за {timeouts.connect + timeouts.first_byte:g} с "
+                                                 f"({operation} {url})")
+                    breaker.failure(error)
+                    raise error from None
+                except Exception as e:
+                    # не удалось соединиться или получить заголовки
+                    breaker.failure(e)
+                    raise
+                status = resp.status
+                try:
+                    yield resp
+                except BaseException:
+                    status = _record(breaker, resp)
+                    if not await ctx.__aexit__(*sys.exc_info()):
+                        raise
+                else:
+                    status = _record(breaker, resp)
+                    await ctx.__aexit__(None, None, None)
+            finally:
+                elapsed = time.perf_counter() - started
+                read = resp.bytes_read if resp is not None else 0
+                UPSTREAM_REQUESTS.inc(parser=self.label, operation=operation, status=status)
+                UPSTREAM_SECONDS.observe(elapsed, parser=self.label, operation=operation)
+                UPSTREAM_BYTES.inc(read, parser=self.label, operation=operation)
+                if sp is not None:
+                    sp.attrs.update(status=status, bytes=read)
+                log.debug("{} {} -> {} ({:.0f} мс, {} Б)", method, url, status, elapsed * 1000, read)
+
+    def get(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+            operation: str = "page"):
+        return self.request("GET", url, params=params, headers=headers, operation=operation)
+
+    def post(self, url: str, data: Optional[dict] = None, headers: Optional[dict] = None,
+             operation: str = "page"):
+        return self.request("POST", url, data=data, headers=headers, operation=operation)
+
+    def head(self, url: str, headers: Optional[dict] = None, operation: str = "image"):
+        """Только заголовки (размер изображения по Content-Length без скачивания)"""
+        return self.request("HEAD", url, headers=headers, operation=operation)
+
+    @property
+    @abc.abstractmethod
+    def closed(self) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        ...
+
+
+def _record(breaker, resp: TransportResponse):
+    """Исход запроса в breaker — после чтения тела: обрыв на теле тоже сбой. Вернёт статус для метрик."""
+    if resp.body_error is not None:
+        breaker.failure(resp.body_error)
+        return "error"
+    breaker.record(resp.status)
+    return resp.status
+
+
+class _AiohttpResponse(TransportResponse):
+    def __init__(self, resp):
+        self._resp = resp
+        self.status = resp.status
+        self.url = str(resp.url)
+        self.headers = resp.headers
+
+    async def read(self) -> bytes:
+        try:
+            body = await self._resp.read()
+        except Exception as e:
+            self.body_error = e
+            raise
+        self.bytes_read = len(body)
+        return body
+
+    async def text(self) -> str:
+        await self.read()
+        return await self._resp.text()
+
+    async def iter_chunks(self, size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._resp.content.iter_chunked(size):
+                self.bytes_read += len(chunk)
+                yield chunk
+        except Exception as e:
+            self.body_error = e
+            raise
+
+
+class AiohttpTransport(Transport):
+    name = "aiohttp"
+
+    def __init__(self, headers: dict, timeout: float):
+        # импорт при первой сессии: aiohttp заметно замедляет запуск CLI и сервера
+        import aiohttp
+        self._total = timeout
+        self._client_timeout = aiohttp.ClientTimeout
+        self._session = aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=timeout))
+
+    @asynccontextmanager
+    async def _open(self, method, url, params, data, headers, timeouts):
+        left = remaining()
+        timeout = self._client_timeout(total=self._total if left is None else min(self._total, left),
+                                       sock_connect=timeouts.connect, sock_read=timeouts.read)
+        async with self._session.request(method, url, params=params, data=data, headers=headers,
+                                         timeout=timeout) as resp:
+            yield _AiohttpResponse(resp)
+
+    @property
+    def closed(self) -> bool:
+        return self._session.closed
+
+    async def close(self) -> None:
+        await self._session.close()
+
+
+class _HttpxResponse(TransportResponse):
+    def __init__(self, resp):
+        self._resp = resp
+        self.status = resp.status_code
+        self.url = str(resp.url)
+        self.headers = resp.headers
+
+    async def read(self) -> bytes:
+        try:
+            body = await self._resp.aread()
+        except Exception as e:
+            self.body_error = e
+            raise
+        self.bytes_read = len(body)
+        return body
+
+    async def text(self) -> str:
+        await self.read()
+        return self._resp.text
+
+    async def iter_chunks(self, size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._resp.aiter_bytes(size):
+                self.bytes_read += len(chunk)
+                yield chunk
+        except Exception as e:
+            self.body_error = e
+            raise
+
+
+class HttpxTransport(Transport):
+    """httpx с HTTP/2 (нужен пакет h2; без него — HTTP/1.1 с keep-alive)"""
+
+    name = "httpx"
+
+    def __init__(self, headers: dict, timeout: float):
+        import httpx
+
+        try:
+            self._client = httpx.AsyncClient(headers=headers, timeout=timeout, http2=True, follow_redirects=True)
+        except ImportError:
+            log.warning("пакет h2 не установлен, httpx работает по HTTP/1.1")
+            self._client = httpx.AsyncClient(headers=headers, timeout=timeout, follow_redirects=True)
+
+    @asynccontextmanager
+    async def _open(self, method, url, params, data, headers, timeouts):
+        import httpx
+
+        timeout = httpx.Timeout(timeouts.read, connect=timeouts.connect)
+        try:
+            async with self._client.stream(method, url, params=params, data=data, headers=headers,
+                                           timeout=timeout) as resp:
+                yield _HttpxResponse(resp)
+        except httpx.TimeoutException as e:
+            # как у aiohttp: таймауты фаз — asyncio.TimeoutError
+            raise asyncio.TimeoutError(f"{type(e).__name__} ({url})") from e
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+TRANSPORTS = {
+    "aiohttp": AiohttpTransport,
+    "httpx": HttpxTransport,
+}
+
+
+def create_transport(kind: Optional[str], headers: dict, timeout: float, label: str = "",
+                     limiter: Optional[RateLimiter] = None) -> Transport:
+    """Создать транспорт по имени; создавать нужно внутри работающего event loop"""
+    kind = kind or DEFAULT_TRANSPORT
+    if kind not in TRANSPORTS:
+        raise ValueError(f"Неизвестный транспорт: {kind} (есть: {', '.join(TRANSPORTS)})")
+    transport = TRANSPORTS[kind]({"Accept-Encoding": ACCEPT_ENCODING, **headers}, timeout)
+    transport.label = label
+    transport.limiter = limiter
+    return transport
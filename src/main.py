@@ -11,7 +11,13 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from src.core.parser_manager import get_parser, list_parsers, get_all_parsers, search_all_parsers
-from src.core.database import init_db, ensure_manga, ensure_chapter, save_page, mark_chapter_saved
+from src.core.database import (
+    init_db, save_manga_info, ensure_chapter, save_page_urls, get_downloaded_pages, save_downloaded_pages,
+    mark_chapter_saved
+)
+from src.core.blobstore import BlobStore
+from src.core.log import setup_logging
+from src.core.storage import StorageManager
 from urllib.parse import urlparse
 
 # Константы для специальных команд
@@ -215,11 +221,11 @@ async def handle_search_results(results, stack, mode_choice, parser_inst=None):
     max_results_to_show = min(20, len(results))
     print(f"\nНайдено результатов: {len(results)}")
     for i, r in enumerate(results[:max_results_to_show], 1):
-        parser_name = r.get('parser', 'unknown')
-        rating = r.get('rating', 'N/A')
-        similarity = r.get('similarity', 0)
-        year = r.get('year', 'N/A')
-        print(f"{i}. {r['title']} ({year}) ⭐ {rating} [{similarity}%] -> {parser_name}")
+        parser_name = r.parser or 'unknown'
+        rating = r.rating if r.rating is not None else 'N/A'
+        similarity = r.similarity
+        year = r.year or 'N/A'
+        print(f"{i}. {r.title} ({year}) ⭐ {rating} [{similarity}%] -> {parser_name}")
     print("0 - Назад к поиску")
 
     # Выбор манги
@@ -239,34 +245,34 @@ async def handle_search_results(results, stack, mode_choice, parser_inst=None):
 
         # Определяем парсер для выбранной манги
         if mode_choice == 1:
-            parser_name = chosen.get('parser')
-            parser = get_parser(parser_name)()
+            parser_name = chosen.parser
+            parser = get_parser(parser_name)
             await stack.enter_async_context(parser)
         else:
             parser = parser_inst
 
-        print(f"\nЗагружаем информацию о '{chosen['title']}'...")
-        info = await parser.get_manga_info(chosen["url"])
+        print(f"\nЗагружаем информацию о '{chosen.title}'...")
+        info = await parser.get_manga_info(chosen.url)
 
         # Вывод информации о манге
-        print(f"\n=== {info.get('title')} ===")
-        if info.get('eng_name'):
-            print(f"Английское название: {info.get('eng_name')}")
-        if info.get('orig_name'):
-            print(f"Оригинальное название: {info.get('orig_name')}")
-        if info.get('author'):
-            print(f"Автор: {info.get('author')}")
-        if info.get('year'):
-            print(f"Год: {info.get('year')}")
-        if info.get('category'):
-            print(f"Категория: {info.get('category')}")
-        if info.get('genres'):
-            print(f"Жанры: {', '.join(info.get('genres', []))}")
-        if info.get('description'):
-            desc = info.get('description')
+        print(f"\n=== {info.title} ===")
+        if info.eng_name:
+            print(f"Английское название: {info.eng_name}")
+        if info.orig_name:
+            print(f"Оригинальное название: {info.orig_name}")
+        if info.author:
+            print(f"Автор: {info.author}")
+        if info.year:
+            print(f"Год: {info.year}")
+        if info.category:
+            print(f"Категория: {info.category}")
+        if info.genres:
+            print(f"Жанры: {', '.join(info.genres)}")
+        if info.description:
+            desc = info.description
             print(f"Описание: {desc[:200]}{'...' if len(desc) > 200 else ''}")
 
-        chapters = info.get("chapters", [])
+        chapters = info.chapters
         if not chapters:
             print("Глав нет.")
             print("Нажмите Enter чтобы вернуться к выбору манги...")
@@ -278,8 +284,8 @@ async def handle_search_results(results, stack, mode_choice, parser_inst=None):
             max_chapters_to_show = min(15, len(chapters))
             print(f"\nДоступные главы ({len(chapters)}):")
             for i, ch in enumerate(chapters[:max_chapters_to_show], 1):
-                date_str = f" ({ch.get('date')})" if ch.get('date') else ""
-                print(f"{i}. {ch.get('title')}{date_str}")
+                date_str = f" ({ch.date})" if ch.date else ""
+                print(f"{i}. {ch.title}{date_str}")
             print("0 - Назад к выбору манги")
 
             chapter_choice = get_int_input(
@@ -295,12 +301,12 @@ async def handle_search_results(results, stack, mode_choice, parser_inst=None):
 
             chapter = chapters[chapter_choice - 1]
 
-            # Сохраняем в БД
-            manga_id = ensure_manga(info.get("title"), chosen["url"])
-            chapter_id = ensure_chapter(manga_id, chapter.get("title"), chapter.get("url"))
+            # Сохраняем в БД информацию о манге и весь список глав (порядок нужен для чтения без сети)
+            manga_id = save_manga_info(chosen.url, info)
+            chapter_id = ensure_chapter(manga_id, chapter.title, chapter.url)
 
             print("Получаем ссылки на изображения...")
-            images = await parser.get_chapter_images(chapter.get("url"))
+            images = await parser.get_chapter_images(chapter.url)
             if not images:
                 print("Не найдено изображений.")
                 print("Нажмите Enter чтобы продолжить...")
@@ -310,8 +316,7 @@ async def handle_search_results(results, stack, mode_choice, parser_inst=None):
             print(f"Найдено {len(images)} изображений")
 
             # Сохраняем ссылки в БД
-            for idx, img_url in enumerate(images, 1):
-                save_page(chapter_id, idx, img_url, None)
+            save_page_urls([(chapter.url, images)])
 
             # Предлагаем скачать
             download_choice = get_yes_no_input("Скачать главу локально? (y/N)", default=False)
@@ -327,19 +332,30 @@ async def handle_search_results(results, stack, mode_choice, parser_inst=None):
                     p = urlparse(u).path.strip("/").replace("/", "_")
                     return p or "chapter"
 
-                manga_slug = slug_from_url(chosen["url"])
-                chap_slug = slug_from_url(chapter.get("url"))
+                manga_slug = slug_from_url(chosen.url)
+                chap_slug = slug_from_url(chapter.url)
                 out_dir = os.path.join(ROOT, "data", "downloads", manga_slug, chap_slug)
 
                 print(f"Скачиваем в {out_dir}...")
-                saved_files = await parser.download_chapter(chapter.get("url"), out_dir=out_dir)
+                # уже скачанные страницы пропускаются, недокачанные — докачиваются
+                pages = await parser.download_pages(chapter.url, images, out_dir, blobs=BlobStore(),
+                                                    known=get_downloaded_pages(chapter_id))
 
                 # Обновляем пути в БД
-                for i, file_path in enumerate(saved_files, 1):
-                    save_page(chapter_id, i, images[i - 1] if i - 1 < len(images) else "", file_path)
-
+                save_downloaded_pages(chapter_id, [(p.index, p.url, p.path, p.size, p.hash, p.error) for p in pages])
+                # квоты на скачанное (MANGAMONITOR_STORAGE_QUOTA): вытесняются давно не открытые главы
+                StorageManager().enforce(manga_id, [chapter_id])
+
+                failed = [p for p in pages if p.error]
+                skipped = sum(1 for p in pages if p.skipped)
+                print(f"Скачано {len(pages) - len(failed) - skipped} файлов, уже были скачаны: {skipped}")
+                if failed:
+                    print(f"Не скачались страницы: {', '.join(str(p.index) for p in failed)} "
+                          f"— повторите скачивание главы, чтобы докачать их")
+                    print("Нажмите Enter чтобы продолжить...")
+                    input()
+                    continue
                 mark_chapter_saved(chapter_id)
-                print(f"Скачано {len(saved_files)} файлов")
 
                 # После успешного скачивания предлагаем продолжить
                 print("\nГлава успешно скачана!")
@@ -356,6 +372,7 @@ async def handle_search_results(results, stack, mode_choice, parser_inst=None):
 
 
 if __name__ == "__main__":
+    setup_logging()
     try:
         asyncio.run(run())
     except KeyboardInterrupt:
@@ -1,19 +1,31 @@
 # src/parsers/__init__.py
-from .base_parser import BaseMangaParser
-from .seimanga import SeiMangaParser
-from .selfmanga import SelfMangaParser
-from .readmanga import ReadMangaParser
-from .mintmanga import MintMangaParser
-from .zazaza import ZazazaParser
-from .desucity import DesuCityParser
+"""
+Парсеры сайтов. Модули подгружаются при первом обращении к имени
+(from src.parsers import DesuCityParser): импорт пакета не тянет
+aiohttp, BeautifulSoup и rapidfuzz. Сайты описаны в config/default_config.json
+(src/parsers/config.py), экземпляры по имени — src/core/parser_manager.py.
+"""
+import importlib
 
+_LAZY = {
+    'BaseMangaParser': '.base_parser',
+    'SearchResult': '.models',
+    'MangaInfo': '.models',
+    'Chapter': '.models',
+    'Page': '.models',
+    'ChapterImages': '.models',
+    'PageDownload': '.models',
+    'SiteSpec': '.config',
+    'DesuCityParser': '.desucity',
+}
 
-__all__ = [
-    'BaseMangaParser',
-    'SeiMangaParser',
-    'SelfMangaParser',
-    'ReadMangaParser',
-    'MintMangaParser',
-    'ZazazaParser',
-    'DesuCityParser'
-]
\ No newline at end of file
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -3,12 +3,22 @@ from __future__ import annotations
 import os
 import re
 import asyncio
-from typing import List, Dict, Optional, Tuple
+import hashlib
+import zipfile
+from typing import AsyncIterator, List, Dict, Optional, Set, Tuple
 from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
 
-import aiohttp
-from bs4 import BeautifulSoup
-from rapidfuzz import fuzz
+from src.core.archive import CbzWriter, comic_info_xml, member_ref, member_sha256, open_cbz, page_name
+from src.core.blobstore import BlobStore
+from src.core.log import get_logger
+from src.core.metrics import PARSE_SECONDS
+from src.core.pagestore import PACKED_MARKER
+from src.core.ratelimit import limiter_for
+from src.core.singleflight import SingleFlight
+from src.core.tracing import span
+from src.core.transport import Transport, create_transport
+from .config import CONFIG_PATH, ConfigError, SiteSpec, site_spec
+from .models import Chapter, ChapterImages, MangaInfo, PageDownload, SearchResult
 
 DEFAULT_HEADERS =     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
@@ -17,15 +27,53 @@ DEFAULT_HEADERS =     headers = {
     }
 
 
-class BaseMangaParser:
-    """Базовый парсер для сайтов одинаковой структуры"""
+_text_flight = SingleFlight("fetch_text")
+
+# уже скачанная страница из таблицы page: (размер, sha256, local_path)
+KnownPage = Tuple[int, Optional[str], Optional[str]]
+
+_CHAPTER_SEGMENT_RE = re.compile(r"^(?:ch)?(\d+(?:\.\d+)?)$", re.I)
+_CHAPTER_TITLE_RE = re.compile(r"(?:глава|chapter|ch\.?)\s*(\d+(?:[.,]\d+)?)", re.I)
+
+
+def chapter_number(url: str, title: Optional[str] = None) -> Optional[float]:
+    """Номер главы из URL (/vol1/25, /vol1/ch25/rus) или, если не вышло, из названия"""
+    for segment in reversed([p for p in urlparse(url).path.split("/") if p]):
+        m = _CHAPTER_SEGMENT_RE.match(segment)
+        if m:
+            return float(m.group(1))
+    m = _CHAPTER_TITLE_RE.search(title or "")
+    return float(m.group(1).replace(",", ".")) if m else None
+
 
-    def __init__(self, base_url: str, name: str, headers: Optional[dict] = None, timeout: int = 30):
-        self.base_url = base_url.rstrip("/")
+class BaseMangaParser:
+    """
+    Парсер сайтов семейства readmanga (движок "readmanga" в config/default_config.json).
+    Селекторы и регулярки берутся из описания сайта (SiteSpec, src/parsers/config.py).
+    """
+
+    def __init__(self, base_url: Optional[str] = None, name: str = "", headers: Optional[dict] = None,
+                 timeout: int = 30, transport: Optional[str] = None, spec: Optional[SiteSpec] = None,
+                 limited: bool = True):
+        self.spec = spec or site_spec(name)
+        if self.spec is None:
+            raise ConfigError(f"парсер {name!r} не описан в {CONFIG_PATH}")
+        self.base_url = (base_url or self.spec.base_url).rstrip("/")
         self.name = name
-        self.headers = headers or DEFAULT_HEADERS
-        self.timeout = aiohttp.ClientTimeout(total=timeout)
-        self._session: Optional[aiohttp.ClientSession] = None
+        self.headers = headers or self.spec.headers or DEFAULT_HEADERS
+        self.timeout = timeout
+        # aiohttp (по умолчанию) или httpx с HTTP/2, см. src/core/transport.py
+        self.transport = transport
+        # общий на парсер лимит частоты запросов к сайту; limited=False — без него (бенчмарки)
+        self._limiter = limiter_for(name, self.spec.rate, self.spec.burst) if limited else None
+        self._session: Optional[Transport] = None
+        # запросы этой сессии, выполняемые как общие для нескольких клиентов
+        self._pending: Set[asyncio.Task] = set()
+        self.log = get_logger(name)
+
+    @classmethod
+    def from_spec(cls, spec: SiteSpec, **kwargs) -> "BaseMangaParser":
+        return cls(name=spec.name, spec=spec, **kwargs)
 
     # context manager
     async def __aenter__(self):
@@ -36,18 +84,26 @@ class BaseMangaParser:
         await self.close()
 
     async def close(self) -> None:
+        session, self._session = self._session, None
         try:
-            if self._session and not self._session.closed:
-                await self._session.close()
+            if session is None or session.closed:
+                return
+            pending = [t for t in self._pending if not t.done()]
+            if pending:
+                # общий (single-flight) запрос этой сессии ещё ждут другие клиенты —
+                # закрываем сессию, когда он завершится
+                waiter = asyncio.gather(*pending, return_exceptions=True)
+                waiter.add_done_callback(lambda _: asyncio.ensure_future(session.close()))
+                return
+            await session.close()
         except Exception:
             pass
-        finally:
-            self._session = None
 
     # session helper
-    async def _get_session(self) -> aiohttp.ClientSession:
+    async def _get_session(self) -> Transport:
         if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(headers=self.headers, timeout=self.timeout)
+            self._session = create_transport(self.transport, self.headers, self.timeout, label=self.name,
+                                             limiter=self._limiter)
         return self._session
 
     # ensure mtr param
@@ -62,45 +118,62 @@ class BaseMangaParser:
         new_parsed = parsed._replace(query=new_query)
         return urlunparse(new_parsed)
 
-    # fetch text with params support
-    async def fetch_text(self, url: str, params: Optional[dict] = None) -> str:
-        sess = await self._get_session()
-        async with sess.get(url, params=params) as resp:
-            text = await resp.text()
-            print(f"[{self.name}] GET {resp.url} -> {resp.status}")
-            return text
+    # manga url from chapter url: https://site/slug/vol1/1 -> https://site/slug
+    def get_manga_url(self, chapter_url: str) -> str:
+        parsed = urlparse(chapter_url)
+        parts = [p for p in parsed.path.split("/") if p]
+        return f"{parsed.scheme}://{parsed.netloc}/{parts[0]}" if parts else self.base_url
+
+    # fetch text with params support; одинаковые одновременные запросы объединяются.
+    # operation — тип запроса для таймаутов фаз: search, info, page (см. src/core/transport.py)
+    async def fetch_text(self, url: str, params: Optional[dict] = None, operation: str = "page") -> str:
+        key = (url, tuple(sorted((params or {}).items())))
+        return await _text_flight.do(key, lambda: self._fetch_text(url, params, operation))
+
+    async def _fetch_text(self, url: str, params: Optional[dict] = None, operation: str = "page") -> str:
+        task = asyncio.current_task()
+        self._pending.add(task)
+        try:
+            sess = await self._get_session()
+            async with sess.get(url, params=params, operation=operation) as resp:
+                return await resp.text()
+        finally:
+            self._pending.discard(task)
+
+    def _parse_html(self, html: str, operation: str) -> BeautifulSoup:
+        """BeautifulSoup с замером времени разбора (метрика и span трассы)"""
+        # bs4 и rapidfuzz импортируются при первом разборе, а не при запуске
+        from bs4 import BeautifulSoup
+        with span("parse", parser=self.name, operation=operation), \
+                PARSE_SECONDS.time(parser=self.name, operation=operation):
+            return BeautifulSoup(html, "html.parser")
 
-    def _parse_search_tile(self, tile, query: str = "") -> Dict:
-        title_el = tile.select_one(".desc h3 a")
-        url = urljoin(self.base_url, title_el["href"]) if title_el else None
-        title = title_el.get_text(strip=True) if title_el else None
+    def _parse_search_tile(self, tile, query: str = "") -> SearchResult:
+        rule = self.spec.rule
+        href = rule("search", "link").text(tile)
+        url = urljoin(self.base_url, href) if href else None
+        title = rule("search", "title").text(tile)
 
-        rating_el = tile.select_one(".compact-rate")
-        rating = float(rating_el["title"]) if rating_el and rating_el.has_attr("title") else None
+        rating = rule("search", "rating").text(tile)
+        rating = float(rating) if rating else None
 
-        genres = [g.get_text(strip=True) for g in tile.select(".tile-info a[href*='/list/genre/']")]
-        year_el = tile.select_one(".tile-info a[href*='/list/year/']")
-        year = year_el.get_text(strip=True) if year_el else None
+        genres = rule("search", "genres").texts(tile)
+        year = rule("search", "year").text(tile)
 
+        from rapidfuzz import fuzz
         score = fuzz.partial_ratio(query.lower(), title.lower()) if title and query else 0
 
-        return {
-            "title": title,
-            "url": url,
-            "rating": rating,
-            "genres": genres,
-            "year": year,
-            "similarity": score,
-            "parser": self.name
-        }
+        return SearchResult(title=title, url=url, parser=self.name, rating=rating,
+                            genres=genres, year=year, similarity=score)
 
     # search manga function
     async def search_manga(self, query: str, years: Tuple[int, int] = (1961, 2025),
-                          sort: str = "POPULARITY", max_pages: int = 2) -> List[Dict]:
+                          sort: str = "POPULARITY", max_pages: int = 2) -> List[SearchResult]:
         """Search manga with similarity scoring and sorting"""
         results = []
         offset = 0
-        search_url = f"{self.base_url}/search/advancedResults"
+        search_url = self.base_url + self.spec.value("search", "path", "/search/advancedResults")
+        tiles_rule = self.spec.rule("search", "tiles")
 
         for _ in range(max_pages):
             params = {
@@ -109,10 +182,10 @@ class BaseMangaParser:
                 "years": f"{years[0]},{years[1]}",
                 "sortType": sort
             }
-            html = await self.fetch_text(search_url, params=params)
-            soup = BeautifulSoup(html, "html.parser")
+            html = await self.fetch_text(search_url, params=params, operation="search")
+            soup = self._parse_html(html, "search")
 
-            tiles = soup.select(".tiles .tile")
+            tiles = tiles_rule.nodes(soup)
             if not tiles:
                 break
 
@@ -122,65 +195,59 @@ class BaseMangaParser:
             offset += len(tiles)
 
         # сортировка по совпадению и рейтингу
-        results.sort(key=lambda x: (x["similarity"], x["rating"] or 0), reverse=True)
+        results.sort(key=lambda x: (x.similarity, x.rating or 0), reverse=True)
         return results
 
     # get manga info
-    async def get_manga_info(self, slug_or_url: str) -> Dict:
+    async def get_manga_info(self, slug_or_url: str) -> MangaInfo:
         if slug_or_url.startswith("http://") or slug_or_url.startswith("https://"):
             url = slug_or_url
         else:
             url = f"{self.base_url}/{slug_or_url.lstrip('/')}"
 
-        html = await self.fetch_text(url)
-        soup = BeautifulSoup(html, "html.parser")
+        html = await self.fetch_text(url, operation="info")
+        soup = self._parse_html(html, "info")
 
-        title_tag = soup.select_one("h1.names > span.name") or soup.select_one("h1") or soup.title
-        title = title_tag.get_text(strip=True) if title_tag else None
+        def field(name: str) -> Optional[str]:
+            return self.spec.rule("info", name).text(soup)
 
-        eng_name_tag = soup.select_one("h1.names > .eng-name")
-        eng_name = eng_name_tag.get_text(strip=True) if eng_name_tag else None
-
-        orig_name_tag = soup.select_one("h1.names > .original-name")
-        orig_name = orig_name_tag.get_text(strip=True) if orig_name_tag else None
-
-        description_tag = soup.select_one('meta[itemprop="description"]')
-        description = description_tag["content"] if description_tag and description_tag.has_attr("content") else None
-
-        author_tag = soup.select_one(".elem_author a.person-link")
-        author = author_tag.get_text(strip=True) if author_tag else None
-
-        year_tag = soup.select_one(".elem_year a")
-        year = year_tag.get_text(strip=True) if year_tag else None
-
-        genres = [g.get_text(strip=True) for g in soup.select(".elem_genre a")] or [g.get_text(strip=True) for g in soup.select(".elem_genre")]
-        category_tag = soup.select_one(".elem_category a")
-        category = category_tag.get_text(strip=True) if category_tag else None
+        title = field("title")
+        eng_name = field("eng_name")
+        orig_name = field("orig_name")
+        description = field("description")
+        author = field("author")
+        year = field("year")
+        genres = self.spec.rule("info", "genres").texts(soup)
+        category = field("category")
 
+        link_rule = self.spec.rule("info", "chapter_link")
+        date_rule = self.spec.rule("info", "chapter_date")
         chapters = []
-        for row in soup.select("tr.item-row"):
-            ch_link = row.select_one("a.chapter-link") or row.select_one("a[href*='/chapter/']")
+        for row in self.spec.rule("info", "chapter_rows").nodes(soup):
+            ch_link = link_rule.node(row)
             if not ch_link:
                 continue
-            ch_date = row.select_one("td.date")
+            ch_date = date_rule.node(row)
             ch_title = ch_link.get_text(strip=True)
             ch_url = urljoin(self.base_url, ch_link.get("href"))
             ch_url = self.ensure_mtr(ch_url)
-            chapters.append({"title": ch_title, "url": ch_url, "date": ch_date.get_text(strip=True) if ch_date else None})
+            chapters.append(Chapter(ch_title, ch_url, ch_date.get_text(strip=True) if ch_date else None,
+                                    chapter_number(ch_url, ch_title)))
 
         # переворачиваем порядок глав
         chapters.reverse()
 
-        return {"title": title, "eng_name": eng_name, "orig_name": orig_name, "description": description,
-                "author": author, "year": year, "category": category, "genres": genres, "chapters": chapters}
+        return MangaInfo(title=title, eng_name=eng_name, orig_name=orig_name, description=description,
+                         author=author, year=year, category=category, genres=genres, chapters=chapters)
 
     # get chapter images
     async def get_chapter_images(self, chapter_url: str) -> List[str]:
         chapter_url = self.ensure_mtr(chapter_url)
         html = await self.fetch_text(chapter_url)
 
-        # основной regex на readerInit
-        matches = re.findall(r"\['(https://[^']+)','',\"([^\"]+)\"", html)
+        # regex на readerInit (chapter.images в конфиге)
+        with PARSE_SECONDS.time(parser=self.name, operation="page"):
+            matches = self.spec.pattern("chapter", "images").findall(html)
         image_urls = []
         for base, path in matches:
             full_url = urljoin(base, path)
@@ -189,35 +256,329 @@ class BaseMangaParser:
 
         return image_urls
 
+    # images of many chapters at once
+    async def get_images_for_chapters(self, urls: List[str], concurrency: int = 4,
+                                      sample: int = 0) -> AsyncIterator[ChapterImages]:
+        """
+        Изображения глав urls, по мере готовности (порядок — как завершились).
+        Одновременно разбирается до concurrency глав; частоту запросов к сайту
+        всё равно ограничивает общий лимит парсера. Ошибка главы не прерывает
+        остальные — она в ChapterImages.error.
+        sample > 0 — оценить размер главы по HEAD sample страниц (см. estimate_size).
+
+            async for chapter in parser.get_images_for_chapters(urls, concurrency=8):
+                ...
+        """
+        todo = iter(dict.fromkeys(urls))
+        done: asyncio.Queue = asyncio.Queue()
+
+        async def worker() -> None:
+            # итератор общий: каждый воркер берёт следующую свободную главу
+            for url in todo:
+                result = ChapterImages(url)
+                try:
+                    result.images = await self.get_chapter_images(url)
+                    if sample and result.images:
+                        result.size = await self.estimate_size(result.images, sample)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    result.error = str(e) or type(e).__name__
+                await done.put(result)
+
+        total = len(dict.fromkeys(urls))
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, total)))]
+        try:
+            for _ in range(total):
+                yield await done.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def image_size(self, img_url: str) -> Optional[int]:
+        """Размер изображения по Content-Length из HEAD; None — сайт его не сообщил"""
+        sess = await self._get_session()
+        async with sess.head(img_url) as resp:
+            length = resp.headers.get("Content-Length")
+            if resp.status != 200 or not length or not length.isdigit():
+                return None
+            return int(length)
+
+    async def estimate_size(self, images: List[str], sample: int = 3) -> Optional[int]:
+        """
+        Оценка размера главы в байтах: HEAD для sample страниц, равномерно по главе,
+        средний размер умножается на число страниц (sample >= len(images) — точная сумма).
+        """
+        if not images:
+            return 0
+        if sample >= len(images):
+            picked = images
+        else:
+            step = len(images) / sample
+            picked = [images[int(i * step)] for i in range(sample)]
+        sizes = await asyncio.gather(*(self.image_size(u) for u in picked), return_exceptions=True)
+        known = [s for s in sizes if isinstance(s, int)]
+        if not known:
+            return None
+        if len(known) == len(images):
+            return sum(known)
+        return round(sum(known) / len(known) * len(images))
+
     # download chapter images
-    async def download_chapter(self, chapter_url: str, out_dir: str = "data/downloads/tmp") -> List[str]:
+    async def download_chapter(self, chapter_url: str, out_dir: str = "data/downloads/tmp",
+                               cbz: bool = False, info: Optional[MangaInfo] = None,
+                               blobs: Optional[BlobStore] = None,
+                               known: Optional[Dict[int, KnownPage]] = None) -> List[str]:
+        """
+        Скачать страницы главы в out_dir/<N>.<ext>; вернёт пути скачанных.
+        Подробности и параметры — download_pages.
+        """
         chapter_url = self.ensure_mtr(chapter_url)
-        os.makedirs(out_dir, exist_ok=True)
-        saved_files: List[str] = []
-
         images = await self.get_chapter_images(chapter_url)
         if not images:
-            print(f"[{self.name}] No images found for", chapter_url)
+            self.log.warning("нет изображений в главе {}", chapter_url)
             return []
+        pages = await self.download_pages(chapter_url, images, out_dir, cbz=cbz, info=info, blobs=blobs, known=known)
+        return [p.path for p in pages if p.path]
+
+    async def download_pages(self, chapter_url: str, images: List[str], out_dir: str, cbz: bool = False,
+                             info: Optional[MangaInfo] = None, blobs: Optional[BlobStore] = None,
+                             known: Optional[Dict[int, KnownPage]] = None,
+                             verify_hash: bool = False, retries: int = 1) -> List[PageDownload]:
+        """
+        Скачать страницы images главы в out_dir/<N>.<ext> с докачкой; результат — по странице.
+
+        known — номер страницы -> (размер, sha256, local_path) уже скачанных (из таблицы page):
+        файл нужного размера (verify_hash=True — и с тем же хэшем) не скачивается заново;
+        страница, перенесённая в pack-файл (local_path "pack:<id манги>"), — тоже.
+        Страница пишется в <файл>.part и переименовывается, только когда скачана целиком;
+        оставшийся от прерванной загрузки .part докачивается запросом Range.
+        Не скачавшиеся страницы повторяются ещё retries раз после основного прохода,
+        а оставшиеся ошибки возвращаются в PageDownload.error — для повторного запуска.
+        blobs — хранилище для дедупликации: страница хранится один раз,
+        а в out_dir кладётся жёсткая ссылка на неё.
+        cbz=True — вместо папки потоково писать в архив <out_dir>.cbz (ComicInfo.xml
+        строится из info = get_manga_info); path страниц — ссылки <архив>#<страница>.
+        Архив пересобирается: страницы из known, целые в прежнем архиве, копируются
+        из него, по сети качаются только недостающие. Повтор не скачавшихся
+        страниц архива — следующим вызовом (/api/download/retry).
+        """
+        if cbz:
+            return await self._download_chapter_cbz(chapter_url, images, out_dir, info, known or {}, verify_hash)
 
-        sess = await self._get_session()
+        os.makedirs(out_dir, exist_ok=True)
+        known = known or {}
+        pages: List[PageDownload] = []
         for idx, img_url in enumerate(images, start=1):
-            try:
-                async with sess.get(img_url) as resp:
+            filename = os.path.join(out_dir, f"{idx}{self._image_ext(img_url)}")
+            page = _packed_page(idx, img_url, known.get(idx))
+            if page is None and idx in known:
+                # размер и хэш файла — в потоке: sha256 большой страницы не держит цикл событий
+                page = await asyncio.to_thread(self._verified_page, idx, img_url, filename, known[idx], verify_hash)
+            if page is None:
+                page = await self._download_page(idx, img_url, filename, blobs)
+            pages.append(page)
+
+        for _ in range(retries):
+            failed = [p for p in pages if p.error]
+            if not failed:
+                break
+            self.log.info("повтор {} стр. главы {}", len(failed), chapter_url)
+            for page in failed:
+                filename = os.path.join(out_dir, f"{page.index}{self._image_ext(page.url)}")
+                pages[page.index - 1] = await self._download_page(page.index, page.url, filename, blobs)
+        return pages
+
+    @staticmethod
+    def _verified_page(idx: int, img_url: str, filename: str, known: Optional[KnownPage],
+                       verify_hash: bool) -> Optional[PageDownload]:
+        """Страница, уже скачанная целиком (по размеру и хэшу из БД), или None — качать"""
+        if known is None:
+            return None
+        size, digest, _ = known
+        try:
+            if os.path.getsize(filename) != size:
+                return None
+        except OSError:
+            return None
+        if verify_hash and digest and _file_sha256(filename) != digest:
+            return None
+        return PageDownload(idx, img_url, filename, size, digest, skipped=True)
+
+    async def _download_page(self, idx: int, img_url: str, filename: str,
+                             blobs: Optional[BlobStore]) -> PageDownload:
+        part = f"{filename}.part"
+        try:
+            # файловые операции — в потоке, чтобы не держать цикл событий
+            offset, sha = await asyncio.to_thread(_part_prefix, part)
+            sess = await self._get_session()
+            headers = {"Range": f"bytes={offset}-"} if offset else None
+            async with sess.get(img_url, headers=headers, operation="image") as resp:
+                if offset and resp.status == 416:
+                    # докачивать нечего: .part уже целый
+                    expected = offset
+                elif resp.status in (200, 206):
                     if resp.status == 200:
-                        data = await resp.read()
-                        parsed = urlparse(img_url)
-                        _, ext = os.path.splitext(parsed.path)
-                        if not ext:
-                            ext = ".jpg"
-                        filename = os.path.join(out_dir, f"{idx}{ext}")
-                        with open(filename, "wb") as f:
-                            f.write(data)
-                        saved_files.append(filename)
-                        print(f"[{self.name}] Saved {filename}")
-                    else:
-                        print(f"[{self.name}] Error downloading {img_url}: status {resp.status}")
-            except Exception as e:
-                print(f"[{self.name}] Exception downloading {img_url}: {e}")
-
-        return saved_files
\ No newline at end of file
+                        # сайт не поддерживает Range — качаем заново
+                        offset = 0
+                        sha = hashlib.sha256()
+                    expected = _expected_size(resp, offset)
+                    f = await asyncio.to_thread(open, part, "ab" if offset else "wb")
+                    try:
+                        async for chunk in resp.iter_chunks(64 * 1024):
+                            await asyncio.to_thread(_write_chunk, f, sha, chunk)
+                    finally:
+                        await asyncio.to_thread(f.close)
+                else:
+                    return PageDownload(idx, img_url, error=f"статус {resp.status}")
+            size = await asyncio.to_thread(os.path.getsize, part)
+            if expected is not None and size != expected:
+                # .part остаётся: следующая попытка его докачает
+                return PageDownload(idx, img_url, error=f"получено {size} из {expected} байт")
+            digest = sha.hexdigest()
+            if blobs is not None:
+                await asyncio.to_thread(blobs.adopt, part, digest, filename)
+            else:
+                await asyncio.to_thread(os.replace, part, filename)
+            self.log.debug("сохранено {}", filename)
+            return PageDownload(idx, img_url, filename, size, digest)
+        except Exception as e:
+            self.log.warning("ошибка загрузки {}: {}", img_url, e)
+            return PageDownload(idx, img_url, error=str(e) or type(e).__name__)
+
+    @staticmethod
+    def _image_ext(img_url: str) -> str:
+        _, ext = os.path.splitext(urlparse(img_url).path)
+        return ext or ".jpg"
+
+    async def _download_chapter_cbz(self, chapter_url: str, images: List[str], out_dir: str,
+                                    info: Optional[MangaInfo], known: Dict[int, KnownPage],
+                                    verify_hash: bool) -> List[PageDownload]:
+        out_dir = out_dir.rstrip("/\\")
+        os.makedirs(os.path.dirname(out_dir) or ".", exist_ok=True)
+        cbz_path = f"{out_dir}.cbz"
+        tmp_path = f"{cbz_path}.part"
+        chapter = next((c for c in info.chapters if c.url == chapter_url), None) if info else None
+        pages: List[PageDownload] = []
+        # прежний архив главы: уже скачанные страницы берутся из него;
+        # вся работа с архивами (копирование, хэши, запись) — в потоке, не в цикле событий
+        old = await asyncio.to_thread(open_cbz, cbz_path) if known else None
+
+        sess = await self._get_session()
+        try:
+            archive = await asyncio.to_thread(CbzWriter, tmp_path)
+            try:
+                await asyncio.to_thread(archive.add_comic_info,
+                                        comic_info_xml(info, chapter, len(images), chapter_url))
+                for idx, img_url in enumerate(images, start=1):
+                    name = page_name(idx, self._image_ext(img_url))
+                    page = _packed_page(idx, img_url, known.get(idx))
+                    if page is None and old is not None and idx in known:
+                        page = await asyncio.to_thread(self._kept_member, old, archive, idx, img_url, cbz_path,
+                                                       name, known[idx], verify_hash)
+                    if page is None:
+                        page = await self._download_member(sess, archive, idx, img_url, cbz_path, name)
+                    pages.append(page)
+            finally:
+                await asyncio.to_thread(archive.close)
+        finally:
+            if old is not None:
+                old.close()
+        await asyncio.to_thread(os.replace, tmp_path, cbz_path)
+        self.log.info("сохранён {} ({} стр., из них докачано {})", cbz_path, sum(1 for p in pages if p.path),
+                      sum(1 for p in pages if p.path and not p.skipped))
+        return pages
+
+    @staticmethod
+    def _kept_member(old: Optional[zipfile.ZipFile], archive: CbzWriter, idx: int, img_url: str, cbz_path: str,
+                     name: str, known: Optional[KnownPage],
+                     verify_hash: bool) -> Optional[PageDownload]:
+        """Страница, целиком лежащая в прежнем архиве (по размеру и хэшу из БД), — копируется; None — качать"""
+        if old is None or known is None:
+            return None
+        size, digest, _ = known
+        try:
+            if old.getinfo(name).file_size != size:
+                return None
+            if verify_hash and digest and member_sha256(old, name) != digest:
+                return None
+            archive.copy_page(old, name)
+        except (KeyError, OSError, zipfile.BadZipFile):
+            return None
+        return PageDownload(idx, img_url, member_ref(cbz_path, name), size, digest, skipped=True)
+
+    async def _download_member(self, sess, archive: CbzWriter, idx: int, img_url: str, cbz_path: str,
+                               name: str) -> PageDownload:
+        try:
+            async with sess.get(img_url, operation="image") as resp:
+                if resp.status != 200:
+                    self.log.warning("ошибка загрузки {}: статус {}", img_url, resp.status)
+                    return PageDownload(idx, img_url, error=f"статус {resp.status}")
+                # страница идёт в архив кусками, без буферизации целиком
+                expected = _expected_size(resp, 0)
+                size = 0
+                sha = hashlib.sha256()
+                dst = await asyncio.to_thread(archive.open_page, name)
+                try:
+                    async for chunk in resp.iter_chunks(64 * 1024):
+                        await asyncio.to_thread(_write_chunk, dst, sha, chunk)
+                        size += len(chunk)
+                finally:
+                    await asyncio.to_thread(dst.close)
+            if expected is not None and size != expected:
+                # запись страницы в архиве остаётся, но в БД её нет — следующий вызов скачает заново
+                return PageDownload(idx, img_url, error=f"получено {size} из {expected} байт")
+            return PageDownload(idx, img_url, member_ref(cbz_path, name), size, sha.hexdigest())
+        except Exception as e:
+            self.log.warning("ошибка загрузки {}: {}", img_url, e)
+            return PageDownload(idx, img_url, error=str(e) or type(e).__name__)
+
+
+def _packed_page(idx: int, img_url: str, known: Optional[KnownPage]) -> Optional[PageDownload]:
+    """
+    Страница уже в pack-файле манги (исходный файл удалён при переносе): не качается.
+    get_downloaded_pages отдаёт такие страницы, только если запись pack-файла на месте.
+    """
+    if known is None or not (known[2] or "").startswith(PACKED_MARKER):
+        return None
+    size, digest, local_path = known
+    return PageDownload(idx, img_url, local_path, size, digest, skipped=True)
+
+
+def _expected_size(resp, offset: int) -> Optional[int]:
+    """Полный размер файла из Content-Range (206) или Content-Length (200); None — неизвестен"""
+    content_range = resp.headers.get("Content-Range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit() and not resp.headers.get("Content-Encoding"):
+        # у сжатого ответа Content-Length — размер до распаковки
+        return offset + int(length)
+    return None
+
+
+def _part_prefix(part: str) -> tuple:
+    """Размер оставшегося .part и sha256 уже записанной части (хэш докачки продолжается с неё)"""
+    sha = hashlib.sha256()
+    try:
+        with open(part, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                sha.update(chunk)
+            return f.tell(), sha
+    except OSError:
+        return 0, sha
+
+
+def _write_chunk(f, sha, chunk: bytes) -> None:
+    f.write(chunk)
+    sha.update(chunk)
+
+
+def _file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            sha.update(chunk)
+    return sha.hexdigest()
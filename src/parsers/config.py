@@ -0,0 +1,226 @@
+# src/parsers/config.py
+"""
+Декларативное описание парсеров: config/default_config.json
+(или файл из MANGAMONITOR_PARSERS_CONFIG).
+
+    engines  — движки: класс парсера ("модуль:Класс") и правила разбора
+               по разделам (search, info, chapter);
+    parsers  — сайты: движок (engine), base_url, зеркала (mirrors),
+               rate_limit {rps, burst}, необязательные headers и rules —
+               переопределения разделов правил движка.
+
+Правило — CSS-селектор, "селектор@атрибут" или список альтернатив (берётся
+первая, что нашла элемент); значения в разделе chapter — регулярные
+выражения. При загрузке конфига селекторы компилируются (soupsieve), регулярки —
+re.compile; парсер получает готовые Rule и паттерны. Файл перечитывается, если
+изменился (проверка не чаще раза в RELOAD_CHECK_INTERVAL секунд) — сервер
+перезапускать не нужно; конфиг с ошибкой не применяется, остаётся прежний.
+
+Новое зеркало или сайт семейства readmanga — запись в parsers, без кода.
+"""
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from src.core.log import get_logger
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+CONFIG_PATH = Path(os.environ.get("MANGAMONITOR_PARSERS_CONFIG") or PROJECT_ROOT / "config" / "default_config.json")
+RELOAD_CHECK_INTERVAL = 2.0
+
+# Раздел правил, значения которого — регулярные выражения, а не селекторы
+REGEX_SECTIONS = ("chapter",)
+
+_ATTR_RE = re.compile(r"^(.*?)@([\w:-]+)$")
+
+log = get_logger("config")
+
+
+class ConfigError(ValueError):
+    """Ошибка в конфиге парсеров"""
+
+
+class Rule:
+    """Скомпилированный селектор: альтернативы (паттерн soupsieve, атрибут или None для текста)"""
+
+    __slots__ = ("source", "_alts")
+
+    def __init__(self, source):
+        import soupsieve
+
+        self.source = source
+        alts = source if isinstance(source, list) else [source]
+        self._alts: List[Tuple[object, Optional[str]]] = []
+        for item in alts:
+            m = _ATTR_RE.match(item)
+            css, attr = (m.group(1), m.group(2)) if m else (item, None)
+            try:
+                self._alts.append((soupsieve.compile(css), attr))
+            except Exception as e:
+                raise ConfigError(f"селектор {item!r}: {e}") from None
+
+    def node(self, root):
+        """Первый элемент первой сработавшей альтернативы"""
+        for pattern, _ in self._alts:
+            el = pattern.select_one(root)
+            if el is not None:
+                return el
+        return None
+
+    def nodes(self, root) -> list:
+        """Все элементы первой альтернативы, которая что-то нашла"""
+        for pattern, _ in self._alts:
+            found = pattern.select(root)
+            if found:
+                return found
+        return []
+
+    def _value(self, el, attr: Optional[str]) -> Optional[str]:
+        if attr is None:
+            return el.get_text(strip=True)
+        return el.get(attr)
+
+    def text(self, root) -> Optional[str]:
+        """Текст (или атрибут) первого найденного элемента; None — не нашлось"""
+        for pattern, attr in self._alts:
+            el = pattern.select_one(root)
+            if el is not None:
+                return self._value(el, attr)
+        return None
+
+    def texts(self, root) -> List[str]:
+        """Тексты (или атрибуты) всех элементов первой сработавшей альтернативы"""
+        for pattern, attr in self._alts:
+            found = pattern.select(root)
+            if found:
+                return [self._value(el, attr) for el in found]
+        return []
+
+
+class SiteSpec:
+    """Описание сайта из конфига с уже скомпилированными правилами"""
+
+    def __init__(self, name: str, engine: str, parser_class: str, base_url: str, mirrors: List[str],
+                 rate_limit: Tuple[float, int], headers: Optional[dict], rules: Dict[str, dict]):
+        self.name = name
+        self.engine = engine
+        self.parser_class = parser_class
+        self.base_url = base_url.rstrip("/")
+        self.mirrors = [m.rstrip("/") for m in mirrors]
+        self.rate, self.burst = rate_limit
+        self.headers = headers
+        self._rules = rules
+
+    @property
+    def hosts(self) -> List[str]:
+        return [urlparse(u).netloc.lower() for u in [self.base_url] + self.mirrors]
+
+    def rule(self, section: str, name: str) -> Rule:
+        return self._rules[section][name]
+
+    def pattern(self, section: str, name: str) -> "re.Pattern":
+        return self._rules[section][name]
+
+    def value(self, section: str, name: str, default=None):
+        """Простое значение раздела (например, search.path)"""
+        return self._rules.get(section, {}).get(name, default)
+
+
+def _compile_section(section: str, rules: dict) -> dict:
+    compiled = {}
+    for key, value in rules.items():
+        if section in REGEX_SECTIONS:
+            try:
+                compiled[key] = re.compile(value)
+            except re.error as e:
+                raise ConfigError(f"{section}.{key}: регулярное выражение: {e}") from None
+        elif key == "path":
+            compiled[key] = value
+        else:
+            compiled[key] = Rule(value)
+    return compiled
+
+
+def build_specs(data: dict) -> Dict[str, SiteSpec]:
+    """Разобрать и скомпилировать конфиг; ConfigError при ошибке"""
+    engines = data.get("engines", {})
+    specs: Dict[str, SiteSpec] = {}
+    compiled_engines: Dict[str, Dict[str, dict]] = {}
+    for name, site in data.get("parsers", {}).items():
+        engine_name = site.get("engine")
+        engine = engines.get(engine_name)
+        if engine is None:
+            raise ConfigError(f"парсер {name}: неизвестный движок {engine_name!r}")
+        if "base_url" not in site:
+            raise ConfigError(f"парсер {name}: нет base_url")
+        if engine_name not in compiled_engines:
+            compiled_engines[engine_name] = {section: _compile_section(section, rules)
+                                             for section, rules in engine.items() if isinstance(rules, dict)}
+        rules = dict(compiled_engines[engine_name])
+        for section, overrides in site.get("rules", {}).items():
+            # переопределения сайта дополняют раздел движка
+            rules[section] = {**rules.get(section, {}), **_compile_section(section, overrides)}
+        limit = site.get("rate_limit") or {}
+        specs[name] = SiteSpec(
+            name=name,
+            engine=engine_name,
+            parser_class=site.get("class") or engine["class"],
+            base_url=site["base_url"],
+            mirrors=site.get("mirrors", []),
+            rate_limit=(float(limit.get("rps", 0)), int(limit.get("burst", 1))),
+            headers=site.get("headers"),
+            rules=rules,
+        )
+    return specs
+
+
+class ParserConfig:
+    """Конфиг парсеров с перечитыванием при изменении файла"""
+
+    def __init__(self, path: Path = CONFIG_PATH):
+        self.path = path
+        self._specs: Dict[str, SiteSpec] = {}
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+
+    def specs(self) -> Dict[str, SiteSpec]:
+        now = time.monotonic()
+        if self._mtime is None or now - self._checked >= RELOAD_CHECK_INTERVAL:
+            self._checked = now
+            self._maybe_reload()
+        return self._specs
+
+    def _maybe_reload(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError as e:
+            if self._mtime is None:
+                raise ConfigError(f"нет конфига парсеров {self.path}: {e}") from None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            specs = build_specs(json.loads(self.path.read_text(encoding="utf-8")))
+        except Exception as e:
+            if self._mtime is None:
+                raise
+            # любая ошибка нового файла (не тот JSON, плохой regex, файл пропал между
+            # stat и чтением) не должна ронять запросы: работаем на прежнем конфиге
+            log.error("конфиг парсеров {} не применён, остаётся прежний: {}: {}",
+                      self.path, type(e).__name__, e)
+            self._mtime = mtime
+            return
+        if self._mtime is not None:
+            log.info("конфиг парсеров перечитан: {}", ", ".join(specs))
+        self._specs, self._mtime = specs, mtime
+
+
+parser_config = ParserConfig()
+
+
+def site_spec(name: str) -> Optional[SiteSpec]:
+    return parser_config.specs().get(name)
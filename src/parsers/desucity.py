@@ -1,17 +1,18 @@
 import re
-import aiohttp
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 from typing import List
-from .base_parser import BaseMangaParser
+from .base_parser import BaseMangaParser, chapter_number
+from .config import SiteSpec
+from .models import Chapter, MangaInfo, SearchResult
 
 
 
 class DesuCityParser(BaseMangaParser):
-    def __init__(self, base_url: str = "https://desu.city", headers: dict = None, timeout: int = 30):
-        super().__init__(base_url, "desucity", headers, timeout)
+    def __init__(self, base_url: str = None, name: str = "desucity", headers: dict = None, timeout: int = 30,
+                 transport: str = None, spec: SiteSpec = None, limited: bool = True):
+        super().__init__(base_url, name, headers, timeout, transport, spec, limited)
 
-    async def search_manga(self, query: str, max_pages: int = 1):
+    async def search_manga(self, query: str, max_pages: int = 1) -> List[SearchResult]:
         """Поиск манги через AJAX запрос"""
         url = f"{self.base_url}/manga/search/"
         payload = {
@@ -39,11 +40,11 @@ class DesuCityParser(BaseMangaParser):
         }
 
         sess = await self._get_session()
-        async with sess.post(url, data=payload, headers=headers) as resp:
-            data = await resp.json(content_type=None)
+        async with sess.post(url, data=payload, headers=headers, operation="search") as resp:
+            data = await resp.json()
 
         html = data.get("templateHtml", "")
-        soup = BeautifulSoup(html, "html.parser")
+        soup = self._parse_html(html, "search")
         results = []
 
         for row in soup.select("tr"):
@@ -62,20 +63,20 @@ class DesuCityParser(BaseMangaParser):
                 for dt, dd in zip(li.select("dt"), li.select("dd")):
                     if "Год" in dt.get_text():
                         year = dd.get_text(strip=True)
-                results.append({
-                    "title": title,
-                    "url": url,
-                    "year": year,
-                    "parser": self.name,
-                    "subtitle": subtitle
-                })
+                results.append(SearchResult(title=title, url=url, parser=self.name, year=year, subtitle=subtitle))
         return results
 
-    async def get_manga_info(self, slug_or_url: str):
+    def get_manga_url(self, chapter_url: str) -> str:
+        """https://desu.city/manga/slug.123/vol1/ch1/rus -> https://desu.city/manga/slug.123/"""
+        parsed = urlparse(chapter_url)
+        parts = [p for p in parsed.path.split("/") if p]
+        return f"{parsed.scheme}://{parsed.netloc}/{'/'.join(parts[:2])}/"
+
+    async def get_manga_info(self, slug_or_url: str) -> MangaInfo:
         """Получение информации о манге"""
         url = slug_or_url if slug_or_url.startswith("http") else f"{self.base_url}/{slug_or_url.lstrip('/')}"
-        html = await self.fetch_text(url)
-        soup = BeautifulSoup(html, "html.parser")
+        html = await self.fetch_text(url, operation="info")
+        soup = self._parse_html(html, "info")
 
         title_ru = soup.select_one("h1 .rus-name")
         title_en = soup.select_one("h1 .name")
@@ -95,20 +96,19 @@ class DesuCityParser(BaseMangaParser):
             ch_date = li.select_one("span.date")
             if not ch_link:
                 continue
-            chapters.append({
-                "title": ch_link.get_text(strip=True),
-                "url": urljoin(self.base_url, ch_link["href"]),
-                "date": ch_date.get_text(strip=True) if ch_date else None
-            })
-        return {
-            "title": title,
-            "eng_name": title_en.get_text(strip=True) if title_en else None,
-            "orig_name": title_ru.get_text(strip=True) if title_ru else None,
-            "description": description,
-            "author": author,
-            "genres": genres,
-            "chapters": chapters
-        }
+            ch_url = urljoin(self.base_url, ch_link["href"])
+            ch_title = ch_link.get_text(strip=True)
+            chapters.append(Chapter(ch_title, ch_url, ch_date.get_text(strip=True) if ch_date else None,
+                                    chapter_number(ch_url, ch_title)))
+        return MangaInfo(
+            title=title,
+            eng_name=title_en.get_text(strip=True) if title_en else None,
+            orig_name=title_ru.get_text(strip=True) if title_ru else None,
+            description=description,
+            author=author,
+            genres=genres,
+            chapters=chapters
+        )
 
 
 
@@ -141,7 +141,7 @@ class DesuCityParser(BaseMangaParser):
             return images
 
         # 3) Fallback — взять все <img> в #preload или на странице (фильтруем по домену desu.city/img)
-        soup = BeautifulSoup(html, "html.parser")
+        soup = self._parse_html(html, "page")
         for img in soup.select("#preload img, img"):
             src = img.get("src")
             if not src:
@@ -0,0 +1,112 @@
+# src/parsers/models.py
+"""
+Результаты парсеров: компактные dataclass-ы со __slots__ вместо словарей.
+Федеративный поиск и длинные списки глав создают десятки тысяч таких объектов,
+а у слотового объекта нет собственного __dict__ с повторяющимися ключами.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass(slots=True)
+class SearchResult:
+    title: Optional[str]
+    url: Optional[str]
+    parser: str
+    rating: Optional[float] = None
+    genres: List[str] = field(default_factory=list)
+    year: Optional[str] = None
+    similarity: float = 0
+    subtitle: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "title": self.title,
+            "url": self.url,
+            "parser": self.parser,
+            "rating": self.rating,
+            "genres": self.genres,
+            "year": self.year,
+            "similarity": self.similarity,
+            "subtitle": self.subtitle,
+        }
+
+
+@dataclass(slots=True)
+class Chapter:
+    title: str
+    url: str
+    date: Optional[str] = None
+    number: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {"title": self.title, "url": self.url, "date": self.date, "number": self.number}
+
+
+@dataclass(slots=True)
+class MangaInfo:
+    title: Optional[str]
+    eng_name: Optional[str] = None
+    orig_name: Optional[str] = None
+    description: Optional[str] = None
+    author: Optional[str] = None
+    year: Optional[str] = None
+    category: Optional[str] = None
+    genres: List[str] = field(default_factory=list)
+    chapters: List[Chapter] = field(default_factory=list)
+
+    def to_dict(self, chapters: bool = True) -> dict:
+        data = {
+            "title": self.title,
+            "eng_name": self.eng_name,
+            "orig_name": self.orig_name,
+            "description": self.description,
+            "author": self.author,
+            "year": self.year,
+            "category": self.category,
+            "genres": self.genres,
+        }
+        if chapters:
+            data["chapters"] = [ch.to_dict() for ch in self.chapters]
+        return data
+
+
+@dataclass(slots=True)
+class Page:
+    """Страница главы в читалке: номер с 1, URL (через прокси) и размеры, если известны"""
+    index: int
+    url: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {"index": self.index, "url": self.url, "width": self.width, "height": self.height}
+
+
+@dataclass(slots=True)
+class ChapterImages:
+    """Страницы главы из get_images_for_chapters: изображения или ошибка; size — оценка байт по HEAD"""
+    url: str
+    images: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    size: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {"url": self.url, "images": self.images, "error": self.error, "size": self.size}
+
+
+@dataclass(slots=True)
+class PageDownload:
+    """Скачивание страницы: path — файл (или <архив.cbz>#<имя>); None — не скачалась, причина в error"""
+    index: int
+    url: str
+    path: Optional[str] = None
+    size: Optional[int] = None
+    hash: Optional[str] = None
+    error: Optional[str] = None
+    # уже была скачана и прошла проверку — не качалась
+    skipped: bool = False
+
+    def to_dict(self) -> dict:
+        return {"index": self.index, "url": self.url, "path": self.path, "size": self.size,
+                "error": self.error, "skipped": self.skipped}
@@ -0,0 +1,57 @@
+# src/web/responses.py
+"""
+Быстрая JSON-сериализация ответов API.
+
+Если установлен orjson, он используется и как класс ответа по умолчанию, и в
+FastJSONResponse. Эндпоинты, которые возвращают FastJSONResponse, обходят
+jsonable_encoder FastAPI: orjson сам сериализует dataclass-модели парсеров.
+Без orjson всё работает через стандартный json.
+
+BufferResponse отдаёт memoryview (срез mmap pack-файла) как есть, без
+копирования в bytes.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """JSON в байтах; модели с to_dict() сериализуются без промежуточного jsonable_encoder"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class BufferResponse(Response):
+    """Тело ответа — memoryview/bytes без копирования; Content-Length по длине буфера"""
+
+    def render(self, content: Any) -> Any:
+        if isinstance(content, memoryview):
+            return content
+        return super().render(content)
+
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+else:
+    DefaultJSONResponse = JSONResponse
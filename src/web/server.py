@@ -1,35 +1,528 @@
 # src/web/server.py
 import os
+import time
+import hashlib
 import asyncio
-from urllib.parse import urlparse, quote
-from fastapi import FastAPI, Query, HTTPException
+from urllib.parse import urlparse, quote, parse_qs
+from fastapi import FastAPI, Query, HTTPException, Request
 from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import Response
-import aiohttp
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from fastapi.responses import Response, StreamingResponse, FileResponse, PlainTextResponse
+from typing import Dict, List, Optional, Set, Tuple
 
 from src.core.database import (
-    init_db, ensure_manga, ensure_chapter,
-    save_page, mark_chapter_saved, get_manga_list
+    init_db, ensure_chapter,
+    save_page_urls, get_downloaded_pages, save_downloaded_pages, get_failed_chapters,
+    mark_chapter_saved, get_manga_list, get_page, get_history, get_manga_history,
+    save_manga_info, get_manga_by_url, get_manga_meta, get_chapters_range, count_chapters,
+    get_chapter_by_url, get_chapter_pages, get_neighbour_chapters, get_local_page_id
 )
-from src.core.parser_manager import get_parser, get_parser_by_url, get_all_parsers, search_all_parsers
+from src.core.parser_manager import get_parser, get_parser_by_url, federated_search, list_parsers as parser_names
+from src.parsers.models import Chapter, ChapterImages, MangaInfo, Page
+from src.web.responses import BufferResponse, DefaultJSONResponse, FastJSONResponse, dumps as json_dumps
+from src.core.archive import ChunkSink, CbzWriter, comic_info_xml, page_name, read_member
+from src.core.blobstore import BlobStore
+from src.core.pagestore import PageStore, guess_mime, migrate as pack_pages
+from src.core.storage import StorageManager
+from src.core.progress import ProgressRecorder
+from src.core.imaging import image_size, is_supported, negotiate_format, normalize_width, transcode_async, shutdown_pool
+from src.core.singleflight import SingleFlight, singleflight_stats
+from src.core.deadline import deadline, detached_context
+from src.core.transport import Transport, create_transport
+from src.core.offline import (
+    HostOffline, host_of, offline_reason, refresh_manual, set_offline, run as refresh_offline, status as offline_status
+)
+from src.core.log import get_logger, setup_logging
+from src.core.metrics import REGISTRY, HTTP_REQUESTS, HTTP_SECONDS, gauge_lines
+from src.core.tracing import start_trace, get_trace, recent_traces
+from src.core.shared import WORKERS, LeaseBusy, job_lease, make_image_cache, make_ttl_cache
+from src.core.profiling import (
+    PROFILING_ENABLED, RequestProfile, list_profiles, profile_allowed, profile_file, profile_requested
+)
+
+log = get_logger("server")
+
+app = FastAPI(title="MangaMonitor API", default_response_class=DefaultJSONResponse)
+
+# Сквозной срок обработки запроса к API, секунды: по нему урезаются таймауты
+# всех запросов к сайтам, а федеративный поиск отдаёт то, что успело прийти.
+# Клиент может задать свой срок заголовком X-Request-Timeout (не больше максимума).
+REQUEST_DEADLINE = 20
+REQUEST_DEADLINE_MAX = 60
+# Долгие выгрузки и скачивания идут без срока
+NO_DEADLINE_PATHS = ("/api/chapter/cbz", "/api/download", "/api/blobs/gc", "/api/manga/images",
+                     "/api/storage/enforce")
+
+
+class DeadlineMiddleware:
+    """ASGI-middleware: выставляет срок запроса в contextvar (см. src/core/deadline.py)"""
 
-app = FastAPI(title="MangaMonitor API")
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(NO_DEADLINE_PATHS):
+            return await self.app(scope, receive, send)
+        seconds = REQUEST_DEADLINE
+        for name, value in scope["headers"]:
+            if name == b"x-request-timeout":
+                try:
+                    seconds = min(max(float(value), 0), REQUEST_DEADLINE_MAX)
+                except ValueError:
+                    pass
+        with deadline(seconds):
+            await self.app(scope, receive, send)
 
-# Инициализация базы данных
-init_db()
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: счётчик и длительность запросов по обработчику (/metrics).
+    С заголовком X-Trace: 1 или параметром ?trace=1 запрос трассируется:
+    id трассы возвращается в X-Trace-Id, сама трасса — на /api/traces/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    message["headers"] = list(message.get("headers", [])) + \
+                        [(b"x-trace-id", trace.trace_id.encode())]
+            await send(message)
+
+        trace = None
+        try:
+            if _trace_requested(scope):
+                with start_trace(f"{scope['method']} {scope['path']}") as trace:
+                    await self.app(scope, receive, send_wrapper)
+            else:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", type(endpoint).__name__) if endpoint else "unmatched"
+            HTTP_REQUESTS.inc(handler=handler, method=scope["method"], status=status)
+            HTTP_SECONDS.observe(time.perf_counter() - started, handler=handler)
+
+
+def _trace_requested(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-trace":
+            return value not in (b"", b"0")
+    query = scope.get("query_string", b"")
+    return b"trace" in query and parse_qs(query.decode("latin-1")).get("trace", ["0"])[0] not in ("", "0")
+
+
+class ProfileMiddleware:
+    """
+    ASGI-middleware: профиль запроса по X-Profile: 1 / ?profile=1 от клиента с localhost
+    или с MANGAMONITOR_PROFILE_TOKEN (см. src/core/profiling.py). id профиля возвращается в X-Profile-Id, файл — на /api/profiles/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profile_requested(scope):
+            return await self.app(scope, receive, send)
+        profile = RequestProfile.begin(scope["method"], scope["path"])
+        if profile is None:
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + \
+                    [(b"x-profile-id", profile.profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.stop()
+            await asyncio.to_thread(profile.save, status)
+
+
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(MetricsMiddleware)
+if PROFILING_ENABLED:
+    # без флага у запроса — только просмотр заголовков; без MANGAMONITOR_PROFILING=1 не ставится
+    app.add_middleware(ProfileMiddleware)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
-# Создать папку, если вдруг её нет
-os.makedirs(STATIC_DIR, exist_ok=True)
-os.makedirs(TEMPLATES_DIR, exist_ok=True)
+STATIC_CACHE_CONTROL = "public, max-age=604800"
+# HTML отдаётся клиенту кусками примерно такого размера
+RENDER_CHUNK_SIZE = 16 * 1024
+
 
-# Mount static files and templates
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+class CachedStaticFiles(StaticFiles):
+    """Статика с Cache-Control; ссылки версионируются через static_url()"""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+        return response
+
+
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
+
+
+def _static_version(path: str) -> str:
+    try:
+        return str(int(os.path.getmtime(os.path.join(STATIC_DIR, path))))
+    except OSError:
+        return "0"
+
+
+_static_versions: Dict[str, str] = {}
+
+
+def static_url(path: str) -> str:
+    """/static/<path>?v=<mtime>: новая версия файла — новый URL, старый можно кэшировать долго"""
+    version = _static_versions.get(path)
+    if version is None:
+        version = _static_versions[path] = _static_version(path)
+    return f"/static/{path}?v={version}"
+
+
+# Шаблоны компилируются один раз при старте
+templates_env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+templates_env.globals["static_url"] = static_url
+templates_env.filters["quote_url"] = lambda value: quote(value or "", safe="")
+templates_env.filters["datetime"] = lambda ts: time.strftime("%d.%m.%Y %H:%M", time.localtime(ts)) if ts else "—"
+
+_search_template = templates_env.get_template("search.html")
+_manga_template = templates_env.get_template("manga.html")
+_chapter_template = templates_env.get_template("chapter.html")
+_error_template = templates_env.get_template("error.html")
+
+
+def _chunked(parts, size: int = RENDER_CHUNK_SIZE):
+    """Склеить мелкие фрагменты generate() в куски ~size, чтобы не гонять каждый через threadpool"""
+    buf = []
+    buffered = 0
+    for part in parts:
+        buf.append(part)
+        buffered += len(part)
+        if buffered >= size:
+            yield "".join(buf)
+            buf.clear()
+            buffered = 0
+    if buf:
+        yield "".join(buf)
+
+
+def render_stream(template, **context) -> StreamingResponse:
+    """Потоковый рендер шаблона: страница начинает отдаваться до окончания рендера"""
+    return StreamingResponse(_chunked(template.generate(**context)), media_type="text/html; charset=utf-8")
+
+
+PROXY_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Referer": "https://desu.city/",
+    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+}
+
+# Список глав в БД считается свежим столько секунд
+CHAPTERS_TTL = 30 * 60
+CHAPTERS_PAGE_LIMIT = 500
+# Информация о манге в БД: моложе INFO_TTL отдаётся как есть, до INFO_MAX_STALE —
+# тоже из БД, но с обновлением в фоне; старше — запрашивается с сайта
+INFO_TTL = 30 * 60
+INFO_MAX_STALE = 7 * 24 * 60 * 60
+
+# /api/manga/images: глав разбирается одновременно (по умолчанию и максимум)
+# и сколько готовых глав копится перед записью их страниц в БД
+BULK_CONCURRENCY = 4
+BULK_CONCURRENCY_MAX = 16
+BULK_SAVE_BATCH = 50
+
+# Сколько следующих страниц прогревать, пока читается текущая
+PREFETCH_PAGES = 3
+PREFETCH_MAX_PAGES = 10
+
+# Кэши: списки страниц глав, информация о манге, результаты поиска, байты
+# изображений. При MANGAMONITOR_WORKERS > 1 — общие для процессов (src/core/shared.py)
+_chapter_cache = make_ttl_cache("chapter_images", maxsize=512, ttl=30 * 60)
+_info_cache = make_ttl_cache("manga_info", maxsize=128, ttl=10 * 60)
+_search_cache = make_ttl_cache("search", maxsize=256, ttl=5 * 60)
+image_cache = make_image_cache("images")
+page_store = PageStore()
+blob_store = BlobStore()
+# квоты на скачанное и вытеснение давно не открытых глав (src/core/storage.py)
+storage = StorageManager(blobs=blob_store, packs=page_store)
+# позиции чтения копятся в памяти и пишутся в БД пачкой (src/core/progress.py)
+progress = ProgressRecorder()
+# url изображения -> (ширина, высота) для уже скачанных страниц
+_image_dims = make_ttl_cache("image_dims", maxsize=20000, ttl=24 * 60 * 60)
+
+# Манифест главы неизменен, пока у главы есть следующая; у последней главы он
+# может поменяться (выйдет продолжение), поэтому кэшируется недолго
+MANIFEST_CACHE_CONTROL = "public, max-age=604800, immutable"
+MANIFEST_CACHE_CONTROL_LAST = "public, max-age=600"
+
+# Одновременные запросы одного изображения (клиенты + прогрев) и одного
+# варианта перекодирования выполняются один раз
+_image_flight = SingleFlight("image")
+_transcode_flight = SingleFlight("transcode")
+# фоновое обновление информации о манге — одно на мангу
+_info_flight = SingleFlight("info")
+_image_transport: Optional[Transport] = None
+# ссылки на прочие фоновые задачи, чтобы их не собрал GC
+_background: Set[asyncio.Task] = set()
+
+
+def _proxy_url(img_url: str) -> str:
+    return f"/api/proxy?url={quote(img_url, safe='')}"
+
+
+def _chapter_key(url: str) -> str:
+    """Ключ главы без query (?mtr=true и т.п.) и завершающего слеша"""
+    parsed = urlparse(url)
+    return f"{parsed.netloc}{parsed.path.rstrip('/')}"
+
+
+def _background_done(task: asyncio.Task) -> None:
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.warning("ошибка фоновой задачи: {}", task.exception())
+
+
+def _spawn(coro) -> asyncio.Task:
+    # фоновая задача переживает запрос, поэтому его срок на неё не распространяется
+    task = asyncio.get_running_loop().create_task(coro, context=detached_context())
+    _background.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+
+async def get_cached_chapter_images(url: str) -> List[str]:
+    """Список изображений главы (оригинальные URL) с кэшированием"""
+    key = _chapter_key(url)
+    images = _chapter_cache.get(key)
+    if images is None:
+        parser = get_parser_by_url(url)
+        if parser is None:
+            raise HTTPException(status_code=400, detail="Не удалось определить подходящий парсер для URL")
+        async with parser:
+            images = await parser.get_chapter_images(url)
+        if images:
+            _chapter_cache.set(key, images)
+            # страницы главы, которая есть в БД, запоминаются для офлайн-режима
+            _spawn(asyncio.to_thread(save_page_urls, [(url, images)]))
+    return images
+
+
+async def get_cached_manga_info(chapter_url: str) -> Tuple[Optional[str], Optional[MangaInfo]]:
+    """URL манги и информация о ней (с кэшированием) по URL главы"""
+    parser = get_parser_by_url(chapter_url)
+    if parser is None:
+        return None, None
+    manga_url = parser.get_manga_url(chapter_url)
+    info = _info_cache.get(manga_url)
+    if info is None:
+        info, _ = await cached_manga_info(manga_url, parser)
+        _info_cache.set(manga_url, info)
+    return manga_url, info
+
+
+async def load_manga_info(url: str, parser=None) -> MangaInfo:
+    """Информация о манге с сайта; попутно обновляет кэш и сохраняет её в БД целиком (с главами)"""
+    parser = parser or get_parser_by_url(url)
+    if parser is None:
+        raise HTTPException(status_code=400, detail="Не удалось определить подходящий парсер для URL")
+    async with parser:
+        info = await parser.get_manga_info(url)
+    _info_cache.set(url, info)
+    await asyncio.to_thread(save_manga_info, url, info)
+    return info
+
+
+async def cached_manga_info(url: str, parser=None) -> Tuple[MangaInfo, float]:
+    """
+    Информация о манге сначала из БД: моложе INFO_TTL — как есть, до INFO_MAX_STALE —
+    с обновлением в фоне, иначе с сайта. Вернёт (информация, когда получена с сайта).
+    """
+    cached = await asyncio.to_thread(_info_from_db, url, True)
+    if cached is not None:
+        age = time.time() - cached[1]
+        if age < INFO_TTL:
+            return cached
+        if age < INFO_MAX_STALE:
+            refresh_manga_info(url)
+            return cached
+    return await load_manga_info(url, parser), time.time()
+
+
+def refresh_manga_info(url: str) -> None:
+    """Обновить информацию о манге в фоне (не больше одного обновления на мангу)"""
+    if _info_flight.inflight(url) or offline_reason(url) is not None:
+        return
+    _spawn(_info_flight.do(url, lambda: load_manga_info(url)))
+
+
+async def cached_search(q: str, parser: str, max_pages: int) -> Tuple[list, List[str]]:
+    """
+    Поиск через один парсер или все ("all") с кэшированием.
+    Возвращает (результаты, не ответившие вовремя парсеры); неполный ответ не кэшируется.
+    """
+    key = f"{parser}:{max_pages}:{q.strip().lower()}"
+    results = _search_cache.get(key)
+    if results is not None:
+        return results, []
+    if parser == "all":
+        results, incomplete = await federated_search(q, max_pages=max_pages)
+    else:
+        parser_obj = get_parser(parser)
+        if parser_obj is None:
+            raise HTTPException(status_code=400, detail=f"Парсер '{parser}' не найден")
+        async with parser_obj:
+            results = await parser_obj.search_manga(q, max_pages=max_pages)
+        incomplete = []
+    if not incomplete:
+        _search_cache.set(key, results)
+    return results, incomplete
+
+
+def _freshness(reason: str, updated_at: Optional[float]) -> dict:
+    """Отметка ответа из БД: почему без сети и насколько устарели данные"""
+    return {
+        "reason": reason,
+        "updated_at": updated_at,
+        "age": int(time.time() - updated_at) if updated_at else None,
+    }
+
+
+def _offline_error(what: str) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Сайт недоступен (офлайн-режим), {what}")
+
+
+def _info_from_db(url: str, complete: bool = False) -> Optional[Tuple[MangaInfo, Optional[float]]]:
+    """
+    Информация о манге из БД и когда она получена с сайта.
+    complete — только если сохранена целиком (а не одни название и главы).
+    """
+    meta = get_manga_meta(url)
+    if meta is None or (complete and meta[9] is None):
+        return None
+    manga_id, title, eng_name, orig_name, description, author, year, category, genres, info_at, chapters_at = meta
+    chapters = [Chapter(ch_title, ch_url, date, number)
+                for _, number, ch_title, ch_url, date, _ in get_chapters_range(manga_id, limit=-1)]
+    info = MangaInfo(title, eng_name, orig_name, description, author, year, category, genres, chapters)
+    return info, info_at or chapters_at
+
+
+def _pages_from_db(url: str) -> Optional[Tuple[tuple, List[Page], int]]:
+    """
+    Страницы главы без сети: (глава из БД, страницы, сколько недоступно).
+    Скачанные отдаются через /api/page/{id}, лежащие в кэше изображений — через прокси.
+    """
+    chapter = get_chapter_by_url(url)
+    if chapter is None:
+        return None
+    pages: List[Page] = []
+    missing = 0
+    for page_id, _, img_url, local_path in get_chapter_pages(chapter[0]):
+        if local_path:
+            page_url = f"/api/page/{page_id}"
+        elif img_url and img_url in image_cache:
+            page_url = _proxy_url(img_url)
+        else:
+            missing += 1
+            continue
+        dims = _image_dims.get(img_url) if img_url else None
+        pages.append(Page(len(pages) + 1, page_url, *dims) if dims else Page(len(pages) + 1, page_url))
+    return chapter, pages, missing
+
+
+def _find_chapter(info: MangaInfo, url: str) -> Optional[int]:
+    key = _chapter_key(url)
+    for i, chap in enumerate(info.chapters):
+        if _chapter_key(chap.url) == key:
+            return i
+    return None
+
+
+async def get_chapter_neighbours(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """URL предыдущей и следующей главы по списку глав манги"""
+    _, info = await get_cached_manga_info(url)
+    pos = _find_chapter(info, url) if info else None
+    if pos is None:
+        return None, None
+    chapters = info.chapters
+    prev_url = chapters[pos - 1].url if pos > 0 else None
+    next_url = chapters[pos + 1].url if pos + 1 < len(chapters) else None
+    return prev_url, next_url
+
+
+async def fetch_image(url: str) -> Tuple[bytes, str]:
+    """Скачать изображение с Referer-заголовками (через кэш, без дублей идущих загрузок)"""
+    cached = await image_cache.aget(url)
+    if cached is not None:
+        return cached
+    return await _image_flight.do(url, lambda: _download_image(url))
+
+
+def _get_image_transport() -> Transport:
+    """Общая сессия для загрузки изображений (прокси, прогрев, CBZ)"""
+    global _image_transport
+    if _image_transport is None or _image_transport.closed:
+        _image_transport = create_transport(None, PROXY_HEADERS, 60, label="proxy")
+    return _image_transport
+
+
+async def _download_image(url: str) -> Tuple[bytes, str]:
+    async with _get_image_transport().get(url, operation="image") as resp:
+        if resp.status != 200:
+            # ошибку сайта нельзя отдавать (и кэшировать) как изображение: 404 — как есть, прочее — 502
+            raise HTTPException(status_code=404 if resp.status == 404 else 502,
+                                detail=f"Сайт вернул статус {resp.status} для изображения")
+        content = await resp.read()
+        content_type = resp.headers.get("Content-Type", "image/jpeg")
+        await image_cache.aset(url, content, content_type)
+        dims = image_size(content)
+        if dims:
+            _image_dims.set(url, dims)
+        return content, content_type
+
+
+def _upstream_error(prefix: str, e: Exception) -> HTTPException:
+    """HTTP-ошибка для исключения обработчика: таймаут сайта или срок запроса — 504"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, HostOffline):
+        return HTTPException(status_code=503, detail=f"{prefix}: {e}")
+    if isinstance(e, asyncio.TimeoutError):
+        return HTTPException(status_code=504, detail=f"{prefix}: сайт не ответил вовремя ({e})")
+    return HTTPException(status_code=500, detail=f"{prefix}: {str(e)}")
+
+
+def warm_images(urls: List[str]) -> None:
+    """Фоново загрузить изображения в кэш (без дублей уже идущих загрузок)"""
+    for url in urls:
+        if url in image_cache or _image_flight.inflight(url):
+            continue
+        _spawn(fetch_image(url))
 
 
 @app.get("/")
@@ -38,19 +531,151 @@ def root():
 
 
 
+@app.on_event("startup")
+def _setup_logging():
+    # первым: остальные обработчики запуска уже пишут в настроенный лог
+    setup_logging()
+
+
+@app.on_event("startup")
+def _init_db():
+    # БД и data/ создаются при запуске приложения, а не при импорте модуля
+    init_db()
+
+
+@app.on_event("startup")
+async def _start_progress_flush():
+    _spawn(progress.run())
+
+
+@app.on_event("startup")
+async def _start_offline_refresh():
+    # ручные отметки офлайн-режима читаются из БД в фоне, а не на пути запроса
+    await asyncio.to_thread(refresh_manual)
+    _spawn(refresh_offline())
+
+
+@app.on_event("shutdown")
+async def _flush_progress():
+    await asyncio.to_thread(progress.flush)
+
+
+@app.on_event("shutdown")
+async def _shutdown_image_pool():
+    shutdown_pool()
+    page_store.close()
+    if _image_transport is not None and not _image_transport.closed:
+        await _image_transport.close()
+
+
 @app.get("/api/proxy")
-async def proxy_image(url: str):
-    """Прокси изображений с Desu.city для обхода защиты Referer"""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
-        "Referer": "https://desu.city/",
-        "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-    }
-    async with aiohttp.ClientSession(headers=headers) as session:
-        async with session.get(url) as resp:
-            content = await resp.read()
-            return Response(content=content, media_type=resp.headers.get("Content-Type", "image/jpeg"))
+async def proxy_image(
+        request: Request,
+        url: str,
+        w: Optional[int] = Query(None, description="Уменьшить до ширины (px)"),
+        fmt: Optional[str] = Query(None, description="Формат: webp, avif, jpeg или auto (по Accept)")
+):
+    """
+    Прокси изображений с Desu.city для обхода защиты Referer (с уменьшением/перекодированием).
+    Долгий Cache-Control и перекодирование — только для изображения, полученного с кодом 200;
+    ошибка сайта отдаётся ошибкой (404 или 502).
+    """
+    # если страница уже грузится (прогрев или другой клиент) — ждём ту же загрузку
+    try:
+        content, content_type = await fetch_image(url)
+    except HostOffline as e:
+        # манифест с прокси-ссылками мог остаться у клиента с тех пор, когда сайт был доступен
+        page_id = await asyncio.to_thread(get_local_page_id, url)
+        if page_id is None:
+            raise _upstream_error("Изображение недоступно", e)
+        return await asyncio.to_thread(local_page, page_id)
+
+    headers = {"Cache-Control": "public, max-age=86400"}
+    if w is None and fmt is None:
+        return Response(content=content, media_type=content_type, headers=headers)
+
+    width = normalize_width(w)
+    if fmt is None or fmt == "auto" or not is_supported(fmt):
+        fmt = negotiate_format(request.headers.get("accept", ""))
+        headers["Vary"] = "Accept"
+
+    key = (url, width, fmt)
+    variant = await image_cache.aget(key)
+    if variant is None:
+        try:
+            variant = await _transcode_flight.do(key, lambda: transcode_async(content, width, fmt))
+        except Exception as e:
+            log.warning("ошибка перекодирования {}: {}", url, e)
+            return Response(content=content, media_type=content_type, headers=headers)
+        await image_cache.aset(key, *variant)
+    return Response(content=variant[0], media_type=variant[1], headers=headers)
+
+
+
+@app.get("/api/stats")
+def stats():
+    """Счётчики объединения запросов: выполнено реально / присоединилось к идущим"""
+    return {"singleflight": singleflight_stats()}
+
+
+@REGISTRY.collector
+def _runtime_metrics() -> List[str]:
+    flights = singleflight_stats()
+    return (
+        gauge_lines("mangamonitor_singleflight_calls", "Выполнено запросов single-flight",
+                    (({"flight": n}, st["calls"]) for n, st in flights.items()))
+        + gauge_lines("mangamonitor_singleflight_coalesced", "Присоединилось к уже идущим запросам",
+                      (({"flight": n}, st["coalesced"]) for n, st in flights.items()))
+        + gauge_lines("mangamonitor_image_cache_bytes", "Объём кэша изображений", [({}, image_cache.size)])
+        + gauge_lines("mangamonitor_image_cache_entries", "Записей в кэше изображений", [({}, len(image_cache))])
+        + gauge_lines("mangamonitor_background_tasks", "Фоновых задач (прогрев и т.п.)", [({}, len(_background))])
+        + gauge_lines("mangamonitor_circuit_open", "Circuit breaker хоста открыт (офлайн-режим)",
+                      (({"host": h["host"]}, h["state"] == "open") for h in offline_status()["hosts"]))
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 
+@app.get("/api/traces")
+def list_traces():
+    """Последние трассы запросов (включаются заголовком X-Trace: 1 или ?trace=1)"""
+    return {"traces": recent_traces()}
+
+
+def _check_profile_access(request: Request) -> None:
+    if not profile_allowed(request.scope):
+        raise HTTPException(status_code=403, detail="Профили доступны с localhost или с X-Profile-Token")
+
+
+@app.get("/api/profiles")
+def profiles(request: Request):
+    """Сохранённые профили запросов (X-Profile: 1 или ?profile=1), новые первыми"""
+    _check_profile_access(request)
+    return {"enabled": PROFILING_ENABLED, "profiles": list_profiles()}
+
+
+@app.get("/api/profiles/{profile_id}")
+def download_profile(request: Request, profile_id: str):
+    """Файл профиля: HTML pyinstrument открывается в браузере, .prof — для pstats/snakeviz"""
+    _check_profile_access(request)
+    path = profile_file(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    if path.suffix == ".html":
+        return FileResponse(path, media_type="text/html")
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
+
+@app.get("/api/traces/{trace_id}")
+def trace_detail(trace_id: str):
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Трасса не найдена")
+    return trace.to_dict()
 
 
 @app.get("/api/parsers")
@@ -74,50 +699,204 @@ async def search(
 ):
     """Поиск манги через парсер(ы)"""
     try:
+        results, incomplete = await cached_search(q, parser, max_pages)
         if parser == "all":
-            # Поиск по всем парсерам
-            parsers = get_all_parsers()
-            async with asyncio.TaskGroup() as tg:
-                tasks = [tg.create_task(p.search_manga(q, max_pages=max_pages)) for p in parsers]
-
-            # Собираем все результаты
-            all_results = []
-            for task in tasks:
-                try:
-                    results = task.result()
-                    all_results.extend(results)
-                except Exception as e:
-                    print(f"Ошибка при поиске: {e}")
-
-            # Сортируем по релевантности
-            all_results.sort(key=lambda x: (x.get("similarity", 0), x.get("rating", 0)), reverse=True)
-            return {"results": all_results}
-        else:
-            # Поиск через конкретный парсер
-            parser_obj = get_parser(parser)
-            if parser_obj is None:
-                raise HTTPException(status_code=400, detail=f"Парсер '{parser}' не найден")
-
-            async with parser_obj:
-                results = await parser_obj.search_manga(q, max_pages=max_pages)
-            return {"results": results}
+            # не успевшие к сроку парсеры перечислены в incomplete
+            return FastJSONResponse({"results": results, "incomplete": incomplete})
+        return FastJSONResponse({"results": results})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при поиске: {str(e)}")
+        raise _upstream_error("Ошибка при поиске", e)
 
 
 @app.get("/api/info")
-async def manga_info(url: str):
-    """Информация о выбранной манге (название, описание, главы)"""
+async def manga_info(url: str, chapters: bool = Query(True, description="false — без списка глав (см. /api/chapters)")):
+    """
+    Информация о выбранной манге (название, описание, главы). Отдаётся из БД, пока
+    не устарела (updated_at — когда получена с сайта), см. cached_manga_info.
+    В офлайн-режиме — из БД в любом случае, с отметкой offline: причина и возраст данных.
+    """
+    offline = None
+    reason = offline_reason(url)
     try:
-        parser = get_parser_by_url(url)
-        if parser is None:
-            raise HTTPException(status_code=400, detail="Не удалось определить подходящий парсер для URL")
+        if reason is None:
+            info, updated_at = await cached_manga_info(url)
+    except HostOffline as e:
+        reason = e.reason
+    except Exception as e:
+        raise _upstream_error("Ошибка при получении информации", e)
+
+    if reason is not None:
+        cached = await asyncio.to_thread(_info_from_db, url)
+        if cached is None:
+            raise _offline_error("манги нет в локальной базе")
+        info, updated_at = cached
+        offline = _freshness(reason, updated_at)
+
+    data = info.to_dict(chapters=chapters)
+    if not chapters:
+        data["chapters_total"] = len(info.chapters)
+    data["updated_at"] = updated_at
+    if offline is not None:
+        data["offline"] = offline
+    return FastJSONResponse(data)
+
+
+def _chapters_page(url: str, after: Optional[int], limit: int, number_from: Optional[float],
+                   number_to: Optional[float]) -> Tuple[Optional[tuple], List[tuple], int]:
+    """Манга, limit + 1 глав после курсора и общее число глав — все запросы к БД одним вызовом в потоке"""
+    manga = get_manga_by_url(url)
+    if manga is None:
+        return None, [], 0
+    return manga, get_chapters_range(manga[0], after, limit + 1, number_from, number_to), count_chapters(manga[0])
+
+
+@app.get("/api/chapters")
+async def chapters_list(
+        url: str,
+        cursor: Optional[str] = Query(None, description="next_cursor из предыдущего ответа"),
+        limit: int = Query(100, description=f"Глав в ответе (до {CHAPTERS_PAGE_LIMIT})"),
+        number_from: Optional[float] = Query(None, alias="from", description="Номер главы от"),
+        number_to: Optional[float] = Query(None, alias="to", description="Номер главы до"),
+):
+    """Список глав манги постранично (курсор) и по диапазону номеров; из БД, пока он свежий"""
+    try:
+        after = int(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+    limit = max(1, min(limit, CHAPTERS_PAGE_LIMIT))
+
+    manga, rows, total = await asyncio.to_thread(_chapters_page, url, after, limit, number_from, number_to)
+    reason = offline_reason(url)
+    if reason is None and (manga is None or not manga[3] or time.time() - manga[3] > CHAPTERS_TTL):
+        try:
+            await load_manga_info(url)
+        except HTTPException:
+            raise
+        except Exception as e:
+            if isinstance(e, HostOffline):
+                reason = e.reason
+            if manga is None or not manga[3]:
+                raise _upstream_error("Ошибка при получении глав", e)
+            log.warning("список глав {} не обновлён, отдаём из БД: {}", url, e)
+        manga, rows, total = await asyncio.to_thread(_chapters_page, url, after, limit, number_from, number_to)
+    if manga is None:
+        raise _offline_error("манги нет в локальной базе")
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return FastJSONResponse({
+        "manga_url": url,
+        "title": manga[1],
+        "total": total,
+        "updated_at": manga[3],
+        "chapters": [
+            {"position": pos, "number": number, "title": title, "url": ch_url, "date": date, "saved": bool(saved)}
+            for pos, number, title, ch_url, date, saved in rows
+        ],
+        "next_cursor": str(rows[-1][0]) if has_more else None,
+        "offline": _freshness(reason, manga[3]) if reason else None,
+    })
+
+
+async def _bulk_images_stream(manga_url: str, info: MangaInfo, chapters: List[str], concurrency: int,
+                              sample: int):
+    """NDJSON: строка на главу по мере готовности, последняя — итоги"""
+    pages = failed = 0
+    size = 0
+    sized = 0
+    batch: List[Tuple[str, List[str]]] = []
+
+    def line(data: dict) -> bytes:
+        return json_dumps(data) + b"\n"
+
+    def result_line(result: ChapterImages) -> bytes:
+        nonlocal pages, failed, size, sized
+        if result.error is None:
+            pages += len(result.images)
+            if result.size is not None:
+                size += result.size
+                sized += 1
+        else:
+            failed += 1
+        return line({
+            "url": result.url,
+            "total": len(result.images),
+            "size": result.size,
+            "error": result.error,
+            "images": [_proxy_url(img) for img in result.images],
+        })
+
+    def flush() -> None:
+        if batch:
+            save_page_urls(batch)
+            batch.clear()
+
+    yield line({"manga_url": manga_url, "title": info.title, "chapters": len(chapters)})
+
+    # главы из кэша отдаются сразу, к сайту идут только остальные
+    # (при оценке размера — все: HEAD делает парсер)
+    todo = []
+    for url in chapters:
+        images = _chapter_cache.get(_chapter_key(url))
+        if images is None or sample:
+            todo.append(url)
+        else:
+            batch.append((url, images))
+            yield result_line(ChapterImages(url, images))
 
+    if todo:
+        parser = get_parser_by_url(manga_url)
         async with parser:
-            info = await parser.get_manga_info(url)
-        return info
+            async for result in parser.get_images_for_chapters(todo, concurrency=concurrency, sample=sample):
+                if result.images:
+                    _chapter_cache.set(_chapter_key(result.url), result.images)
+                    batch.append((result.url, result.images))
+                    if len(batch) >= BULK_SAVE_BATCH:
+                        await asyncio.to_thread(flush)
+                yield result_line(result)
+    await asyncio.to_thread(flush)
+
+    yield line({
+        "done": True,
+        "chapters": len(chapters),
+        "failed": failed,
+        "pages": pages,
+        # оценка по HEAD; size_chapters — у скольких глав размер известен
+        "size": size if sample else None,
+        "size_chapters": sized,
+    })
+
+
+@app.get("/api/manga/images")
+async def manga_images(
+        url: str,
+        concurrency: int = Query(BULK_CONCURRENCY, description=f"Глав одновременно (до {BULK_CONCURRENCY_MAX})"),
+        sample: int = Query(0, description="HEAD-запросов на главу для оценки размера; 0 — без оценки"),
+        number_from: Optional[float] = Query(None, alias="from", description="Номер главы от"),
+        number_to: Optional[float] = Query(None, alias="to", description="Номер главы до"),
+):
+    """
+    Изображения всех глав манги (или диапазона номеров) одним потоком NDJSON:
+    главы разбираются параллельно под лимитом частоты сайта и отдаются по мере
+    готовности; URL страниц сохраняются в БД пачками. Последняя строка — итоги:
+    всего страниц и, при sample > 0, оценка объёма в байтах.
+    """
+    try:
+        # главы должны быть в БД до записи их страниц — cached_manga_info это гарантирует
+        info, _ = await cached_manga_info(url)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при получении информации: {str(e)}")
+        raise _upstream_error("Ошибка при получении информации", e)
+    chapters = [
+        ch.url for ch in info.chapters
+        if (number_from is None or (ch.number is not None and ch.number >= number_from))
+        and (number_to is None or (ch.number is not None and ch.number <= number_to))
+    ]
+    concurrency = max(1, min(concurrency, BULK_CONCURRENCY_MAX))
+    sample = max(0, sample)
+    return StreamingResponse(_bulk_images_stream(url, info, chapters, concurrency, sample),
+                             media_type="application/x-ndjson")
 
 
 @app.get("/api/chapter")
@@ -132,9 +911,22 @@ async def chapter_images(url: str, index: int = None):
         if parser is None:
             raise HTTPException(status_code=400, detail="Не удалось определить подходящий парсер для URL")
 
-        async with parser:
-            images = await parser.get_chapter_images(url)
-            images = [f"/api/proxy?url={img}" for img in images]
+        offline = None
+        reason = offline_reason(url)
+        if reason is None:
+            try:
+                images = [_proxy_url(img) for img in await get_cached_chapter_images(url)]
+            except HostOffline as e:
+                reason = e.reason
+        if reason is not None:
+            # без сети: скачанные страницы и те, что остались в кэше изображений
+            found = await asyncio.to_thread(_pages_from_db, url)
+            if found is None or not found[1]:
+                raise _offline_error("глава не скачана")
+            chapter, pages, missing = found
+            images = [p.url for p in pages]
+            offline = _freshness(reason, chapter[6])
+            offline["missing"] = missing
 
         if index is not None:
             if 1 <= index <= len(images):
@@ -151,588 +943,522 @@ async def chapter_images(url: str, index: int = None):
                     "available_range": f"1-{len(images)}"
                 }
 
-        return {
+        data = {
             "images": images,
             "total": len(images),
             "parser": parser.name
         }
+        if offline is not None:
+            data["offline"] = offline
+        return FastJSONResponse(data)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при получении изображений: {str(e)}")
+        raise _upstream_error("Ошибка при получении изображений", e)
 
 
-@app.post("/api/download")
-async def download_chapter(manga_url: str, chapter_url: str):
-    """Скачивание главы локально + сохранение в БД"""
+@app.get("/api/chapter/manifest")
+async def chapter_manifest(request: Request, url: str):
+    """
+    Всё, что нужно читалке, одним ответом: страницы (с размерами, если известны),
+    соседние главы и название манги. Отдаётся со strong ETag и долгим Cache-Control.
+    В офлайн-режиме собирается из БД (скачанные страницы) и не кэшируется клиентом надолго.
+    """
+    reason = offline_reason(url)
+    if reason is None:
+        try:
+            return await _online_manifest(request, url)
+        except HostOffline as e:
+            reason = e.reason
+    manifest = await asyncio.to_thread(_offline_manifest, url, reason)
+    if manifest is None:
+        raise _offline_error("глава не скачана")
+    return _manifest_response(request, manifest, "no-cache")
+
+
+def _offline_manifest(url: str, reason: str) -> Optional[dict]:
+    found = _pages_from_db(url)
+    if found is None or not found[1]:
+        return None
+    (_, chapter_title, position, manga_id, manga_url, title, pages_updated_at), pages, missing = found
+    prev_url, next_url = get_neighbour_chapters(manga_id, position)
+    offline = _freshness(reason, pages_updated_at)
+    offline["missing"] = missing
+    return {
+        "url": url,
+        "title": title,
+        "manga_url": manga_url,
+        "chapter_title": chapter_title,
+        "prev_chapter": prev_url,
+        "next_chapter": next_url,
+        "total": len(pages),
+        "pages": pages,
+        "offline": offline,
+    }
+
+
+def _manifest_response(request: Request, manifest: dict, cache_control: str) -> Response:
+    body = json_dumps(manifest)
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _online_manifest(request: Request, url: str) -> Response:
     try:
-        parser = get_parser_by_url(chapter_url)
-        if parser is None:
-            raise HTTPException(status_code=400, detail="Не удалось определить подходящий парсер для URL")
+        images = await get_cached_chapter_images(url)
+        manga_url, info = await get_cached_manga_info(url)
+        pos = _find_chapter(info, url) if info else None
+        chapters = info.chapters if info else []
+
+        pages = []
+        for i, img in enumerate(images, 1):
+            dims = _image_dims.get(img)
+            pages.append(Page(i, _proxy_url(img), *dims) if dims else Page(i, _proxy_url(img)))
+
+        next_chapter = chapters[pos + 1].url if pos is not None and pos + 1 < len(chapters) else None
+        manifest = {
+            "url": url,
+            "title": info.title if info else None,
+            "manga_url": manga_url,
+            "chapter_title": chapters[pos].title if pos is not None else None,
+            "prev_chapter": chapters[pos - 1].url if pos else None,
+            "next_chapter": next_chapter,
+            "total": len(pages),
+            "pages": pages,
+        }
+    except (HTTPException, HostOffline):
+        raise
+    except Exception as e:
+        raise _upstream_error("Ошибка при получении манифеста", e)
 
-        async with parser:
-            # Получаем информацию о манге
-            info = await parser.get_manga_info(manga_url)
-            manga_id = ensure_manga(info.get("title"), manga_url)
+    # первые страницы понадобятся сразу — прогреваем кэш
+    warm_images(images[:PREFETCH_PAGES])
+    return _manifest_response(request, manifest,
+                              MANIFEST_CACHE_CONTROL if next_chapter else MANIFEST_CACHE_CONTROL_LAST)
 
-            # Ищем выбранную главу
-            chap = None
-            for c in info.get("chapters", []):
-                if c["url"] == chapter_url:
-                    chap = c
-                    break
 
-            if chap is None:
-                raise HTTPException(status_code=404, detail="Глава не найдена")
+@app.get("/api/chapter/prefetch")
+async def chapter_prefetch(url: str, index: int = 1, count: int = PREFETCH_PAGES):
+    """
+    Подсказка для предзагрузки в читалке:
+    - images → страницы index+1..index+count (их кэш прогревается в фоне);
+    - next_chapter → URL следующей главы, когда до конца главы осталось <= count страниц.
+    index — номер текущей страницы (с 1); читалка передаёт страницу, до которой
+    уже предзагружает сама, и сервер прогревает следующие за ней.
+    """
+    # отрицательный index дал бы срез с конца главы
+    index = max(0, index)
+    count = max(0, min(count, PREFETCH_MAX_PAGES))
+    if offline_reason(url) is not None:
+        # без сети прогревать нечего: отдаём то, что есть в БД
+        manifest = await asyncio.to_thread(_offline_manifest, url, "")
+        if manifest is None:
+            raise _offline_error("глава не скачана")
+        near_end = index + count >= manifest["total"]
+        return {
+            "index": index,
+            "total": manifest["total"],
+            "images": [p.url for p in manifest["pages"][index:index + count]],
+            "next_chapter": manifest["next_chapter"] if near_end else None,
+        }
+    try:
+        images = await get_cached_chapter_images(url)
+        upcoming = images[index:index + count]
+        warm_images(upcoming)
+
+        next_chapter = None
+        if index + count >= len(images):
+            _, next_chapter = await get_chapter_neighbours(url)
+            if next_chapter:
+                # список страниц следующей главы тоже достаём заранее
+                _spawn(get_cached_chapter_images(next_chapter))
+
+        return {
+            "index": index,
+            "total": len(images),
+            "images": [_proxy_url(img) for img in upcoming],
+            "next_chapter": next_chapter,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _upstream_error("Ошибка предзагрузки", e)
+
+
+async def _cbz_stream(url: str, images: List[str], info: Optional[MangaInfo]):
+    """CBZ главы кусками: каждая страница уходит клиенту сразу после скачивания"""
+    chapter = None
+    if info:
+        pos = _find_chapter(info, url)
+        chapter = info.chapters[pos] if pos is not None else None
+
+    sink = ChunkSink()
+    archive = CbzWriter(sink)
+    archive.add_comic_info(comic_info_xml(info, chapter, len(images), url))
+    yield sink.drain()
+
+    transport = _get_image_transport()
+    for idx, img_url in enumerate(images, 1):
+        _, ext = os.path.splitext(urlparse(img_url).path)
+        name = page_name(idx, ext)
+        cached = await image_cache.aget(img_url)
+        if cached is not None:
+            archive.add_bytes(name, cached[0])
+            yield sink.drain()
+            continue
+        try:
+            async with transport.get(img_url, operation="image") as resp:
+                if resp.status != 200:
+                    log.warning("CBZ: {} -> {}", img_url, resp.status)
+                    continue
+                with archive.open_page(name) as dst:
+                    async for chunk in resp.iter_chunks(64 * 1024):
+                        dst.write(chunk)
+                        yield sink.drain()
+        except Exception as e:
+            log.warning("CBZ: ошибка загрузки {}: {}", img_url, e)
+    archive.close()
+    yield sink.drain()
 
-            chapter_id = ensure_chapter(manga_id, chap["title"], chap["url"])
 
-            # Получаем изображения
-            images = await parser.get_chapter_images(chapter_url)
+@app.get("/api/chapter/cbz")
+async def chapter_cbz(url: str):
+    """Скачать главу одним CBZ-архивом (потоково, без сборки в памяти)"""
+    try:
+        images = await get_cached_chapter_images(url)
+        _, info = await get_cached_manga_info(url)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _upstream_error("Ошибка при получении главы", e)
+    if not images:
+        raise HTTPException(status_code=404, detail="В главе нет изображений")
+
+    filename = urlparse(url).path.strip("/").replace("/", "_") or "chapter"
+    if info and info.title:
+        filename = f"{info.title} - {filename}"
+    headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename + '.cbz')}"}
+    return StreamingResponse(_cbz_stream(url, images, info), media_type="application/vnd.comicbook+zip",
+                             headers=headers)
+
+
+@app.get("/api/page/{page_id}")
+def local_page(page_id: int):
+    """Скачанная страница из БД: срез pack-файла (mmap), файл или страница CBZ"""
+    packed = page_store.read(page_id)
+    if packed is not None:
+        content, media_type = packed
+        return BufferResponse(content=content, media_type=media_type,
+                              headers={"Cache-Control": "public, max-age=604800"})
+
+    row = get_page(page_id)
+    if row is None or not row[4]:
+        raise HTTPException(status_code=404, detail="Страница не скачана")
+    local_path = row[4]
+    if ".cbz#" in local_path:
+        content = read_member(local_path)
+        if content is None:
+            raise HTTPException(status_code=404, detail="Страница не найдена в архиве")
+        return Response(content=content, media_type=guess_mime(local_path.rsplit("#", 1)[-1]))
+    if not os.path.isfile(local_path):
+        raise HTTPException(status_code=404, detail="Файл страницы не найден")
+    return FileResponse(local_path)
+
+
+@app.get("/api/blobs")
+def blobs_report():
+    """Дедупликация скачанных страниц: сколько места сэкономлено"""
+    return blob_store.report()
+
+
+@app.post("/api/blobs/gc")
+async def blobs_gc():
+    """Удалить blob-ы, на которые не ссылается ни одна глава"""
+    try:
+        async with job_lease("blobs_gc"):
+            files, freed = await asyncio.to_thread(blob_store.gc)
+    except LeaseBusy:
+        raise HTTPException(status_code=409, detail="Чистка уже выполняется")
+    return {"removed": files, "freed_bytes": freed}
 
-            # Путь для сохранения
-            def slug_from_url(u):
-                p = urlparse(u).path.strip("/").replace("/", "_")
-                return p or "chapter"
 
-            manga_slug = slug_from_url(manga_url)
-            chap_slug = slug_from_url(chapter_url)
-            out_dir = os.path.join("data", "downloads", manga_slug, chap_slug)
-            os.makedirs(out_dir, exist_ok=True)
+def _slug_from_url(u: str) -> str:
+    p = urlparse(u).path.strip("/").replace("/", "_")
+    return p or "chapter"
 
-            # Скачиваем
-            saved = await parser.download_chapter(chapter_url, out_dir=out_dir)
 
-            # Сохраняем страницы в БД
-            for i, path in enumerate(saved, 1):
-                img_url = images[i - 1] if i - 1 < len(images) else ""
-                save_page(chapter_id, i, img_url, path)
+async def _download(manga_url: str, chapter_url: str, cbz: Optional[bool] = None, packed: bool = False) -> dict:
+    """
+    Скачать главу и записать страницы в БД. Уже скачанные страницы (размер и
+    хэш из таблицы page) не качаются заново, недокачанные — докачиваются;
+    не скачавшиеся остаются в БД с ошибкой для /api/download/retry.
+    cbz=None — в том виде, в каком глава уже скачивалась (есть архив — в него).
+    """
+    parser = get_parser_by_url(chapter_url)
+    if parser is None:
+        raise HTTPException(status_code=400, detail="Не удалось определить подходящий парсер для URL")
+
+    # одну главу одновременно скачивает только один запрос (и один воркер)
+    async with job_lease(f"download:{chapter_url}", ttl=120), parser:
+        # Получаем информацию о манге
+        info = await parser.get_manga_info(manga_url)
+        # информация и весь список глав: порядок нужен и читалке без сети (соседние главы)
+        manga_id = await asyncio.to_thread(save_manga_info, manga_url, info)
+
+        # Ищем выбранную главу
+        chap = None
+        for c in info.chapters:
+            if c.url == chapter_url:
+                chap = c
+                break
+
+        if chap is None:
+            raise HTTPException(status_code=404, detail="Глава не найдена")
+
+        chapter_id = await asyncio.to_thread(ensure_chapter, manga_id, chap.title, chap.url)
+
+        # Получаем изображения
+        images = await parser.get_chapter_images(chapter_url)
+        if not images:
+            raise HTTPException(status_code=404, detail="В главе нет изображений")
+
+        # Путь для сохранения
+        out_dir = os.path.join("data", "downloads", _slug_from_url(manga_url), _slug_from_url(chapter_url))
+        if cbz is None:
+            # докачка не смешивает форматы: глава из архива докачивается в архив
+            cbz = os.path.isfile(f"{out_dir}.cbz")
+
+        # Скачиваем (с докачкой)
+        known = await asyncio.to_thread(get_downloaded_pages, chapter_id)
+        pages = await parser.download_pages(chapter_url, images, out_dir, cbz=cbz, info=info, blobs=blob_store,
+                                            known=known)
+
+        # Сохраняем страницы в БД
+        await asyncio.to_thread(save_downloaded_pages, chapter_id,
+                                [(p.index, p.url, p.path, p.size, p.hash, p.error) for p in pages])
+
+        failed = [p for p in pages if p.error]
+        if not failed:
+            await asyncio.to_thread(mark_chapter_saved, chapter_id)
+            if packed:
+                # перенос в pack читает и удаляет файлы главы — не на event loop
+                await asyncio.to_thread(pack_pages, manga_id, remove_source=True, store=page_store,
+                                        chapter_id=chapter_id)
+
+    await _enforce_quota(manga_id, chapter_id)
+    saved = [p.path for p in pages if p.path]
+    return {
+        "status": "partial" if failed else "ok",
+        "saved_files": saved,
+        "total_files": len(saved),
+        "skipped": sum(1 for p in pages if p.skipped),
+        "failed": [{"index": p.index, "url": p.url, "error": p.error} for p in failed],
+        "parser": parser.name
+    }
 
-            mark_chapter_saved(chapter_id)
 
-        return {
-            "status": "ok",
-            "saved_files": saved,
-            "total_files": len(saved),
-            "parser": parser.name
-        }
+async def _enforce_quota(manga_id: int, chapter_id: int) -> None:
+    """Квоты после скачивания; только что скачанная глава не вытесняется"""
+    if not storage.quota and not storage.manga_quota:
+        return
+    try:
+        # вытесняет один воркер за раз
+        async with job_lease("storage_evict"):
+            await asyncio.to_thread(storage.enforce, manga_id, [chapter_id])
+    except LeaseBusy:
+        pass
+
+
+@app.post("/api/download")
+async def download_chapter(manga_url: str, chapter_url: str, cbz: Optional[bool] = None, packed: bool = False):
+    """
+    Скачивание главы локально + сохранение в БД. Повторный запрос докачивает
+    только недостающее. cbz=true — CBZ-архивом (без cbz — в том же виде, что
+    и в прошлый раз, для новой главы — папкой); packed=true — в pack-файл манги (data/packs).
+    """
+    try:
+        return await _download(manga_url, chapter_url, cbz, packed)
+    except LeaseBusy:
+        raise HTTPException(status_code=409, detail="Глава уже скачивается")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при скачивании: {str(e)}")
+        raise _upstream_error("Ошибка при скачивании", e)
 
 
-# HTML интерфейсы
-@app.get("/search/view", response_class=HTMLResponse)
-async def search_view(
-        q: str = "",
-        parser: str = "all",
-        max_pages: int = 100
-):
-    """Веб-интерфейс для поиска манги"""
+@app.post("/api/download/retry")
+async def download_retry(manga_url: Optional[str] = None):
+    """Повторный проход: докачать главы, у которых есть не скачавшиеся страницы (всё или одной манги)"""
     results = []
-    error_message = None
-    if q:
+    for m_url, ch_url, failed in await asyncio.to_thread(get_failed_chapters, manga_url):
         try:
-            if parser == "all":
-                parsers = get_all_parsers()
-                async with asyncio.TaskGroup() as tg:
-                    tasks = [tg.create_task(p.search_manga(q, max_pages=max_pages)) for p in parsers]
-
-                for task in tasks:
-                    try:
-                        results.extend(task.result())
-                    except Exception as e:
-                        print(f"Ошибка поиска: {e}")
-
-                results.sort(key=lambda x: (x.get("similarity", 0), x.get("rating", 0)), reverse=True)
-            else:
-                parser_obj = get_parser(parser)
-                if parser_obj:
-                    async with parser_obj:
-                        results = await parser_obj.search_manga(q, max_pages=max_pages)
+            result = await _download(m_url, ch_url)
+            results.append({"chapter_url": ch_url, "status": result["status"], "failed": len(result["failed"])})
+        except LeaseBusy:
+            results.append({"chapter_url": ch_url, "status": "busy", "failed": failed})
         except Exception as e:
-            error_message = f"Ошибка поиска: {str(e)}"
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            log.warning("повтор скачивания {}: {}", ch_url, detail)
+            results.append({"chapter_url": ch_url, "status": "error", "failed": failed, "error": detail})
+    return {"chapters": results}
 
-    available_parsers = ["all"] + [p.name for p in get_all_parsers()]
-
-    html = f"""
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <title>Поиск MangaMonitor</title>
-        <style>
-            body {{ background:#111; color:#eee; font-family:sans-serif; margin:0; padding:20px; }}
-            h1 {{ color:#6cf; text-align:center; }}
-            .search-form {{ 
-                background: #1a1a1a; 
-                padding: 20px; 
-                border-radius: 10px; 
-                margin-bottom: 20px;
-                display: flex;
-                flex-wrap: wrap;
-                gap: 10px;
-                align-items: end;
-            }}
-            .form-group {{ display: flex; flex-direction: column; }}
-            label {{ color: #6cf; margin-bottom: 5px; font-size: 14px; }}
-            input, select, button {{
-                padding: 10px;
-                border-radius: 5px;
-                border: 1px solid #444;
-                background: #222;
-                color: #eee;
-                font-size: 14px;
-            }}
-            button {{
-                background: #2a2a2a;
-                cursor: pointer;
-                border: 1px solid #6cf;
-            }}
-            button:hover {{ background: #333; }}
-            .results {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(300px, 1fr)); gap: 25px; }}
-            .card {{
-                background: #1a1a1a;
-                padding: 20px;
-                border-radius: 12px;
-                border-left: 4px solid #6cf;
-                transition: all 0.3s ease;
-                text-decoration: none;
-                display: block;
-                color: inherit;
-                cursor: pointer;
-            }}
-            .card:hover {{
-                background: #222;
-                transform: translateY(-5px);
-                box-shadow: 0 8px 20px rgba(0,0,0,0.3);
-                border-left: 4px solid #8df;
-            }}
-            .card h3 {{ 
-                margin: 0 0 12px 0; 
-                color: #6cf; 
-                font-size: 18px;
-                line-height: 1.4;
-            }}
-            .card .meta {{ 
-                color: #bbb; 
-                font-size: 14px; 
-                margin-bottom: 15px;
-                line-height: 1.5;
-            }}
-            .card .parser {{ 
-                display: inline-block; 
-                background: #333; 
-                padding: 4px 10px; 
-                border-radius: 15px; 
-                font-size: 12px; 
-                color: #6cf;
-                margin-bottom: 10px;
-            }}
-            .card .open-link {{
-                display: inline-block;
-                color: #8df;
-                font-size: 14px;
-                text-decoration: none;
-                border: 1px solid #6cf;
-                padding: 6px 12px;
-                border-radius: 5px;
-                transition: all 0.2s ease;
-            }}
-            .card .open-link:hover {{
-                background: #6cf;
-                color: #111;
-            }}
-            .error {{ color: #f66; background: #2a1a1a; padding: 10px; border-radius: 5px; }}
-            .no-results {{ 
-                text-align: center; 
-                color: #888; 
-                font-size: 18px; 
-                margin: 40px 0;
-                grid-column: 1 / -1;
-            }}
-            .results-count {{
-                color: #6cf;
-                margin: 20px 0;
-                font-size: 18px;
-                text-align: center;
-            }}
-        </style>
-    </head>
-    <body>
-        <h1>Поиск манги</h1>
-
-        <form method="get" action="/search/view" class="search-form">
-            <div class="form-group">
-                <label for="q">Название манги:</label>
-                <input type="text" id="q" name="q" value="{q}" placeholder="Введите название..." required>
-            </div>
-
-            <div class="form-group">
-                <label for="parser">Парсер:</label>
-                <select id="parser" name="parser">
-    """
 
-    for p in available_parsers:
-        selected = "selected" if p == parser else ""
-        html += f'<option value="{p}" {selected}>{p}</option>'
+@app.get("/api/storage")
+def storage_summary(limit: int = Query(50, description="Сколько самых больших манги показать")):
+    """Сколько занимает скачанное: всего, по манге и квоты"""
+    return storage.summary(limit=max(1, min(limit, 1000)))
 
-    html += f"""
-                </select>
-            </div>
 
+@app.post("/api/storage/enforce")
+async def storage_enforce():
+    """Применить квоты сейчас (например, после их уменьшения)"""
+    try:
+        async with job_lease("storage_evict"):
+            evicted = await asyncio.to_thread(storage.enforce)
+    except LeaseBusy:
+        raise HTTPException(status_code=409, detail="Вытеснение уже выполняется")
+    return {"evicted_chapters": len(evicted), **storage.summary(limit=0)}
 
 
-            <button type="submit">Искать</button>
-        </form>
-    """
+@app.get("/api/offline")
+def offline_state():
+    """Офлайн-режим: хосты, отключённые вручную, и состояние circuit breaker по хостам"""
+    return offline_status()
 
-    # Добавляем отображение количества найденных манг
-    if q:
-        if error_message:
-            html += f'<div class="error">{error_message}</div>'
-        else:
-            html += f'<div class="results-count">Найдено манг: {len(results)}</div>'
 
-    html += '<div class="results">'
+@app.post("/api/offline")
+def switch_offline(
+        host: str = Query(..., description="Хост или URL сайта; * — все сайты"),
+        enabled: bool = Query(True, description="false — вернуть в обычный режим"),
+):
+    """Вручную перевести сайт в офлайн-режим (ответы только из БД и скачанного) или вернуть"""
+    name = host_of(host) if "://" in host else host.strip().lower()
+    if not name:
+        raise HTTPException(status_code=400, detail="Некорректный host")
+    set_offline(name, enabled)
+    return {"host": name, "offline": enabled}
+
+
+@app.post("/api/progress")
+async def save_reading_progress(
+        url: str,
+        page: int = Query(..., ge=1, description="Номер страницы (с 1)"),
+        total: Optional[int] = Query(None, description="Страниц в главе"),
+        manga_url: Optional[str] = Query(None, description="URL манги (по умолчанию — из URL главы)"),
+):
+    """Позиция в главе; пишется в БД пачкой раз в несколько секунд"""
+    if manga_url is None:
+        parser = get_parser_by_url(url)
+        manga_url = parser.get_manga_url(url) if parser else None
+    progress.record(url, manga_url, page, total)
+    return {"status": "ok"}
+
 
-    if q and not results and not error_message:
-        html += f'<div class="no-results">По запросу "{q}" ничего не найдено</div>'
+@app.get("/api/progress")
+def reading_progress(url: str):
+    """Последняя открытая страница главы (page = null — глава не открывалась)"""
+    row = progress.get(url)
+    page, total, updated_at = row if row else (None, None, None)
+    return {"url": url, "page": page, "total": total, "updated_at": updated_at}
 
-    for item in results:
-        parser_badge = f'<span class="parser">{item.get("parser", "unknown")}</span>'
-        rating = item.get('rating', 'N/A')
-        year = item.get('year', 'N/A')
+
+@app.get("/api/history")
+def reading_history(
+        limit: int = Query(50, description="Сколько записей (до 500)"),
+        before: Optional[float] = Query(None, description="next_before из предыдущего ответа"),
+        before_url: Optional[str] = Query(None, description="next_before_url из предыдущего ответа"),
+        manga_url: Optional[str] = Query(None, description="Все открытые главы одной манги"),
+):
+    """
+    История чтения: по последней прочитанной главе каждой манги, свежие первыми
+    («продолжить чтение»); с manga_url — прогресс по главам этой манги.
+    Ещё не записанные в БД позиции берутся из буфера, запись не форсируется.
+    """
+    limit = max(1, min(limit, 500))
+    pending = progress.pending()
+    if manga_url is not None:
+        rows = get_manga_history(manga_url, pending)
+    else:
+        cursor = (before, before_url or "") if before is not None else None
+        rows = get_history(limit, cursor, pending)
+    items = [
+        {"chapter_url": ch_url, "manga_url": m_url, "page": page, "total": total, "updated_at": updated_at,
+         "chapter_title": ch_title, "manga_title": m_title}
+        for ch_url, m_url, page, total, updated_at, ch_title, m_title in rows
+    ]
+    has_more = manga_url is None and len(items) == limit
+    return {
+        "history": items,
+        "next_before": items[-1]["updated_at"] if has_more else None,
+        "next_before_url": items[-1]["chapter_url"] if has_more else None,
+    }
 
 
-        html += f"""
-        <a class='card' href='/manga/view?url={quote(item['url'], safe='')}'>
-            {parser_badge}
-            <h3>{item['title']}</h3>
-            <div class='meta'>
-                <div><strong>Рейтинг:</strong> {rating}</div>
-                <div><strong>Год:</strong> {year}</div>
-            </div>
-            <span class="open-link">Открыть →</span>
-        </a>
-        """
+# HTML интерфейсы
+@app.get("/search/view", response_class=HTMLResponse)
+async def search_view(
+        q: str = "",
+        parser: str = "all",
+        max_pages: int = 100
+):
+    """Веб-интерфейс для поиска манги"""
+    results = []
+    incomplete = []
+    error_message = None
+    if q:
+        try:
+            results, incomplete = await cached_search(q, parser, max_pages)
+        except Exception as e:
+            error_message = f"Ошибка поиска: {str(e)}"
 
-    html += "</div></body></html>"
-    return HTMLResponse(html)
+    available_parsers = ["all"] + parser_names()
+    return render_stream(_search_template, q=q, parser=parser, results=results, incomplete=incomplete,
+                         error_message=error_message, available_parsers=available_parsers)
 
 
 @app.get("/manga/view", response_class=HTMLResponse)
 async def manga_view(url: str):
     """Веб-интерфейс для просмотра информации о манге и глав"""
+    info = offline = None
+    reason = offline_reason(url)
     try:
         parser = get_parser_by_url(url)
         if parser is None:
-            return HTMLResponse(f"<html><body>Не удалось определить парсер для URL: {url}</body></html>")
+            return render_stream(_error_template, message=f"Не удалось определить парсер для URL: {url}")
 
-        async with parser:
-            info = await parser.get_manga_info(url)
+        if reason is None:
+            info, _ = await cached_manga_info(url, parser)
+    except HostOffline as e:
+        reason = e.reason
     except Exception as e:
-        return HTMLResponse(f"<html><body>Ошибка: {str(e)}</body></html>")
-
-    html = f"""
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <title>{info['title']}</title>
-        <style>
-            body {{ background:#111; color:#eee; font-family:sans-serif; margin:0; padding:20px; }}
-            .container {{ max-width:900px; margin:0 auto; }}
-            h1 {{ color:#6cf; }}
-            .meta {{ color: #888; margin: 10px 0; }}
-            .description {{ line-height:1.6; margin:20px 0; padding: 15px; background: #1a1a1a; border-radius: 8px; }}
-            h2 {{ margin-top:30px; color:#6cf; border-bottom: 1px solid #333; padding-bottom: 10px; }}
-            .chapters {{ display:grid; grid-template-columns: repeat(auto-fill, minmax(250px, 1fr)); gap:12px; }}
-            .chapter {{
-                background:#1a1a1a;
-                padding:12px;
-                border-radius:8px;
-                border-left: 3px solid #6cf;
-            }}
-            .chapter:hover {{ background:#222; }}
-            .chapter a {{ color:#6cf; text-decoration:none; font-size:16px; display: block; }}
-            .chapter a:hover {{ text-decoration:underline; }}
-            .chapter .date {{ color: #666; font-size: 12px; margin-top: 5px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>{info['title']}</h1>
-            <div class="meta">
-    """
-
-    if info.get('eng_name'):
-        html += f"<div><strong>Английское название:</strong> {info['eng_name']}</div>"
-    if info.get('orig_name'):
-        html += f"<div><strong>Оригинальное название:</strong> {info['orig_name']}</div>"
-    if info.get('author'):
-        html += f"<div><strong>Автор:</strong> {info['author']}</div>"
-    if info.get('year'):
-        html += f"<div><strong>Год:</strong> {info['year']}</div>"
-    if info.get('category'):
-        html += f"<div><strong>Категория:</strong> {info['category']}</div>"
-    if info.get('genres'):
-        html += f"<div><strong>Жанры:</strong> {', '.join(info['genres'])}</div>"
-
-    html += f"""
-            </div>
-            <div class="description">
-                {info.get('description', 'Описание отсутствует')}
-            </div>
-            <h2>Главы ({len(info.get('chapters', []))})</h2>
-            <div class="chapters">
-    """
+        return render_stream(_error_template, message=f"Ошибка: {str(e)}")
 
-    for chap in info.get("chapters", []):
-        date_html = f'<div class="date">{chap["date"]}</div>' if chap.get("date") else ""
-        html += f"""
-        <div class='chapter'>
-            <a href='/chapter/view?url={quote(chap['url'], safe='')}'>{chap['title']}</a>
-            {date_html}
-        </div>
-        """
+    if info is None:
+        cached = await asyncio.to_thread(_info_from_db, url)
+        if cached is None:
+            return render_stream(_error_template, message="Сайт недоступен (офлайн-режим), а манги нет в локальной базе")
+        info, updated_at = cached
+        offline = _freshness(reason, updated_at)
 
-    html += "</div></div></body></html>"
-    return HTMLResponse(html)
+    # главы подгружаются страницей по мере прокрутки из /api/chapters
+    return render_stream(_manga_template, url=url, info=info, total=len(info.chapters), offline=offline)
 
 
 @app.get("/chapter/view", response_class=HTMLResponse)
 async def chapter_view(url: str):
     """Веб-читалка манги"""
-    safe_url = quote(url, safe="")
-
-    html = f"""
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <title>Читалка MangaMonitor</title>
-        <style>
-            body {{
-                background: #111;
-                color: #eee;
-                margin: 0;
-                font-family: sans-serif;
-                overflow-x: hidden;
-            }}
-            .header {{
-                background: #1a1a1a;
-                padding: 15px;
-                text-align: center;
-                border-bottom: 1px solid #333;
-                position: sticky;
-                top: 0;
-                z-index: 100;
-            }}
-            h1 {{
-                color: #6cf;
-                margin: 0;
-                font-size: 18px;
-            }}
-            .reader-container {{
-                max-width: 100%;
-                margin: 0 auto;
-                padding: 20px;
-                text-align: center;
-            }}
-            img {{
-                max-width: 100%;
-                height: auto;
-                margin: 10px auto;
-                display: block;
-                border-radius: 8px;
-                transition: transform 0.2s ease;
-                transform-origin: top center;
-                box-shadow: 0 4px 12px rgba(0,0,0,0.5);
-            }}
-            .controls {{
-                position: fixed;
-                bottom: 0;
-                left: 0;
-                width: 100%;
-                display: flex;
-                justify-content: center;
-                gap: 15px;
-                align-items: center;
-                background: rgba(0,0,0,0.9);
-                padding: 15px 0;
-                border-top: 1px solid #444;
-                backdrop-filter: blur(10px);
-            }}
-            button {{
-                background: #222;
-                color: #eee;
-                border: 1px solid #444;
-                padding: 10px 16px;
-                border-radius: 6px;
-                cursor: pointer;
-                font-size: 14px;
-                transition: all 0.2s;
-            }}
-            button:hover {{
-                background: #333;
-                border-color: #6cf;
-            }}
-            button:disabled {{
-                opacity: 0.4;
-                cursor: not-allowed;
-            }}
-            #counter {{
-                color: #6cf;
-                font-weight: bold;
-                min-width: 80px;
-                text-align: center;
-            }}
-            .zoom-controls {{
-                display: flex;
-                gap: 8px;
-                margin-left: 20px;
-            }}
-            .loading {{
-                color: #6cf;
-                font-size: 18px;
-                text-align: center;
-                padding: 50px;
-            }}
-            @media (max-width: 768px) {{
-                .controls {{
-                    flex-wrap: wrap;
-                    gap: 10px;
-                }}
-                button {{
-                    padding: 8px 12px;
-                    font-size: 12px;
-                }}
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>Читалка MangaMonitor</h1>
-        </div>
-
-        <div class="reader-container">
-            <div id="loading" class="loading">Загрузка...</div>
-            <img id="page" style="display: none;" />
-        </div>
-
-        <div class="controls">
-            <button id="prev" onclick="prevPage()">⬅ Назад</button>
-            <span id="counter">- / -</span>
-            <button id="next" onclick="nextPage()">Вперёд ➡</button>
-
-            <div class="zoom-controls">
-                <button onclick="zoomOut()">➖</button>
-                <button onclick="resetZoom()">🔍</button>
-                <button onclick="zoomIn()">➕</button>
-            </div>
-
-            <button onclick="fullscreen()">⛶ Полный экран</button>
-        </div>
-
-        <script>
-            const url = decodeURIComponent("{safe_url}");
-            let index = 1;
-            let total = 0;
-            let zoom = 1;
-            const img = document.getElementById("page");
-            const loading = document.getElementById("loading");
-
-            async function loadPage(i) {{
-                loading.style.display = 'block';
-                img.style.display = 'none';
-
-                try {{
-                    const res = await fetch(`/api/chapter?url=${{encodeURIComponent(url)}}&index=${{i}}`);
-                    const data = await res.json();
-
-                    if (data.image) {{
-                        img.src = data.image;
-                        img.onload = () => {{
-                            loading.style.display = 'none';
-                            img.style.display = 'block';
-                            applyZoom();
-                        }};
-                        document.getElementById("counter").textContent = data.index + " / " + data.total;
-                        index = data.index;
-                        total = data.total;
-                        updateButtons();
-                        window.scrollTo(0,0);
-                    }} else {{
-                        loading.textContent = 'Ошибка загрузки страницы';
-                    }}
-                }} catch (error) {{
-                    loading.textContent = 'Ошибка: ' + error.message;
-                }}
-            }}
-
-            function updateButtons() {{
-                document.getElementById("prev").disabled = index === 1;
-                document.getElementById("next").disabled = index === total;
-            }}
-
-            function nextPage() {{ if (index < total) loadPage(index + 1); }}
-            function prevPage() {{ if (index > 1) loadPage(index - 1); }}
-
-            function applyZoom() {{
-                img.style.transform = `scale(${{zoom}})`;
-            }}
-
-            function zoomIn() {{ 
-                if (zoom < 3) {{
-                    zoom += 0.1; 
-                    applyZoom(); 
-                }}
-            }}
-
-            function zoomOut() {{ 
-                if (zoom > 0.3) {{
-                    zoom -= 0.1; 
-                    applyZoom(); 
-                }}
-            }}
-
-            function resetZoom() {{ 
-                zoom = 1; 
-                applyZoom(); 
-            }}
-
-            function fullscreen() {{
-                if (img.requestFullscreen) {{
-                    img.requestFullscreen();
-                }} else if (img.webkitRequestFullscreen) {{
-                    img.webkitRequestFullscreen();
-                }}
-            }}
-
-            // Обработка клавиатуры
-            document.addEventListener("keydown", (e) => {{
-                if (e.key === "ArrowRight") nextPage();
-                if (e.key === "ArrowLeft") prevPage();
-                if (e.key === "+" || e.key === "=") zoomIn();
-                if (e.key === "-") zoomOut();
-                if (e.key === "0") resetZoom();
-                if (e.key === "f") fullscreen();
-            }});
-
-            // Обработка колесика мыши с Ctrl для зума
-            document.addEventListener("wheel", (e) => {{
-                if (e.ctrlKey) {{
-                    e.preventDefault();
-                    if (e.deltaY < 0) zoomIn(); 
-                    else zoomOut();
-                }}
-            }}, {{ passive: false }});
-
-            // Загружаем первую страницу
-            loadPage(1);
-        </script>
-    </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+    await asyncio.to_thread(storage.touch, url)
+    return render_stream(_chapter_template, url=url, prefetch=PREFETCH_PAGES)
 
 
 if __name__ == "__main__":
+    import multiprocessing
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # нужно для пула перекодирования в собранном PyInstaller приложении
+    multiprocessing.freeze_support()
+
+    if WORKERS > 1:
+        # воркеры импортируют приложение сами; кэши у них общие (src/core/shared.py)
+        uvicorn.run("src.web.server:app", host="0.0.0.0", port=8000, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,89 @@
+// Виртуальный список глав: в DOM только видимые строки, главы грузятся
+// блоками из /api/chapters по мере прокрутки
+const container = document.getElementById("chapters");
+const mangaUrl = container.dataset.url;
+const total = parseInt(container.dataset.total, 10) || 0;
+
+const BLOCK = 100;          // глав в одном запросе
+const ROW_HEIGHT = 76;      // высота карточки (64) + промежуток
+const GAP = 12;
+const MIN_WIDTH = 250;
+const OVERSCAN_ROWS = 5;
+
+const chapters = new Array(total);
+const requested = new Set();
+let scheduled = false;
+
+function columns() {
+    return Math.max(1, Math.floor((container.clientWidth + GAP) / (MIN_WIDTH + GAP)));
+}
+
+async function loadBlock(block) {
+    if (requested.has(block)) return;
+    requested.add(block);
+    const cursor = block > 0 ? `&cursor=${block * BLOCK - 1}` : "";
+    try {
+        const res = await fetch(`/api/chapters?url=${encodeURIComponent(mangaUrl)}&limit=${BLOCK}${cursor}`);
+        const data = await res.json();
+        for (const chap of data.chapters || []) chapters[chap.position] = chap;
+        schedule();
+    } catch (error) {
+        requested.delete(block);
+    }
+}
+
+function renderChapter(chap, left, top, width) {
+    const el = document.createElement("div");
+    el.className = "chapter";
+    el.style.left = left + "px";
+    el.style.top = top + "px";
+    el.style.width = width + "px";
+    if (!chap) {
+        el.textContent = "…";
+        return el;
+    }
+    const a = document.createElement("a");
+    a.href = "/chapter/view?url=" + encodeURIComponent(chap.url);
+    a.textContent = chap.title;
+    el.appendChild(a);
+    if (chap.date) {
+        const date = document.createElement("div");
+        date.className = "date";
+        date.textContent = chap.date;
+        el.appendChild(date);
+    }
+    return el;
+}
+
+function render() {
+    scheduled = false;
+    const cols = columns();
+    const width = (container.clientWidth - GAP * (cols - 1)) / cols;
+    container.style.height = Math.ceil(total / cols) * ROW_HEIGHT + "px";
+
+    const top = Math.max(0, -container.getBoundingClientRect().top);
+    const firstRow = Math.max(0, Math.floor(top / ROW_HEIGHT) - OVERSCAN_ROWS);
+    const lastRow = Math.ceil((top + window.innerHeight) / ROW_HEIGHT) + OVERSCAN_ROWS;
+    const first = firstRow * cols;
+    const last = Math.min(total, lastRow * cols);
+
+    const fragment = document.createDocumentFragment();
+    for (let i = first; i < last; i++) {
+        if (!chapters[i]) loadBlock(Math.floor(i / BLOCK));
+        const row = Math.floor(i / cols);
+        const col = i % cols;
+        fragment.appendChild(renderChapter(chapters[i], col * (width + GAP), row * ROW_HEIGHT, width));
+    }
+    container.replaceChildren(fragment);
+}
+
+function schedule() {
+    if (!scheduled) {
+        scheduled = true;
+        requestAnimationFrame(render);
+    }
+}
+
+window.addEventListener("scroll", schedule, { passive: true });
+window.addEventListener("resize", schedule);
+schedule();
@@ -0,0 +1,173 @@
+// Параметры главы передаются шаблоном через data-атрибуты <body>
+const url = document.body.dataset.url;
+const PREFETCH = parseInt(document.body.dataset.prefetch, 10) || 3;
+let index = 1;
+let total = 0;
+let zoom = 1;
+let pages = [];
+let nextChapter = null;
+let mangaUrl = null;
+// ширина страницы для сервера: экран с учётом плотности пикселей
+const targetWidth = Math.ceil(Math.min(window.innerWidth, screen.width) * (window.devicePixelRatio || 1));
+const preloaded = {};
+// до какой страницы сервер уже прогревает кэш изображений (/api/chapter/prefetch)
+let warmedUpTo = 0;
+const img = document.getElementById("page");
+const loading = document.getElementById("loading");
+
+// Манифест главы: все страницы и соседние главы одним запросом
+async function loadManifest() {
+    try {
+        // манифест кэшируется надолго, поэтому позиция чтения — отдельным запросом
+        const [res, saved] = await Promise.all([
+            fetch(`/api/chapter/manifest?url=${encodeURIComponent(url)}`),
+            fetch(`/api/progress?url=${encodeURIComponent(url)}`).then(r => r.json()).catch(() => ({})),
+        ]);
+        const data = await res.json();
+        if (!data.pages || !data.pages.length) {
+            loading.textContent = 'Ошибка загрузки главы';
+            return;
+        }
+        // прокси-ссылки уменьшаются до ширины экрана; скачанные страницы (/api/page) — как есть
+        pages = data.pages.map(p => ({ ...p, url: p.url + (p.url.includes("?") ? "&" : "?") + "w=" + targetWidth }));
+        total = data.total;
+        nextChapter = data.next_chapter;
+        mangaUrl = data.manga_url;
+        if (data.title) document.querySelector(".header h1").textContent = data.title + (data.chapter_title ? " — " + data.chapter_title : "");
+        if (data.offline) showOffline(data.offline);
+        // продолжаем с сохранённой страницы; дочитанную главу — с начала
+        loadPage(saved.page && saved.page < total ? saved.page : 1);
+    } catch (error) {
+        loading.textContent = 'Ошибка: ' + error.message;
+    }
+}
+
+// Манифест собран из БД без сети: показываем, насколько данные устарели
+function showOffline(offline) {
+    const note = document.getElementById("offline");
+    let text = "Сайт недоступен — глава из сохранённого";
+    if (offline.updated_at) text += " от " + new Date(offline.updated_at * 1000).toLocaleString();
+    if (offline.missing) text += ` (нет страниц: ${offline.missing})`;
+    note.textContent = text;
+    note.hidden = false;
+}
+
+function loadPage(i) {
+    const page = pages[i - 1];
+    if (!page) return;
+    loading.style.display = 'block';
+    img.style.display = 'none';
+    img.onload = () => {
+        loading.style.display = 'none';
+        img.style.display = 'block';
+        applyZoom();
+        prefetch(i);
+    };
+    if (page.width && page.height) {
+        img.width = page.width;
+        img.height = page.height;
+    } else {
+        img.removeAttribute("width");
+        img.removeAttribute("height");
+    }
+    img.src = page.url;
+    index = i;
+    document.getElementById("counter").textContent = index + " / " + total;
+    saveProgress();
+    updateButtons();
+    window.scrollTo(0,0);
+}
+
+// Позиция чтения: сервер сам копит перелистывания и пишет их в БД пачкой
+function saveProgress() {
+    const params = new URLSearchParams({ url, page: index, total });
+    if (mangaUrl) params.set("manga_url", mangaUrl);
+    fetch(`/api/progress?${params}`, { method: "POST", keepalive: true }).catch(() => {});
+}
+
+// Предзагрузка следующих страниц; у конца главы — манифеста следующей
+function prefetch(i) {
+    for (const page of pages.slice(i, i + PREFETCH)) {
+        if (!preloaded[page.url]) {
+            const pre = new Image();
+            pre.src = page.url;
+            preloaded[page.url] = pre;
+        }
+    }
+    // страницы дальше PREFETCH сервер прогревает заранее (только идущие через прокси:
+    // скачанные и так лежат локально)
+    const ahead = i + PREFETCH;
+    if (ahead < total && ahead >= warmedUpTo && pages[ahead].url.startsWith("/api/proxy")) {
+        warmedUpTo = ahead + PREFETCH;
+        const params = new URLSearchParams({ url, index: ahead, count: PREFETCH });
+        fetch(`/api/chapter/prefetch?${params}`).catch(() => {});
+    }
+    if (nextChapter && i + PREFETCH >= total && !preloaded[nextChapter]) {
+        preloaded[nextChapter] = true;
+        fetch(`/api/chapter/manifest?url=${encodeURIComponent(nextChapter)}`).catch(() => {});
+    }
+}
+
+function updateButtons() {
+    document.getElementById("prev").disabled = index === 1;
+    document.getElementById("next").disabled = index === total && !nextChapter;
+}
+
+function nextPage() {
+    if (index < total) loadPage(index + 1);
+    else if (nextChapter) window.location.href = `/chapter/view?url=${encodeURIComponent(nextChapter)}`;
+}
+function prevPage() { if (index > 1) loadPage(index - 1); }
+
+function applyZoom() {
+    img.style.transform = `scale(${zoom})`;
+}
+
+function zoomIn() { 
+    if (zoom < 3) {
+        zoom += 0.1; 
+        applyZoom(); 
+    }
+}
+
+function zoomOut() { 
+    if (zoom > 0.3) {
+        zoom -= 0.1; 
+        applyZoom(); 
+    }
+}
+
+function resetZoom() { 
+    zoom = 1; 
+    applyZoom(); 
+}
+
+function fullscreen() {
+    if (img.requestFullscreen) {
+        img.requestFullscreen();
+    } else if (img.webkitRequestFullscreen) {
+        img.webkitRequestFullscreen();
+    }
+}
+
+// Обработка клавиатуры
+document.addEventListener("keydown", (e) => {
+    if (e.key === "ArrowRight") nextPage();
+    if (e.key === "ArrowLeft") prevPage();
+    if (e.key === "+" || e.key === "=") zoomIn();
+    if (e.key === "-") zoomOut();
+    if (e.key === "0") resetZoom();
+    if (e.key === "f") fullscreen();
+});
+
+// Обработка колесика мыши с Ctrl для зума
+document.addEventListener("wheel", (e) => {
+    if (e.ctrlKey) {
+        e.preventDefault();
+        if (e.deltaY < 0) zoomIn(); 
+        else zoomOut();
+    }
+}, { passive: false });
+
+// Загружаем манифест и первую страницу
+loadManifest();
@@ -0,0 +1,56 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.core import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Пустая БД во временной папке вместо data/db.sqlite; вернёт эту папку"""
+    monkeypatch.setattr(database, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "db.sqlite")
+    database.init_db()
+    return tmp_path
+
+
+@pytest.fixture
+def api(db, tmp_path, monkeypatch):
+    """
+    Сервер API против локального зеркала сайта (bench/mirror.py): парсер readmanga
+    смотрит на зеркало. api(check) выполнит await check(client, mirror) и вернёт результат.
+    """
+    import asyncio
+    import json
+
+    import httpx
+
+    from bench.mirror import MirrorConfig, start_mirror
+    from src.parsers import config
+
+    def run(check):
+        async def main():
+            runner, mirror = await start_mirror(MirrorConfig(image_size=(80, 120)))
+            data = json.loads((config.PROJECT_ROOT / "config" / "default_config.json").read_text(encoding="utf-8"))
+            data["parsers"]["readmanga"].update(base_url=mirror.base_url, mirrors=[], rate_limit={})
+            path = tmp_path / "parsers.json"
+            path.write_text(json.dumps(data), encoding="utf-8")
+            monkeypatch.setattr(config.parser_config, "path", path)
+            monkeypatch.setattr(config.parser_config, "_mtime", None)
+
+            from src.web.server import app
+            try:
+                async with app.router.lifespan_context(app):
+                    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                                 base_url="http://test", timeout=30) as client:
+                        return await check(client, mirror)
+            finally:
+                await runner.cleanup()
+        return asyncio.run(main())
+    return run
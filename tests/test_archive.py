@@ -0,0 +1,83 @@
+# tests/test_archive.py
+"""CBZ: запись в файл и в поток без seek, ComicInfo.xml, упаковка папки главы"""
+import io
+import zipfile
+from xml.etree import ElementTree as ET
+
+from src.core.archive import (
+    COMIC_INFO_NAME, ChunkSink, CbzWriter, comic_info_xml, member_ref, pack_chapter_dir, page_name, read_member,
+)
+from src.parsers.models import Chapter, MangaInfo
+
+INFO = MangaInfo(title="Берсерк", eng_name="Berserk", author="Миура", year="1989", genres=["сэйнэн", "фэнтези"])
+
+
+def test_comic_info_has_series_chapter_and_page_count():
+    xml = ET.fromstring(comic_info_xml(INFO, Chapter("Глава 1", "http://x/vol1/1"), 3, "http://x/vol1/1"))
+    fields = {el.tag: el.text for el in xml}
+    assert fields["Series"] == "Берсерк"
+    assert fields["LocalizedSeries"] == "Berserk"
+    assert fields["Title"] == "Глава 1"
+    assert fields["Writer"] == "Миура"
+    assert fields["Year"] == "1989"
+    assert fields["Genre"] == "сэйнэн, фэнтези"
+    assert fields["PageCount"] == "3"
+    assert fields["Manga"] == "YesAndRightToLeft"
+
+
+def test_comic_info_skips_empty_and_non_numeric_year():
+    fields = {el.tag for el in ET.fromstring(comic_info_xml(MangaInfo(title="Т", year="2000-е")))}
+    assert "Year" not in fields and "Writer" not in fields and "Title" not in fields
+
+
+def test_writer_to_file_and_read_member(tmp_path):
+    cbz_path = tmp_path / "ch.cbz"
+    with CbzWriter(cbz_path) as cbz:
+        cbz.add_comic_info(comic_info_xml(INFO))
+        cbz.add_bytes(page_name(1, ".png"), b"first")
+        with cbz.open_page(page_name(2, "")) as dst:
+            for chunk in (b"sec", b"ond"):
+                dst.write(chunk)
+
+    with zipfile.ZipFile(cbz_path) as zf:
+        assert zf.namelist() == [COMIC_INFO_NAME, "001.png", "002.jpg"]
+        assert all(i.compress_type == zipfile.ZIP_STORED for i in zf.infolist())
+        assert zf.testzip() is None
+    assert read_member(member_ref(str(cbz_path), "002.jpg")) == b"second"
+    assert read_member(member_ref(str(cbz_path), "404.jpg")) is None
+    assert read_member(member_ref(str(tmp_path / "absent.cbz"), "001.png")) is None
+
+
+def test_writer_to_stream_without_seek():
+    sink = ChunkSink()
+    cbz = CbzWriter(sink)
+    cbz.add_comic_info(comic_info_xml(INFO))
+    parts = [sink.drain()]
+    with cbz.open_page("001.jpg") as dst:
+        dst.write(b"x" * 100_000)
+        parts.append(sink.drain())
+    cbz.close()
+    parts.append(sink.drain())
+
+    # весь архив ушёл кусками и собирается в корректный zip
+    with zipfile.ZipFile(io.BytesIO(b"".join(parts))) as zf:
+        assert zf.read("001.jpg") == b"x" * 100_000
+        assert zf.testzip() is None
+    assert sink.drain() == b""
+
+
+def test_pack_chapter_dir_orders_pages_numerically(db, tmp_path):
+    folder = tmp_path / "manga" / "vol1_1"
+    folder.mkdir(parents=True)
+    for n in (1, 2, 10):
+        (folder / f"{n}.jpg").write_bytes(f"page {n}".encode())
+    (folder / "notes.txt").write_text("не страница")
+
+    cbz_path, moved = pack_chapter_dir(folder, remove_source=True)
+
+    assert cbz_path == tmp_path / "manga" / "vol1_1.cbz"
+    assert [ref.rsplit("#", 1)[1] for _, ref in moved] == ["001.jpg", "002.jpg", "003.jpg"]
+    assert read_member(moved[2][1]) == b"page 10"
+    # исходные страницы удалены, посторонний файл остался — папка тоже
+    assert sorted(p.name for p in folder.iterdir()) == ["notes.txt"]
+    assert not (tmp_path / "manga" / "vol1_1.cbz.part").exists()
@@ -0,0 +1,85 @@
+# tests/test_blobstore.py
+"""Blob-хранилище: одинаковые страницы хранятся один раз, копия без жёстких ссылок, сборка мусора"""
+import hashlib
+import os
+
+import pytest
+
+from src.core import blobstore, database
+from src.core.blobstore import BlobStore
+
+
+@pytest.fixture
+def blobs(db):
+    return BlobStore(db / "blobs")
+
+
+def save(blobs: BlobStore, dest, data: bytes) -> str:
+    writer = blobs.writer()
+    writer.write(data)
+    return blobs.store(writer, str(dest))
+
+
+def test_identical_pages_share_one_blob(db, blobs):
+    first, second = db / "a" / "1.jpg", db / "b" / "1.jpg"
+    first.parent.mkdir()
+    second.parent.mkdir()
+
+    digest = save(blobs, first, b"scan" * 100)
+    assert save(blobs, second, b"scan" * 100) == digest == hashlib.sha256(b"scan" * 100).hexdigest()
+
+    _, blob_path, size, refcount = database.get_blob(digest)
+    assert (size, refcount) == (400, 2)
+    assert os.path.samefile(first, blob_path) and os.path.samefile(second, blob_path)
+    assert BlobStore.report()["saved_bytes"] == 400
+    # повторная привязка того же файла счётчик не увеличивает
+    blobs.link(digest, blob_path, str(first))
+    assert database.get_blob(digest)[3] == 2
+
+
+def test_without_hard_links_page_is_a_plain_copy(db, blobs, monkeypatch):
+    def no_links(src, dst):
+        raise OSError("ФС не поддерживает жёсткие ссылки")
+
+    monkeypatch.setattr(blobstore.os, "link", no_links)
+    dest = db / "1.jpg"
+
+    digest = save(blobs, dest, b"scan")
+
+    _, blob_path, _, refcount = database.get_blob(digest)
+    assert dest.read_bytes() == b"scan"
+    assert not os.path.samefile(dest, blob_path)
+    # копия в учёт ссылок не попадает, а blob — кандидат на сборку мусора
+    assert refcount == 0
+    assert blobs.gc() == (1, 4)
+    assert dest.read_bytes() == b"scan"
+
+
+def test_damaged_blob_is_replaced_by_intact_copy(db, blobs):
+    dest = db / "1.jpg"
+    digest = save(blobs, dest, b"scan" * 10)
+    blob_path = database.get_blob(digest)[1]
+    # файл главы (он же blob) дописали на месте
+    with open(dest, "ab") as f:
+        f.write(b"garbage")
+
+    other = db / "2.jpg"
+    save(blobs, other, b"scan" * 10)
+
+    with open(blob_path, "rb") as f:
+        assert f.read() == b"scan" * 10
+    assert other.read_bytes() == b"scan" * 10
+
+
+def test_gc_removes_only_unreferenced_blobs(db, blobs):
+    kept, dropped = db / "kept.jpg", db / "dropped.jpg"
+    save(blobs, kept, b"kept")
+    digest = save(blobs, dropped, b"dropped")
+    blob_path = database.get_blob(digest)[1]
+
+    blobs.release(str(dropped))
+
+    assert blobs.gc() == (1, len(b"dropped"))
+    assert not os.path.exists(blob_path)
+    assert database.get_blob(digest) is None
+    assert kept.read_bytes() == b"kept"
@@ -0,0 +1,38 @@
+# tests/test_bulk_images.py
+"""/api/manga/images: главы диапазона потоком NDJSON, URL страниц сохраняются в БД"""
+import json
+
+from src.core import database
+
+
+def stream(api, **params):
+    async def check(client, mirror):
+        query = {"url": f"{mirror.base_url}/test_manga", **params}
+        r = await client.get("/api/manga/images", params=query)
+        return mirror, r.headers["content-type"], [json.loads(line) for line in r.text.splitlines()]
+    return api(check)
+
+
+def test_range_is_streamed_and_saved(api):
+    mirror, content_type, lines = stream(api, **{"from": 1, "to": 5, "concurrency": 2})
+
+    assert content_type == "application/x-ndjson"
+    header, chapters, done = lines[0], lines[1:-1], lines[-1]
+    assert header["chapters"] == 5 and header["title"] == "Тестовая манга"
+    assert sorted(c["url"] for c in chapters) == [f"{mirror.base_url}/test_manga/vol1/{n}?mtr=true"
+                                                  for n in range(1, 6)]
+    assert all(c["error"] is None and c["total"] == 30 for c in chapters)
+    assert chapters[0]["images"][0].startswith("/api/proxy?url=")
+    assert done == {"done": True, "chapters": 5, "failed": 0, "pages": 150, "size": None, "size_chapters": 0}
+
+    chapter = database.get_chapter_by_url(chapters[0]["url"])
+    assert len(database.get_chapter_pages(chapter[0])) == 30
+
+
+def test_sample_estimates_size(api):
+    _, _, lines = stream(api, **{"from": 1, "to": 2, "sample": 2})
+
+    done = lines[-1]
+    assert done["size_chapters"] == 2
+    assert done["size"] > 0
+    assert all(c["size"] for c in lines[1:-1])
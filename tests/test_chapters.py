@@ -0,0 +1,62 @@
+# tests/test_chapters.py
+"""
+/api/chapters: курсор — position последней главы, а позиции идут подряд с 0
+(chapters.js грузит блок N запросом cursor=N*limit-1 и кладёт главы по position).
+"""
+from src.core import database
+from src.parsers.models import Chapter, MangaInfo
+
+MANGA_URL = "http://example.com/test"
+
+
+def chapters(numbers):
+    return [Chapter(f"Глава {n}", f"{MANGA_URL}/vol1/{n}", number=n) for n in numbers]
+
+
+def positions(manga_id):
+    return [row[0] for row in database.get_chapters_range(manga_id, limit=-1)]
+
+
+def test_positions_are_contiguous_after_list_changes(db):
+    manga_id = database.save_manga_info(MANGA_URL, MangaInfo("Тест", chapters=chapters(range(1, 6))))
+    assert positions(manga_id) == [0, 1, 2, 3, 4]
+
+    # сайт убрал главу 2 и добавил 6 — позиции снова 0..n-1, пропавшая глава без позиции
+    database.save_manga_info(MANGA_URL, MangaInfo("Тест", chapters=chapters([1, 3, 4, 5, 6])))
+    rows = database.get_chapters_range(manga_id, limit=-1)
+    assert [row[0] for row in rows] == [0, 1, 2, 3, 4]
+    assert [row[1] for row in rows] == [1, 3, 4, 5, 6]
+    assert database.count_chapters(manga_id) == 5
+
+
+def test_duplicate_chapter_urls_do_not_leave_gaps(db):
+    listed = chapters([1, 2, 3])
+    manga_id = database.save_manga_info(MANGA_URL, MangaInfo("Тест", chapters=listed + [listed[1]]))
+
+    assert positions(manga_id) == list(range(database.count_chapters(manga_id)))
+
+
+def test_cursor_blocks_match_positions(api):
+    async def check(client, mirror):
+        url = f"{mirror.base_url}/test_manga"
+        pages, cursor = [], None
+        while True:
+            params = {"url": url, "limit": 150}
+            if cursor is not None:
+                params["cursor"] = cursor
+            data = (await client.get("/api/chapters", params=params)).json()
+            pages.append(data)
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        # как chapters.js: блок N — cursor=N*limit-1
+        block = (await client.get("/api/chapters", params={"url": url, "limit": 150, "cursor": 2 * 150 - 1})).json()
+        return pages, block
+
+    pages, block = api(check)
+    total = pages[0]["total"]
+    assert total == 400
+    got = [c["position"] for page in pages for c in page["chapters"]]
+    assert got == list(range(total))
+    assert [page["next_cursor"] for page in pages] == ["149", "299", None]
+    assert block["chapters"] == pages[2]["chapters"]
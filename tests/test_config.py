@@ -0,0 +1,92 @@
+# tests/test_config.py
+"""Конфиг парсеров: сборка SiteSpec, перечитывание при изменении, ошибочный файл не применяется"""
+import json
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from src.parsers import config
+from src.parsers.config import ConfigError, ParserConfig, build_specs
+
+DEFAULT = json.loads((config.PROJECT_ROOT / "config" / "default_config.json").read_text(encoding="utf-8"))
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "RELOAD_CHECK_INTERVAL", 0)
+    path = tmp_path / "parsers.json"
+    write(path, DEFAULT)
+    return path
+
+
+def write(path, data, mtime_shift=0):
+    path.write_text(data if isinstance(data, str) else json.dumps(data), encoding="utf-8")
+    if mtime_shift:
+        # mtime меняется и при записи в ту же секунду
+        st = path.stat()
+        os.utime(path, (st.st_atime, st.st_mtime + mtime_shift))
+
+
+def with_base_url(name, base_url):
+    data = json.loads(json.dumps(DEFAULT))
+    data["parsers"][name]["base_url"] = base_url
+    return data
+
+
+def test_site_overrides_extend_engine_rules():
+    spec = build_specs(DEFAULT)["seimanga"]
+    html = BeautifulSoup('<h1 class="names"><span class="name">Берсерк</span></h1>', "html.parser")
+    assert spec.rule("info", "title").text(html) == "Берсерк"
+    assert spec.value("search", "path") == "/search/advancedResults"
+    assert spec.pattern("chapter", "images").pattern == DEFAULT["engines"]["readmanga"]["chapter"]["images"]
+    assert (spec.rate, spec.burst) == (4.0, 8)
+
+
+@pytest.mark.parametrize("broken, message", [
+    ({"parsers": {"x": {"engine": "nope", "base_url": "http://x"}}}, "неизвестный движок"),
+    ({"engines": {"e": {"class": "a:B"}}, "parsers": {"x": {"engine": "e"}}}, "нет base_url"),
+    ({"engines": {"e": {"class": "a:B", "chapter": {"images": "("}}},
+      "parsers": {"x": {"engine": "e", "base_url": "http://x"}}}, "регулярное выражение"),
+])
+def test_build_specs_rejects_broken_config(broken, message):
+    with pytest.raises(ConfigError, match=message):
+        build_specs(broken)
+
+
+def test_changed_file_is_reloaded(config_file):
+    parsers = ParserConfig(config_file)
+    assert parsers.specs()["seimanga"].base_url == DEFAULT["parsers"]["seimanga"]["base_url"]
+
+    write(config_file, with_base_url("seimanga", "https://mirror.example/"), mtime_shift=5)
+
+    assert parsers.specs()["seimanga"].base_url == "https://mirror.example"
+
+
+@pytest.mark.parametrize("content", [
+    "{ не JSON",
+    json.dumps(["не объект"]),
+    json.dumps({"engines": {}, "parsers": {"seimanga": {"engine": "nope", "base_url": "http://x"}}}),
+])
+def test_broken_reload_keeps_previous_config(config_file, content):
+    parsers = ParserConfig(config_file)
+    before = parsers.specs()
+
+    write(config_file, content, mtime_shift=5)
+    assert parsers.specs() is before
+
+    # исправленный файл снова применяется
+    write(config_file, with_base_url("seimanga", "https://fixed.example"), mtime_shift=10)
+    assert parsers.specs()["seimanga"].base_url == "https://fixed.example"
+
+
+def test_missing_file_keeps_previous_config(config_file):
+    parsers = ParserConfig(config_file)
+    before = parsers.specs()
+    config_file.unlink()
+    assert parsers.specs() is before
+
+
+def test_missing_file_on_first_load_is_an_error(tmp_path):
+    with pytest.raises(ConfigError, match="нет конфига"):
+        ParserConfig(tmp_path / "absent.json").specs()
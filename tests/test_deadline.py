@@ -0,0 +1,90 @@
+# tests/test_deadline.py
+"""Срок запроса: вложенные сроки, урезание таймаутов фаз, федеративный поиск до срока"""
+import asyncio
+
+import pytest
+
+from src.core.deadline import DeadlineExceeded, deadline, detached_context, remaining, within_deadline
+from src.core.parser_manager import federated_search
+from src.core.transport import OPERATION_TIMEOUTS, phase_timeouts
+from src.parsers.models import SearchResult
+
+
+def test_nested_deadline_never_extends_outer():
+    assert remaining() is None
+    with deadline(1):
+        with deadline(10):
+            assert remaining() <= 1
+        with deadline(0.5):
+            assert remaining() <= 0.5
+        assert 0.5 < remaining() <= 1
+    assert remaining() is None
+
+
+def test_detached_context_has_no_deadline():
+    with deadline(1):
+        assert detached_context().run(remaining) is None
+
+
+def test_phase_timeouts_are_clamped_to_remaining():
+    image = OPERATION_TIMEOUTS["image"]
+    assert phase_timeouts("image") == image
+    with deadline(2):
+        clamped = phase_timeouts("image")
+    assert clamped.connect <= 2 and clamped.first_byte <= 2 and clamped.read <= 2
+    with deadline(0):
+        with pytest.raises(DeadlineExceeded):
+            phase_timeouts("image")
+
+
+def test_within_deadline_tells_own_timeout_from_deadline():
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def own_timeout():
+        with deadline(5):
+            await within_deadline(asyncio.wait_for(slow(), 0.01))
+
+    async def request_deadline():
+        with deadline(0.01):
+            await within_deadline(slow())
+
+    with pytest.raises(asyncio.TimeoutError) as e:
+        asyncio.run(own_timeout())
+    assert not isinstance(e.value, DeadlineExceeded)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(request_deadline())
+
+
+class FakeParser:
+    def __init__(self, name, delay, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+    async def search_manga(self, query, **kwargs):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("нет связи")
+        return [SearchResult(title=query, url=f"http://{self.name}/1", parser=self.name, similarity=90)]
+
+
+def test_federated_search_returns_what_arrived_by_deadline():
+    fast, slow, broken = FakeParser("fast", 0), FakeParser("slow", 1), FakeParser("broken", 0, fail=True)
+
+    async def main():
+        with deadline(0.1):
+            return await federated_search("Берсерк", [fast, slow, broken])
+
+    results, incomplete = asyncio.run(main())
+    assert [r.parser for r in results] == ["fast"]
+    assert sorted(incomplete) == ["broken", "slow"]
+    # не успевший парсер отменён и закрыл сессию
+    assert slow.closed
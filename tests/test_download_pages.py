@@ -0,0 +1,166 @@
+# tests/test_download_pages.py
+"""Докачка страниц: Range по .part, ответ 416 на целый .part, сайт без поддержки Range"""
+import asyncio
+import hashlib
+import os
+import zipfile
+
+from aiohttp import web
+
+from src.core.parser_manager import get_parser
+
+BODY = bytes(range(256)) * 40
+
+
+def run_with_server(handler, check):
+    """Поднять локальный сервер картинок с handler и выполнить check(base_url)"""
+    async def main():
+        app = web.Application()
+        app.router.add_get("/img/{name}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            return await check(f"http://127.0.0.1:{port}")
+        finally:
+            await runner.cleanup()
+    return asyncio.run(main())
+
+
+def range_handler(seen, honour_range=True):
+    async def handler(request):
+        seen.append(request.headers.get("Range"))
+        start = request.http_range.start
+        if start is None or not honour_range:
+            return web.Response(body=BODY, content_type="image/jpeg")
+        if start >= len(BODY):
+            return web.Response(status=416, headers={"Content-Range": f"bytes */{len(BODY)}"})
+        return web.Response(status=206, body=BODY[start:], content_type="image/jpeg",
+                            headers={"Content-Range": f"bytes {start}-{len(BODY) - 1}/{len(BODY)}"})
+    return handler
+
+
+def download(base_url, out_dir, **kwargs):
+    async def go():
+        parser = get_parser("readmanga", limited=False)
+        async with parser:
+            return await parser.download_pages("chapter", [f"{base_url}/img/1.jpg"], str(out_dir), **kwargs)
+    return go()
+
+
+def assert_complete(page, out_dir):
+    path = out_dir / "1.jpg"
+    assert page.error is None
+    assert page.path == str(path)
+    assert path.read_bytes() == BODY
+    assert page.size == len(BODY)
+    assert page.hash == hashlib.sha256(BODY).hexdigest()
+    assert not os.path.exists(f"{path}.part")
+
+
+def test_part_is_resumed_with_range(db, tmp_path):
+    out_dir = tmp_path / "chapter"
+    out_dir.mkdir()
+    (out_dir / "1.jpg.part").write_bytes(BODY[:1000])
+    seen = []
+
+    [page] = run_with_server(range_handler(seen), lambda url: download(url, out_dir))
+
+    assert seen == ["bytes=1000-"]
+    assert_complete(page, out_dir)
+
+
+def test_416_on_complete_part_finishes_without_body(db, tmp_path):
+    out_dir = tmp_path / "chapter"
+    out_dir.mkdir()
+    (out_dir / "1.jpg.part").write_bytes(BODY)
+    seen = []
+
+    [page] = run_with_server(range_handler(seen), lambda url: download(url, out_dir))
+
+    assert seen == [f"bytes={len(BODY)}-"]
+    assert_complete(page, out_dir)
+
+
+def test_server_without_range_restarts_from_zero(db, tmp_path):
+    out_dir = tmp_path / "chapter"
+    out_dir.mkdir()
+    # мусор в .part не должен попасть ни в файл, ни в хэш
+    (out_dir / "1.jpg.part").write_bytes(b"x" * 1000)
+    seen = []
+
+    [page] = run_with_server(range_handler(seen, honour_range=False), lambda url: download(url, out_dir))
+
+    assert seen == ["bytes=1000-"]
+    assert_complete(page, out_dir)
+
+
+def test_known_complete_page_is_not_requested(db, tmp_path):
+    out_dir = tmp_path / "chapter"
+    out_dir.mkdir()
+    (out_dir / "1.jpg").write_bytes(BODY)
+    digest = hashlib.sha256(BODY).hexdigest()
+    seen = []
+
+    [page] = run_with_server(range_handler(seen), lambda url: download(
+        url, out_dir, known={1: (len(BODY), digest, str(out_dir / "1.jpg"))}, verify_hash=True))
+
+    assert seen == []
+    assert page.skipped and page.hash == digest
+
+
+def test_failed_page_is_reported_after_retries(db, tmp_path):
+    seen = []
+
+    async def missing(request):
+        seen.append(request.headers.get("Range"))
+        return web.Response(status=404)
+
+    [page] = run_with_server(missing, lambda url: download(url, tmp_path / "chapter", retries=2))
+
+    assert page.path is None and page.error == "статус 404"
+    assert len(seen) == 3
+
+
+def test_cbz_resume_fetches_only_missing_pages(db, tmp_path):
+    out_dir = tmp_path / "chapter"
+    requested = []
+    broken = {"2.jpg"}
+
+    async def handler(request):
+        name = request.match_info["name"]
+        requested.append(name)
+        if name in broken:
+            return web.Response(status=503)
+        return web.Response(body=name.encode() + BODY, content_type="image/jpeg")
+
+    async def check(base_url):
+        images = [f"{base_url}/img/{i}.jpg" for i in (1, 2, 3)]
+        parser = get_parser("readmanga", limited=False)
+        async with parser:
+            first = await parser.download_pages("chapter", images, str(out_dir), cbz=True)
+            broken.clear()
+            known = {p.index: (p.size, p.hash, p.path) for p in first if p.path}
+            return first, await parser.download_pages("chapter", images, str(out_dir), cbz=True, known=known,
+                                                      verify_hash=True)
+
+    first, second = run_with_server(handler, check)
+
+    assert [p.error for p in first] == [None, "статус 503", None]
+    assert requested == ["1.jpg", "2.jpg", "3.jpg", "2.jpg"]
+    assert [p.skipped for p in second] == [True, False, True]
+    with zipfile.ZipFile(f"{out_dir}.cbz") as zf:
+        assert [zf.read(f"00{i}.jpg") for i in (1, 2, 3)] == [f"{i}.jpg".encode() + BODY for i in (1, 2, 3)]
+
+
+def test_packed_page_is_not_requested_again(db, tmp_path):
+    seen = []
+
+    [page] = run_with_server(range_handler(seen), lambda url: download(
+        url, tmp_path / "chapter", known={1: (len(BODY), "abc", "pack:7")}))
+
+    # исходный файл удалён при переносе в pack — страница всё равно считается скачанной
+    assert seen == []
+    assert page.skipped and page.path == "pack:7"
@@ -0,0 +1,75 @@
+# tests/test_imaging.py
+"""Перекодирование страниц: выбор формата по Accept, шаг ширины, уменьшение в прокси"""
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from src.core import imaging
+from src.core.imaging import image_size, negotiate_format, normalize_width, transcode
+
+
+def jpeg(width=800, height=1200) -> bytes:
+    out = BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(out, "JPEG")
+    return out.getvalue()
+
+
+def test_width_is_clamped_and_rounded_up_to_step():
+    assert normalize_width(None) is None
+    assert normalize_width(0) is None
+    assert normalize_width(10) == imaging.MIN_WIDTH
+    assert normalize_width(601) == 700
+    assert normalize_width(600) == 600
+    assert normalize_width(10 ** 6) == imaging.MAX_WIDTH
+
+
+@pytest.mark.parametrize("accept, expected", [
+    pytest.param("image/avif,image/webp,*/*", "avif",
+                 marks=pytest.mark.skipif(not imaging.is_supported("avif"), reason="Pillow без AVIF")),
+    ("image/webp,*/*", "webp"),
+    ("text/html,*/*;q=0.8", "jpeg"),
+    ("", "jpeg"),
+])
+def test_negotiate_format_prefers_smaller_formats(accept, expected):
+    assert negotiate_format(accept) == expected
+
+
+def test_negotiate_format_skips_formats_pillow_cannot_save(monkeypatch):
+    monkeypatch.setattr(imaging, "is_supported", lambda fmt: fmt != "avif")
+    assert negotiate_format("image/avif,image/webp") == "webp"
+
+
+def test_transcode_downscales_and_never_upscales():
+    small = transcode(jpeg(), 400, "webp")
+    with Image.open(BytesIO(small)) as im:
+        assert (im.format, im.size) == ("WEBP", (400, 600))
+    assert image_size(transcode(jpeg(300, 450), 400, "jpeg")) == (300, 450)
+
+
+def test_transcode_flattens_alpha_for_jpeg():
+    out = BytesIO()
+    Image.new("RGBA", (200, 200), (0, 0, 0, 0)).save(out, "PNG")
+    with Image.open(BytesIO(transcode(out.getvalue(), None, "jpeg"))) as im:
+        assert (im.format, im.mode) == ("JPEG", "RGB")
+
+
+def test_proxy_negotiates_format_by_accept(api):
+    async def check(client, mirror):
+        url = f"{mirror.base_url}/img/rm/001.jpg"
+        original = await client.get("/api/proxy", params={"url": url})
+        auto = await client.get("/api/proxy", params={"url": url, "w": 50, "fmt": "auto"},
+                                headers={"Accept": "image/webp,*/*"})
+        explicit = await client.get("/api/proxy", params={"url": url, "fmt": "jpeg"},
+                                    headers={"Accept": "image/webp,*/*"})
+        return original, auto, explicit
+
+    original, auto, explicit = api(check)
+    assert original.headers["content-type"] == "image/jpeg"
+    assert "vary" not in original.headers
+    # ширина округляется до MIN_WIDTH, а картинка зеркала уже (80 px) — не увеличивается
+    assert auto.headers["content-type"] == "image/webp"
+    assert auto.headers["vary"] == "Accept"
+    assert image_size(auto.content) == (80, 120)
+    assert explicit.headers["content-type"] == "image/jpeg"
+    assert "vary" not in explicit.headers
@@ -0,0 +1,42 @@
+# tests/test_info.py
+"""/api/info из БД: свежая информация без запроса к сайту, устаревшая — с обновлением в фоне"""
+import asyncio
+
+from src.web import server
+
+
+def test_fresh_info_is_served_from_db(api):
+    async def check(client, mirror):
+        url = f"{mirror.base_url}/test_manga"
+        first = (await client.get("/api/info", params={"url": url})).json()
+        requests = mirror.stats["requests"]
+        again = (await client.get("/api/info", params={"url": url})).json()
+        short = (await client.get("/api/info", params={"url": url, "chapters": "false"})).json()
+        return first, again, short, mirror.stats["requests"] - requests
+
+    first, again, short, extra_requests = api(check)
+    assert extra_requests == 0
+    assert again["updated_at"] <= first["updated_at"]
+    assert {**again, "updated_at": None} == {**first, "updated_at": None}
+    assert first["title"] == "Тестовая манга" and len(first["chapters"]) == 400
+    assert "chapters" not in short and short["chapters_total"] == 400
+
+
+def test_stale_info_is_served_and_refreshed_in_background(api, monkeypatch):
+    monkeypatch.setattr(server, "INFO_TTL", 0)
+
+    async def check(client, mirror):
+        url = f"{mirror.base_url}/test_manga"
+        first = (await client.get("/api/info", params={"url": url})).json()
+        requests = mirror.stats["requests"]
+        stale = (await client.get("/api/info", params={"url": url})).json()
+        for _ in range(100):
+            if not server._info_flight.inflight(url) and mirror.stats["requests"] > requests:
+                break
+            await asyncio.sleep(0.01)
+        return first, stale, mirror.stats["requests"] - requests
+
+    first, stale, refreshes = api(check)
+    # ответ — из БД с прежним временем, а сайт запрошен один раз в фоне
+    assert stale["updated_at"] <= first["updated_at"]
+    assert refreshes == 1
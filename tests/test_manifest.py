@@ -0,0 +1,63 @@
+# tests/test_manifest.py
+"""Манифест главы: страницы через прокси, соседние главы, ETag и Cache-Control"""
+from urllib.parse import parse_qs, urlparse
+
+from src.web.server import MANIFEST_CACHE_CONTROL, MANIFEST_CACHE_CONTROL_LAST
+
+
+def chapter_url(mirror, vol, number):
+    return f"{mirror.base_url}/test_manga/vol{vol}/{number}?mtr=true"
+
+
+def test_manifest_lists_proxied_pages_and_neighbours(api):
+    async def check(client, mirror):
+        r = await client.get("/api/chapter/manifest", params={"url": chapter_url(mirror, 1, 2)})
+        return mirror, r
+
+    mirror, r = api(check)
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == MANIFEST_CACHE_CONTROL
+    manifest = r.json()
+    assert manifest["title"] == "Тестовая манга"
+    assert manifest["manga_url"] == f"{mirror.base_url}/test_manga"
+    assert manifest["prev_chapter"] == chapter_url(mirror, 1, 1)
+    assert manifest["next_chapter"] == chapter_url(mirror, 1, 3)
+    assert manifest["total"] == len(manifest["pages"]) == 30
+    first = manifest["pages"][0]
+    assert first["index"] == 1
+    assert urlparse(first["url"]).path == "/api/proxy"
+    assert parse_qs(urlparse(first["url"]).query)["url"] == [f"{mirror.base_url}/img/rm/001.jpg"]
+
+
+def test_unchanged_manifest_is_not_modified(api):
+    async def check(client, mirror):
+        params = {"url": chapter_url(mirror, 1, 2)}
+        first = await client.get("/api/chapter/manifest", params=params)
+        again = await client.get("/api/chapter/manifest", params=params,
+                                 headers={"If-None-Match": first.headers["etag"]})
+        return first, again
+
+    first, again = api(check)
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == first.headers["etag"]
+
+
+def test_last_chapter_manifest_is_cached_briefly(api):
+    async def check(client, mirror):
+        return (await client.get("/api/chapter/manifest", params={"url": chapter_url(mirror, 40, 400)}))
+
+    r = api(check)
+    assert r.headers["cache-control"] == MANIFEST_CACHE_CONTROL_LAST
+    assert r.json()["next_chapter"] is None
+
+
+def test_manifest_reports_dimensions_of_proxied_pages(api):
+    async def check(client, mirror):
+        params = {"url": chapter_url(mirror, 1, 2)}
+        before = (await client.get("/api/chapter/manifest", params=params)).json()
+        assert (await client.get(before["pages"][0]["url"])).status_code == 200
+        return before, (await client.get("/api/chapter/manifest", params=params)).json()
+
+    _, after = api(check)
+    assert (after["pages"][0]["width"], after["pages"][0]["height"]) == (80, 120)
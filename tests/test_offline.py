@@ -0,0 +1,140 @@
+# tests/test_offline.py
+"""Офлайн-режим: состояния circuit breaker и ручные отметки хостов"""
+import asyncio
+
+import pytest
+
+from src.core import offline
+from src.core.offline import CircuitBreaker, HostOffline, check, offline_reason, set_offline
+
+URL = "https://site.example/manga/vol1/1"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(offline.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(db, monkeypatch):
+    monkeypatch.setattr(offline, "_breakers", {})
+    monkeypatch.setattr(offline, "_manual", {})
+    monkeypatch.setattr(offline, "_manual_loaded", 0.0)
+    monkeypatch.setattr(offline, "_background", False)
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker("h", threshold=3, open_seconds=30)
+    for _ in range(2):
+        breaker.failure(ConnectionError("нет связи"))
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.failure(ConnectionError("нет связи"))
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.last_error == "нет связи"
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("h", threshold=3)
+    breaker.failure(ConnectionError())
+    breaker.failure(ConnectionError())
+    breaker.record(200)
+    breaker.failure(ConnectionError())
+    assert breaker.state == "closed"
+    # 5xx — сбой сайта, 4xx — хост доступен
+    breaker.record(404)
+    assert breaker.failures == 0
+    breaker.record(503)
+    assert breaker.failures == 1
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("h", threshold=1, open_seconds=30)
+    breaker.failure(ConnectionError())
+    clock.now += 31
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # пока пробный запрос идёт, остальные не пускаются
+    assert not breaker.allow()
+
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_probe_reopens_circuit(clock):
+    breaker = CircuitBreaker("h", threshold=5, open_seconds=30)
+    for _ in range(5):
+        breaker.failure(ConnectionError())
+    clock.now += 31
+    assert breaker.allow()
+    breaker.failure(TimeoutError())
+    assert breaker.state == "open"
+    clock.now += 10
+    assert not breaker.allow()
+
+
+def test_hung_probe_does_not_block_host_forever(clock):
+    breaker = CircuitBreaker("h", threshold=1, open_seconds=30)
+    breaker.failure(ConnectionError())
+    clock.now += 31
+    assert breaker.allow()
+    clock.now += 31
+    assert breaker.allow()
+
+
+def test_check_raises_for_open_circuit():
+    breaker = check(URL)
+    for _ in range(breaker.threshold):
+        breaker.failure(ConnectionError())
+    assert offline_reason(URL) == "circuit"
+    with pytest.raises(HostOffline) as e:
+        check(URL)
+    assert (e.value.host, e.value.reason) == ("site.example", "circuit")
+
+
+def test_manual_offline_applies_immediately_and_resets_breaker():
+    breaker = check(URL)
+    for _ in range(breaker.threshold):
+        breaker.failure(ConnectionError())
+
+    set_offline("Site.Example", True)
+    assert offline_reason(URL) == "manual"
+    assert offline_reason("https://other.example/") is None
+
+    set_offline("site.example", False)
+    # вернули вручную — сразу идём в сеть, не дожидаясь конца open_seconds
+    assert offline_reason(URL) is None
+    assert check(URL).state == "closed"
+
+
+def test_all_hosts_marker():
+    set_offline(offline.ALL_HOSTS, True)
+    assert offline_reason("https://any.example/") == "manual"
+
+
+def test_background_refresh_picks_up_marks_of_other_workers(monkeypatch):
+    monkeypatch.setattr(offline, "MANUAL_REFRESH", 0.01)
+
+    async def main():
+        task = asyncio.create_task(offline.run())
+        await asyncio.sleep(0.02)
+        # отметка другого воркера — напрямую в БД
+        offline.database.set_offline_host("site.example", True)
+        await asyncio.sleep(0.05)
+        reason = offline_reason(URL)
+        task.cancel()
+        return reason
+
+    assert asyncio.run(main()) == "manual"
+    assert not offline._background
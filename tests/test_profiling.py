@@ -0,0 +1,50 @@
+# tests/test_profiling.py
+"""Профили по флагу: только с localhost или с MANGAMONITOR_PROFILE_TOKEN"""
+import importlib
+
+import pytest
+
+from src.core import profiling
+from src.core.profiling import profile_allowed, profile_requested
+
+
+def scope(client="127.0.0.1", headers=(), query=b""):
+    return {"type": "http", "client": (client, 40000), "headers": list(headers), "query_string": query}
+
+
+@pytest.fixture(autouse=True)
+def no_sampling(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE", 0)
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+
+
+def test_flag_from_localhost_is_honoured():
+    assert profile_requested(scope(headers=[(b"x-profile", b"1")]))
+    assert profile_requested(scope(client="::1", query=b"profile=1"))
+    assert not profile_requested(scope(query=b"profile=0"))
+    assert not profile_requested(scope())
+
+
+def test_flag_from_remote_client_is_ignored():
+    remote = scope(client="203.0.113.7", headers=[(b"x-profile", b"1")])
+    assert not profile_requested(remote)
+    assert not profile_allowed(remote)
+
+
+def test_remote_client_with_token(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+
+    assert profile_requested(scope(client="203.0.113.7", headers=[(b"x-profile", b"1"),
+                                                                   (b"x-profile-token", b"secret")]))
+    assert profile_requested(scope(client="203.0.113.7", query=b"profile=1&profile_token=secret"))
+    assert not profile_requested(scope(client="203.0.113.7", headers=[(b"x-profile", b"1"),
+                                                                       (b"x-profile-token", b"wrong")]))
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("MANGAMONITOR_PROFILING", raising=False)
+    reloaded = importlib.reload(profiling)
+    try:
+        assert not reloaded.PROFILING_ENABLED
+    finally:
+        importlib.reload(profiling)
@@ -0,0 +1,109 @@
+# tests/test_progress.py
+"""ProgressRecorder.flush: параллельные вызовы не теряют и не дублируют позиции"""
+import threading
+import time
+
+import pytest
+
+from src.core import database
+from src.core.progress import ProgressRecorder
+
+
+def test_concurrent_flushes_write_each_entry_once(db, monkeypatch):
+    written = []
+    entered = threading.Event()
+    release = threading.Event()
+    save = database.save_progress
+
+    def slow_save(rows):
+        written.extend(row[0] for row in rows)
+        entered.set()
+        # первая запись «висит», пока остальные flush() идут параллельно
+        release.wait(5)
+        save(rows)
+
+    monkeypatch.setattr(database, "save_progress", slow_save)
+    recorder = ProgressRecorder()
+    for n in range(50):
+        recorder.record(f"http://example.com/m/vol1/{n}", "http://example.com/m", n + 1, 100)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(recorder.flush())) for _ in range(8)]
+    threads[0].start()
+    assert entered.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # пока пачка пишется, позиции видны и в get(), и в pending()
+    assert recorder.get("http://example.com/m/vol1/7")[0] == 8
+    assert len(recorder.pending()) == 50
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert sorted(results) == [0] * 7 + [50]
+    assert sorted(written) == sorted(f"http://example.com/m/vol1/{n}" for n in range(50))
+    assert recorder.pending() == []
+    assert database.get_progress("http://example.com/m/vol1/7")[0] == 8
+
+
+def test_records_during_flush_are_kept_for_next_flush(db, monkeypatch):
+    recorder = ProgressRecorder()
+    url = "http://example.com/m/vol1/1"
+    save = database.save_progress
+
+    def save_and_record(rows):
+        # перелистывание, пришедшее во время записи, не должно потеряться
+        recorder.record(url, None, 5)
+        save(rows)
+
+    recorder.record(url, "http://example.com/m", 3, 20)
+    monkeypatch.setattr(database, "save_progress", save_and_record)
+    assert recorder.flush() == 1
+    assert database.get_progress(url)[0] == 3
+    assert recorder.get(url)[0] == 5
+
+    monkeypatch.setattr(database, "save_progress", save)
+    assert recorder.flush() == 1
+    page, total, _ = database.get_progress(url)
+    assert (page, total) == (5, 20)
+
+
+def test_failed_flush_returns_entries_without_overwriting_newer(db, monkeypatch):
+    recorder = ProgressRecorder()
+    old, fresh = "http://example.com/m/vol1/1", "http://example.com/m/vol1/2"
+
+    def failing_save(rows):
+        recorder.record(fresh, None, 9)
+        raise RuntimeError("диск занят")
+
+    recorder.record(old, None, 2)
+    recorder.record(fresh, None, 4)
+    monkeypatch.setattr(database, "save_progress", failing_save)
+    with pytest.raises(RuntimeError):
+        recorder.flush()
+
+    assert {url: page for url, _, page, _, _ in recorder.pending()} == {old: 2, fresh: 9}
+
+
+def test_concurrent_record_and_flush_keep_latest_page(db):
+    recorder = ProgressRecorder()
+    urls = [f"http://example.com/m/vol1/{n}" for n in range(5)]
+    stop = threading.Event()
+
+    def flusher():
+        while not stop.is_set():
+            recorder.flush()
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=flusher) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for page in range(1, 201):
+        for url in urls:
+            recorder.record(url, "http://example.com/m", page, 200)
+    stop.set()
+    for thread in threads:
+        thread.join(5)
+    recorder.flush()
+
+    assert [database.get_progress(url)[0] for url in urls] == [200] * 5
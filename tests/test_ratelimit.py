@@ -0,0 +1,50 @@
+# tests/test_ratelimit.py
+"""GCRA-ограничитель: burst без ожидания, дальше — rate в секунду, очередь не дольше срока запроса"""
+import asyncio
+import time
+
+import pytest
+
+from src.core.deadline import DeadlineExceeded, deadline
+from src.core.ratelimit import RateLimiter, limiter_for
+
+
+def test_burst_passes_then_rate_applies():
+    limiter = RateLimiter(rate=20, burst=3)
+
+    async def main():
+        started = time.monotonic()
+        stamps = []
+        for _ in range(5):
+            await limiter.acquire()
+            stamps.append(time.monotonic() - started)
+        return stamps
+
+    stamps = asyncio.run(main())
+    assert stamps[2] < 0.02
+    # четвёртый и пятый — с интервалом 1/rate
+    assert stamps[3] >= 0.04
+    assert stamps[4] - stamps[3] >= 0.04
+
+
+def test_wait_longer_than_deadline_fails_without_taking_slot():
+    limiter = RateLimiter(rate=2, burst=1)
+
+    async def main():
+        await limiter.acquire()
+        with deadline(0.1):
+            with pytest.raises(DeadlineExceeded):
+                await limiter.acquire()
+        # слот не занят: следующему ждать столько же, сколько до неудачной попытки
+        return limiter.delay()
+
+    assert 0.3 < asyncio.run(main()) <= 0.5
+
+
+def test_limiter_is_shared_per_parser_and_follows_config():
+    first = limiter_for("test_site", 4, 8)
+    assert limiter_for("test_site", 4, 8) is first
+    changed = limiter_for("test_site", 2, 8)
+    assert changed is not first and changed.rate == 2
+    assert limiter_for("test_site", 0) is None
+    assert limiter_for("test_site", 4, 8) is not first
@@ -0,0 +1,104 @@
+# tests/test_shared.py
+"""Общие кэши и аренды задач в data/shared.sqlite (режим нескольких воркеров)"""
+import asyncio
+import threading
+
+import pytest
+
+from src.core import shared
+from src.core.shared import DiskImageCache, LeaseBusy, SharedTTLCache, acquire_lease, job_lease
+
+
+@pytest.fixture(autouse=True)
+def shared_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared, "SHARED_DB_PATH", tmp_path / "shared.sqlite")
+    # соединения кэшируются на поток — новый файл БД требует новых соединений
+    monkeypatch.setattr(shared, "_local", threading.local())
+    return tmp_path
+
+
+def test_ttl_cache_expires_and_keeps_recent(monkeypatch):
+    cache = SharedTTLCache("test", maxsize=2, ttl=60)
+    cache.set("a", {"title": "Берсерк"})
+    assert cache.get("a") == {"title": "Берсерк"}
+    assert cache.get(("tuple", "key")) is None
+
+    now = shared.time.time()
+    monkeypatch.setattr(shared.time, "time", lambda: now + 61)
+    assert cache.get("a") is None
+    assert "a" not in cache
+
+
+def test_ttl_cache_trim_drops_least_recently_used(monkeypatch):
+    cache = SharedTTLCache("test", maxsize=2, ttl=600)
+    clock = [1000.0]
+    monkeypatch.setattr(shared.time, "time", lambda: clock[0])
+    for key in ("old", "mid", "new"):
+        cache.set(key, key)
+        clock[0] += shared.ATIME_STEP + 1
+    # чтение обновляет atime: "old" теперь самый свежий
+    assert cache.get("old") == "old"
+
+    cache.trim()
+    assert len(cache) == 2
+    assert cache.get("mid") is None
+    assert cache.get("old") == "old" and cache.get("new") == "new"
+
+
+def test_image_cache_keeps_running_totals(shared_db):
+    cache = DiskImageCache("test", max_bytes=1000, root=shared_db / "images")
+    cache.set("a", b"x" * 100, "image/jpeg")
+    cache.set("b", b"y" * 50, "image/webp")
+    # замена записи учитывается в объёме (UPSERT проходит через триггер)
+    cache.set("a", b"z" * 30, "image/jpeg")
+
+    assert (cache.size, len(cache)) == (80, 2)
+    assert cache.get("a") == (b"z" * 30, "image/jpeg")
+    assert asyncio.run(cache.aget("b")) == (b"y" * 50, "image/webp")
+
+
+def test_image_cache_evicts_oldest_over_limit(shared_db, monkeypatch):
+    cache = DiskImageCache("test", max_bytes=250, root=shared_db / "images")
+    clock = [1000.0]
+    monkeypatch.setattr(shared.time, "time", lambda: clock[0])
+    for key in ("first", "second", "third"):
+        cache.set(key, b"x" * 100, "image/jpeg")
+        clock[0] += 1
+
+    cache.trim()
+
+    assert "first" not in cache
+    assert "second" in cache and "third" in cache
+    assert cache.size == 200
+
+
+def test_image_cache_file_removed_by_other_process_is_a_miss(shared_db):
+    cache = DiskImageCache("test", root=shared_db / "images")
+    cache.set("a", b"data", "image/jpeg")
+    cache._path("a").unlink()
+
+    assert cache.get("a") is None
+    assert "a" not in cache and len(cache) == 0
+
+
+def test_job_lease_is_exclusive_until_released():
+    async def main():
+        async with job_lease("download:ch1"):
+            with pytest.raises(LeaseBusy):
+                async with job_lease("download:ch1"):
+                    pass
+            # другая задача не мешает
+            async with job_lease("download:ch2"):
+                pass
+        async with job_lease("download:ch1"):
+            return True
+
+    assert asyncio.run(main())
+
+
+def test_expired_lease_can_be_taken_over():
+    assert acquire_lease("job", "worker-1", ttl=-1)
+    assert acquire_lease("job", "worker-2", ttl=60)
+    assert not acquire_lease("job", "worker-1", ttl=60)
+    # продление своей аренды
+    assert acquire_lease("job", "worker-2", ttl=60)
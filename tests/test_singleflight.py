@@ -0,0 +1,85 @@
+# tests/test_singleflight.py
+"""Single-flight: одинаковые одновременные запросы идут на сайт одним вызовом"""
+import asyncio
+
+import pytest
+
+from src.core.deadline import DeadlineExceeded, deadline
+from src.core.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_fetch():
+    flight = SingleFlight("test_share")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "data"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["data"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "coalesced": 4, "inflight": 0}
+
+
+def test_error_reaches_every_waiter_and_key_is_released():
+    flight = SingleFlight("test_error")
+
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise ValueError("сайт ответил ерундой")
+
+    async def ok():
+        return "ok"
+
+    async def main():
+        results = await asyncio.gather(flight.do("key", broken), flight.do("key", broken), return_exceptions=True)
+        # после ошибки ключ свободен: следующий вызов идёт на сайт заново
+        return results, await flight.do("key", ok)
+
+    results, again = asyncio.run(main())
+    assert [type(r) for r in results] == [ValueError, ValueError]
+    assert again == "ok"
+
+
+def test_cancelled_waiter_does_not_cancel_fetch_for_others():
+    flight = SingleFlight("test_cancel")
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "data"
+
+    async def main():
+        first = asyncio.create_task(flight.do("key", fetch))
+        second = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(main()) == ("data", True)
+
+
+def test_waiter_stops_at_its_deadline_while_fetch_completes():
+    flight = SingleFlight("test_deadline")
+    finished = []
+
+    async def fetch():
+        await asyncio.sleep(0.1)
+        finished.append(1)
+        return "data"
+
+    async def impatient():
+        with deadline(0.02):
+            return await flight.do("key", fetch)
+
+    async def main():
+        patient = asyncio.create_task(flight.do("key", fetch))
+        with pytest.raises(DeadlineExceeded):
+            await impatient()
+        return await patient
+
+    assert asyncio.run(main()) == "data"
+    assert finished == [1]
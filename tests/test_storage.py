@@ -0,0 +1,158 @@
+# tests/test_storage.py
+"""Квоты: порядок вытеснения и освобождённые байты; счётчики blob-ов после упаковки и удаления"""
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from src.core import database
+from src.core.archive import pack_chapter_dir
+from src.core.blobstore import BlobStore
+from src.core.pagestore import PACKED_MARKER, PageStore, migrate, remove_sources
+from src.core.storage import StorageManager
+
+
+@pytest.fixture
+def blobs(db):
+    return BlobStore(db / "blobs")
+
+
+@pytest.fixture
+def manga_id(db):
+    return database.ensure_manga("Тест", "http://example.com/test")
+
+
+def download(db: Path, blobs: BlobStore, manga_id: int, number: int, pages, read_at: float = None) -> int:
+    """Глава со страницами pages (байты), записанными как ссылки на blob-ы"""
+    url = f"http://example.com/test/vol1/{number}"
+    chapter_id = database.ensure_chapter(manga_id, f"Глава {number}", url)
+    folder = db / "downloads" / "test" / str(number)
+    folder.mkdir(parents=True)
+    rows = []
+    for idx, data in enumerate(pages, start=1):
+        dest = str(folder / f"{idx}.jpg")
+        writer = blobs.writer()
+        writer.write(data)
+        rows.append((idx, f"{url}/{idx}.jpg", dest, len(data), blobs.store(writer, dest), None))
+    database.save_downloaded_pages(chapter_id, rows)
+    database.mark_chapter_saved(chapter_id)
+    if read_at is not None:
+        database.touch_chapter(url, read_at)
+    return chapter_id
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def refcounts(pages):
+    return [database.get_blob(_digest(data))[3] for data in pages]
+
+
+def test_enforce_evicts_least_recently_read_first(db, blobs, manga_id):
+    ch1 = download(db, blobs, manga_id, 1, [b"a" * 100], read_at=300)
+    ch2 = download(db, blobs, manga_id, 2, [b"b" * 100], read_at=100)
+    ch3 = download(db, blobs, manga_id, 3, [b"c" * 100], read_at=200)
+    manager = StorageManager(quota=150, blobs=blobs, packs=PageStore(db / "packs"))
+
+    assert manager.enforce() == [ch2, ch3]
+
+    assert database.get_storage_totals()[0] == 100
+    assert database.get_manga_storage(manga_id) == 100
+    assert [row[0] for row in database.get_lru_chapters()] == [ch1]
+
+
+def test_enforce_keeps_just_downloaded_chapter(db, blobs, manga_id):
+    ch1 = download(db, blobs, manga_id, 1, [b"a" * 100], read_at=100)
+    ch2 = download(db, blobs, manga_id, 2, [b"b" * 100], read_at=200)
+    manager = StorageManager(manga_quota=100, blobs=blobs, packs=PageStore(db / "packs"))
+
+    assert manager.enforce(manga_id, keep=[ch1]) == [ch2]
+    assert database.get_manga_storage(manga_id) == 100
+
+
+def test_eviction_releases_blobs_and_frees_disk(db, blobs, manga_id):
+    shared, own = b"s" * 50, b"o" * 70
+    download(db, blobs, manga_id, 1, [shared, own], read_at=100)
+    ch2 = download(db, blobs, manga_id, 2, [shared], read_at=200)
+    assert refcounts([shared, own]) == [2, 1]
+    manager = StorageManager(quota=60, blobs=blobs, packs=PageStore(db / "packs"))
+
+    manager.enforce()
+
+    # общая страница осталась у второй главы, собственная — удалена с диска
+    assert database.get_blob(_digest(shared))[3] == 1
+    assert database.get_blob(_digest(own)) is None
+    assert blobs.report()["stored_bytes"] == 50
+    assert database.get_storage_totals()[0] == 50
+    assert database.get_chapter_local_paths(ch2)
+
+
+def test_pack_chapter_dir_unlinks_blobs(db, blobs, manga_id):
+    pages = [b"p" * 40, b"q" * 60]
+    download(db, blobs, manga_id, 1, pages)
+    folder = db / "downloads" / "test" / "1"
+
+    cbz_path, moved = pack_chapter_dir(folder, remove_source=True)
+
+    assert refcounts(pages) == [0, 0]
+    assert not folder.exists()
+    assert len(moved) == 2 and cbz_path.exists()
+    assert blobs.gc() == (2, 100)
+
+
+def test_migrate_to_pack_unlinks_blobs(db, blobs, manga_id):
+    pages = [b"p" * 40, b"q" * 60]
+    chapter_id = download(db, blobs, manga_id, 1, pages)
+    store = PageStore(db / "packs")
+
+    assert migrate(manga_id, remove_source=True, store=store) == 2
+
+    assert refcounts(pages) == [0, 0]
+    assert all(path.startswith(PACKED_MARKER) for path in database.get_chapter_local_paths(chapter_id))
+    page_ids = [row[0] for row in database.get_chapter_pages(chapter_id)]
+    assert [bytes(store.read(pid)[0]) for pid in page_ids] == pages
+    store.close()
+
+
+def test_migrate_one_chapter_leaves_others_unpacked(db, blobs, manga_id):
+    ch1 = download(db, blobs, manga_id, 1, [b"a" * 10])
+    ch2 = download(db, blobs, manga_id, 2, [b"b" * 10])
+    store = PageStore(db / "packs")
+
+    assert migrate(manga_id, remove_source=True, store=store, chapter_id=ch2) == 1
+
+    assert database.get_chapter_local_paths(ch1) == [str(db / "downloads" / "test" / "1" / "1.jpg")]
+    assert database.get_chapter_local_paths(ch2) == [f"{PACKED_MARKER}{manga_id}"]
+    # перенесённая страница не скачивается заново: get_downloaded_pages отдаёт её с путём pack
+    assert database.get_downloaded_pages(ch2) == {1: (10, _digest(b"b" * 10), f"{PACKED_MARKER}{manga_id}")}
+    store.close()
+
+
+def test_remove_sources_keeps_archive_with_other_pages(db, blobs, manga_id):
+    chapter_id = download(db, blobs, manga_id, 1, [b"a" * 10, b"b" * 10])
+    folder = db / "downloads" / "test" / "1"
+    cbz_path, moved = pack_chapter_dir(folder, remove_source=True)
+    database.relocate_pages(moved)
+    first, second = database.get_chapter_local_paths(chapter_id)
+
+    remove_sources([first])
+    assert cbz_path.exists()
+
+    remove_sources([first, second])
+    assert not cbz_path.exists()
+
+
+def test_eviction_compacts_pack_kept_alongside_sources(db, blobs, manga_id):
+    ch1 = download(db, blobs, manga_id, 1, [b"a" * 100], read_at=100)
+    download(db, blobs, manga_id, 2, [b"b" * 100], read_at=200)
+    packs = PageStore(db / "packs")
+    # migrate без --remove: страницы остаются в папках, копии — в pack-файле
+    assert migrate(manga_id, store=packs) == 2
+    assert packs.path(manga_id).stat().st_size == 200
+    manager = StorageManager(quota=150, blobs=blobs, packs=packs)
+
+    assert manager.enforce() == [ch1]
+
+    assert packs.path(manga_id).stat().st_size == 100
+    packs.close()
@@ -0,0 +1,95 @@
+# tests/test_transport.py
+"""Транспорт: таймаут до заголовков и обрыв тела записываются в circuit breaker хоста"""
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from src.core import offline, transport
+from src.core.offline import FAILURE_THRESHOLD, HostOffline
+from src.core.transport import PhaseTimeouts, create_transport
+
+KINDS = ["aiohttp", "httpx"]
+
+
+@pytest.fixture(autouse=True)
+def breakers(db, monkeypatch):
+    monkeypatch.setattr(offline, "_breakers", {})
+    return offline._breakers
+
+
+async def truncated(request):
+    # обещаем 1000 байт, отдаём 10 и рвём соединение
+    resp = web.StreamResponse(headers={"Content-Length": "1000"})
+    await resp.prepare(request)
+    await resp.write(b"x" * 10)
+    request.transport.close()
+    return resp
+
+
+async def slow(request):
+    await asyncio.sleep(1)
+    return web.Response(body=b"late")
+
+
+async def ok(request):
+    return web.Response(body=b"ok")
+
+
+def run_with_server(check):
+    async def main():
+        app = web.Application()
+        app.router.add_get("/truncated", truncated)
+        app.router.add_get("/slow", slow)
+        app.router.add_get("/ok", ok)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            return await check(f"http://127.0.0.1:{port}")
+        finally:
+            await runner.cleanup()
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_truncated_body_opens_circuit(kind, breakers):
+    async def check(base_url):
+        client = create_transport(kind, {}, timeout=5)
+        try:
+            for _ in range(FAILURE_THRESHOLD):
+                with pytest.raises(Exception):
+                    async with client.get(f"{base_url}/truncated") as resp:
+                        assert resp.status == 200
+                        await resp.read()
+            with pytest.raises(HostOffline):
+                async with client.get(f"{base_url}/ok"):
+                    pass
+        finally:
+            await client.close()
+
+    run_with_server(check)
+    assert breakers["127.0.0.1"].state == "open"
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_headers_timeout_counts_as_failure_and_client_stays_usable(kind, breakers, monkeypatch):
+    monkeypatch.setitem(transport.OPERATION_TIMEOUTS, "page", PhaseTimeouts(connect=0.1, first_byte=0.1, read=1))
+
+    async def check(base_url):
+        client = create_transport(kind, {}, timeout=5)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                async with client.get(f"{base_url}/slow"):
+                    pass
+            assert breakers["127.0.0.1"].failures == 1
+            # после таймаута соединения клиента не сломаны и тело читается целиком
+            async with client.get(f"{base_url}/ok") as resp:
+                return await resp.read()
+        finally:
+            await client.close()
+
+    assert run_with_server(check) == b"ok"
+    assert breakers["127.0.0.1"].failures == 0